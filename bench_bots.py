@@ -0,0 +1,105 @@
+"""Benchmark: memory and backend connections per extra bot hosted in one process.
+
+Adds bots one at a time, each with its own dispatcher and settings namespace as
+``bot.py`` builds them, drives a few menu flows through every bot against the
+in-process Convex stand-in (Telegram calls are faked), and reports process RSS,
+Python heap and open connections to the backend after each addition. Running
+the same bots as separate processes costs a full interpreter and a backend
+connection pool each; the first row approximates that per-process cost.
+
+    python bench_bots.py --bots 8 --users 50
+"""
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import resource
+import tracemalloc
+from urllib.parse import urlparse
+
+from aiogram import Bot
+
+import callbacks as cb
+from convex_standin import ConvexStandIn
+from loadtest import FakeSession, callback_update, text_update
+
+
+def _rss_mib() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak, not current
+
+
+def _established(port: int) -> int:
+    """Server-side sockets on ``port``, i.e. client connections to the stand-in (Linux only)."""
+    count = 0
+    for path in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(path) as f:
+                lines = f.readlines()[1:]
+        except OSError:
+            continue
+        for line in lines:
+            fields = line.split()
+            if int(fields[1].rsplit(":", 1)[1], 16) == port and fields[3] == "01":
+                count += 1
+    return count
+
+
+async def _exercise(hosted, users: int, base_uid: int) -> None:
+    bot, dp = hosted.bot, hosted.dp
+    for uid in range(base_uid, base_uid + users):
+        await dp.feed_update(bot, text_update(uid, "/start"))
+        for data in (cb.LANG.pack("en"), cb.MENU_SUPPORT.pack(), cb.BACK_MENU.pack(), cb.MENU_DONATE.pack()):
+            await dp.feed_update(bot, callback_update(uid, data))
+
+
+async def main(ns: argparse.Namespace) -> None:
+    standin = ConvexStandIn()
+    os.environ["CONVEX_URL"] = url = await standin.start()
+    port = urlparse(url).port
+
+    import database as db
+    from bot import create_dispatcher
+    from hosting import BotConfig, HostedBot
+
+    await db.init_db()
+    gc.collect()
+    tracemalloc.start()
+    base_rss, base_heap = _rss_mib(), tracemalloc.get_traced_memory()[0]
+    print(f"before any bot: rss {base_rss:.1f} MiB, backend connections {_established(port)}")
+    print(f"{'bots':>5}{'rss MiB':>10}{'+rss/bot':>10}{'heap MiB':>10}{'+heap/bot':>11}{'backend conns':>15}")
+
+    hosted: list[HostedBot] = []
+    prev_rss, prev_heap = base_rss, base_heap
+    for i in range(ns.bots):
+        config = BotConfig(name=f"community{i}", token=f"{100000 + i}:bench")
+        bot = Bot(token=config.token, session=FakeSession())
+        hosted.append(HostedBot(config, bot, create_dispatcher(config, flood_control=False)))
+        # Bots take turns so backend concurrency stays the same; connection growth then
+        # comes from the bots themselves, not from more requests in flight
+        for j, h in enumerate(hosted):
+            await _exercise(h, ns.users, 10_000_000 + j * ns.users)
+        gc.collect()
+        rss, heap = _rss_mib(), tracemalloc.get_traced_memory()[0]
+        print(
+            f"{i + 1:>5}{rss:>10.1f}{rss - prev_rss:>10.2f}{heap / 2**20:>10.2f}"
+            f"{(heap - prev_heap) / 2**20:>11.2f}{_established(port):>15}"
+        )
+        prev_rss, prev_heap = rss, heap
+
+    tracemalloc.stop()
+    await db.close_db()
+    await standin.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bots", type=int, default=8)
+    parser.add_argument("--users", type=int, default=50, help="users driven through each bot")
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+    asyncio.run(main(parser.parse_args()))
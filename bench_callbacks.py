@@ -0,0 +1,132 @@
+"""Microbenchmark: cost per callback of routing inline button presses.
+
+Feeds callback updates through an aiogram ``Dispatcher`` with no-op handlers and
+times, per callback, the ``F.data`` filter chain the handler modules used to
+register (same filters, same order) against ``callbacks.CallbackDispatcher``'s
+single decode and lookup. Handlers do nothing, so the numbers are routing plus
+the dispatcher's fixed per-update overhead.
+
+    python bench_callbacks.py --repeat 2000
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+import callbacks as cb
+
+# (legacy filter, action) in the order handlers_user and handlers_admin registered them
+LEGACY_FILTERS = [
+    (F.data == "menu_history", cb.MENU_HISTORY),
+    (F.data == "menu_profile", cb.MENU_PROFILE),
+    (F.data == "menu_support", cb.MENU_SUPPORT),
+    (F.data == "menu_donate", cb.MENU_DONATE),
+    (F.data == "back_menu", cb.BACK_MENU),
+    (F.data == "cancel", cb.CANCEL),
+    (F.data.startswith("donate_to_"), cb.DONATE_TO),
+    (F.data.startswith("currency_"), cb.CURRENCY),
+    (F.data.in_(("lang_en", "lang_ru", "lang_uk")), cb.LANG),
+    (F.data.in_(("genlink_custom", "genlink_profile")), cb.GENLINK_CUSTOM),
+    (F.data == "menu_admin", cb.MENU_ADMIN),
+    (F.data == "back_admin", cb.BACK_ADMIN),
+    (F.data.in_(("admin_stats", "admin_setcard", "admin_cards", "admin_currencies", "admin_support")), cb.ADMIN_STATS),
+    (F.data.startswith("admin_toggle_currency_"), cb.ADMIN_TOGGLE_CURRENCY),
+    (F.data.startswith("admin_currency_"), cb.ADMIN_CURRENCY),
+    (F.data.in_(("confirm_setcard", "cancel_setcard")), cb.CONFIRM_SETCARD),
+    (F.data.in_(("confirm_support", "cancel_support")), cb.CONFIRM_SUPPORT),
+    (F.data.startswith("card_toggle_"), cb.CARD_TOGGLE),
+    (F.data.startswith("card_delete_"), cb.CARD_DELETE),
+    (F.data.startswith("admin_top"), cb.ADMIN_TOP),
+    (F.data.startswith(("approve_", "reject_")), cb.APPROVE),
+]
+
+# (label, legacy payload, packed payload); legacy handlers split the payload themselves
+PAYLOADS = [
+    ("menu_history", "menu_history", cb.MENU_HISTORY.pack()),
+    ("donate_to", "donate_to_123456789", cb.DONATE_TO.pack(123456789)),
+    ("currency", "currency_UAH", cb.CURRENCY.pack("UAH")),
+    ("lang", "lang_en", cb.LANG.pack("en")),
+    ("card_toggle", "card_toggle_17", cb.CARD_TOGGLE.pack(17)),
+    ("admin_top", "admin_top_UAH_3", cb.ADMIN_TOP.pack("UAH", 3)),
+    ("approve", "approve_4242", cb.APPROVE.pack(4242)),
+]
+
+
+def _legacy_dispatcher() -> Dispatcher:
+    dp = Dispatcher()
+    router = Router(name="legacy")
+    for flt, _ in LEGACY_FILTERS:
+        async def handler(callback: CallbackQuery) -> bool:
+            # What the old handlers did before any work: split the payload
+            callback.data.split("_")
+            return True
+
+        router.callback_query.register(handler, flt)
+    dp.include_router(router)
+    return dp
+
+
+def _codec_dispatcher() -> Dispatcher:
+    dp = Dispatcher()
+    dispatcher = cb.CallbackDispatcher(name="bench")
+
+    @dispatcher.route(*cb._BY_NAME.values())
+    async def handler(callback: CallbackQuery, action: cb.Action) -> bool:
+        return True
+
+    dp.include_router(dispatcher.create_router())
+    return dp
+
+
+def _update(data: str) -> Update:
+    user = User(id=1, is_bot=False, first_name="Bench")
+    message = Message(message_id=1, date=datetime.now(timezone.utc), chat=Chat(id=1, type="private"), text="x")
+    return Update(
+        update_id=1,
+        callback_query=CallbackQuery(id="1", from_user=user, chat_instance="1", message=message, data=data),
+    )
+
+
+async def _us_per_callback(dp: Dispatcher, bot: Bot, update: Update, repeat: int) -> float:
+    result = await dp.feed_update(bot, update)
+    assert result is True, update.callback_query.data
+    t0 = time.perf_counter_ns()
+    for _ in range(repeat):
+        await dp.feed_update(bot, update)
+    return (time.perf_counter_ns() - t0) / repeat / 1000
+
+
+def _ns_per_decode(data: str, repeat: int) -> float:
+    t0 = time.perf_counter_ns()
+    for _ in range(repeat):
+        cb.decode(data)
+    return (time.perf_counter_ns() - t0) / repeat
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000)
+    ns = parser.parse_args()
+
+    bot = Bot(token="42:bench")
+    legacy, codec = _legacy_dispatcher(), _codec_dispatcher()
+    print(f"{'callback':<14}{'F.data us':>11}{'codec us':>11}{'decode ns':>11}{'legacy decode ns':>18}")
+    totals = [0.0, 0.0]
+    for label, old, new in PAYLOADS:
+        before = await _us_per_callback(legacy, bot, _update(old), ns.repeat)
+        after = await _us_per_callback(codec, bot, _update(new), ns.repeat)
+        totals[0] += before
+        totals[1] += after
+        print(
+            f"{label:<14}{before:>11.1f}{after:>11.1f}"
+            f"{_ns_per_decode(new, ns.repeat * 10):>11.0f}{_ns_per_decode(old, ns.repeat * 10):>18.0f}"
+        )
+    print(f"{'mean':<14}{totals[0] / len(PAYLOADS):>11.1f}{totals[1] / len(PAYLOADS):>11.1f}")
+    await bot.session.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
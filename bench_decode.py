@@ -0,0 +1,115 @@
+"""Microbenchmark: cost per row of decoding Convex responses.
+
+Builds a ``transactions``/``cards`` response body like the HTTP API returns and
+times, per row, JSON parsing (stdlib vs orjson) and turning documents into rows
+(the positional tuples ``Database`` used to return vs the row types it returns now).
+
+    python bench_decode.py --rows 1000 --repeat 200
+"""
+import argparse
+import json
+import random
+import time
+from typing import Any, Callable
+
+import database as db
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _transactions(n: int, rng: random.Random) -> list[dict[str, Any]]:
+    return [
+        {
+            "tx_id": i,
+            "user_id": rng.randrange(10**9),
+            "amount": round(rng.uniform(1, 500), 2),
+            "currency": rng.choice(db.SUPPORTED_CURRENCIES),
+            "status": rng.choice(("pending_proof", "pending_approval", "approved", "rejected")),
+            "proof_image_id": f"AgACAgIAAxkBAAI{rng.getrandbits(64):x}" if rng.random() < 0.7 else None,
+            "created_at": "2026-10-19 12:00:00",
+            "referrer_id": rng.randrange(10**9) if rng.random() < 0.9 else None,
+        }
+        for i in range(n)
+    ]
+
+
+def _cards(n: int, rng: random.Random) -> list[dict[str, Any]]:
+    return [
+        {
+            "card_id": i,
+            "details": f"4444 {rng.randrange(10**4):04d} {rng.randrange(10**4):04d} {rng.randrange(10**4):04d}",
+            "is_active": rng.random() < 0.5,
+            "created_at": "2026-10-19 12:00:00",
+            "currency": rng.choice(db.SUPPORTED_CURRENCIES),
+        }
+        for i in range(n)
+    ]
+
+
+def _transaction_tuple(tx: dict[str, Any]) -> tuple[Any, ...]:
+    # What Database.get_transaction returned before the row types
+    return (
+        int(tx["tx_id"]),
+        int(tx["user_id"]),
+        float(tx["amount"]),
+        str(tx["currency"]),
+        str(tx["status"]),
+        tx.get("proof_image_id"),
+        str(tx["created_at"]),
+        int(tx["referrer_id"]) if tx.get("referrer_id") is not None else None,
+    )
+
+
+def _card_tuple(r: dict[str, Any]) -> tuple[Any, ...]:
+    return (int(r["card_id"]), str(r["details"]), 1 if bool(r["is_active"]) else 0, str(r["created_at"]), str(r["currency"]))
+
+
+def _ns_per_row(fn: Callable[[], Any], rows: int, repeat: int) -> float:
+    fn()
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter_ns()
+        fn()
+        best = min(best, time.perf_counter_ns() - t0)
+    return best / rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    ns = parser.parse_args()
+    rng = random.Random(ns.seed)
+
+    print(f"{'payload':<14}{'stage':<34}{'ns/row':>10}")
+    for name, docs, as_tuple, as_row in (
+        ("transactions", _transactions(ns.rows, rng), _transaction_tuple, db._transaction_from_convex),
+        ("cards", _cards(ns.rows, rng), _card_tuple, db._card_from_convex),
+    ):
+        body = json.dumps({"status": "success", "value": docs}).encode()
+        results: list[tuple[str, float]] = [
+            ("json.loads", _ns_per_row(lambda: json.loads(body), ns.rows, ns.repeat)),
+        ]
+        if orjson is not None:
+            results.append(("orjson.loads", _ns_per_row(lambda: orjson.loads(body), ns.rows, ns.repeat)))
+        results += [
+            ("tuple rows", _ns_per_row(lambda: [as_tuple(d) for d in docs], ns.rows, ns.repeat)),
+            ("row types", _ns_per_row(lambda: [as_row(d) for d in docs], ns.rows, ns.repeat)),
+        ]
+        rows = [as_row(d) for d in docs]
+        results += [
+            ("field access: row[2]", _ns_per_row(lambda: [r[2] for r in rows], ns.rows, ns.repeat)),
+            ("field access: row.attribute", _ns_per_row(lambda: [r.created_at for r in rows], ns.rows, ns.repeat)),
+        ]
+        for stage, cost in results:
+            print(f"{name:<14}{stage:<34}{cost:>10.0f}")
+    if orjson is None:
+        print("orjson is not installed; pip install orjson to compare")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,155 @@
 import asyncio
 import logging
+from typing import Callable
 
-from aiogram import Bot, Dispatcher
+from aiogram import Bot
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
 
-from config import BOT_TOKEN
+from config import (
+    CAPTURE_FILE,
+    FLOOD_CALLBACK_COSTS,
+    FLOOD_CONTROL_ENABLED,
+    FLOOD_GLOBAL_BURST,
+    FLOOD_GLOBAL_RATE,
+    FLOOD_USER_BURST,
+    FLOOD_USER_RATE,
+    MAX_CONCURRENT_UPDATES,
+    METRICS_HOST,
+    METRICS_PORT,
+    SHARD_WORKERS,
+    SHUTDOWN_TIMEOUT_S,
+)
 from handlers_admin import register_admin_handlers
 from handlers_user import register_user_handlers
-import database as db
+import callbacks as cb
+from capture import CaptureMiddleware
+from hosting import DEFAULT_BOT, BotConfig, BotConfigMiddleware, HostedBot, load_bot_configs
+from lifecycle import DrainingDispatcher, poll, shutdown, warm_up
+from metrics import start_metrics_server
+from middlewares import (
+    DEFAULT_CALLBACK_COSTS,
+    FloodControlMiddleware,
+    LanguageMiddleware,
+    PerUserEventIsolation,
+    parse_callback_costs,
+)
+from sharding import Supervisor, worker_count
+from tracing import TelegramRequestTracer, TracingMiddleware
 
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
 )
 
 
-async def main():
-    if not BOT_TOKEN:
-        print("Error: BOT_TOKEN not found in .env file.")
-        exit(1)
+def create_flood_control() -> FloodControlMiddleware:
+    costs = dict(DEFAULT_CALLBACK_COSTS)
+    costs.update(parse_callback_costs(FLOOD_CALLBACK_COSTS))
+    # Sharded workers each see a slice of the traffic, so they split the global budget
+    shards = worker_count()
+    return FloodControlMiddleware(
+        user_rate=FLOOD_USER_RATE,
+        user_burst=FLOOD_USER_BURST,
+        global_rate=FLOOD_GLOBAL_RATE / shards,
+        global_burst=FLOOD_GLOBAL_BURST / shards,
+        callback_costs=costs,
+    )
 
-    await db.init_db()
 
-    # Use DefaultBotProperties for default settings (aiogram 3.24 best practice)
-    bot = Bot(
-        token=BOT_TOKEN,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+def create_dispatcher(
+    config: BotConfig = DEFAULT_BOT,
+    storage: BaseStorage | None = None,
+    *,
+    flood_control: bool = FLOOD_CONTROL_ENABLED,
+) -> DrainingDispatcher:
+    """Build one bot's dispatcher: middlewares plus user and admin routers."""
+    # Polling handles updates as concurrent tasks; the isolation keeps each user's in order
+    dp = DrainingDispatcher(
+        storage=storage or MemoryStorage(),
+        events_isolation=PerUserEventIsolation(MAX_CONCURRENT_UPDATES),
     )
-    dp = Dispatcher(storage=MemoryStorage())
-    
+
+    # Tracing wraps everything else so the root span covers the whole update
+    dp.update.outer_middleware(TracingMiddleware())
+
+    # Handlers see this bot's admin and settings namespace
+    dp.update.outer_middleware(BotConfigMiddleware(config))
+
+    # Record traffic for replay.py before flood control can drop any of it
+    if CAPTURE_FILE:
+        dp.update.outer_middleware(CaptureMiddleware())
+
+    # Drop floods before they cost any backend calls
+    if flood_control:
+        dp.update.outer_middleware(create_flood_control())
+
     # Register global middleware to ensure language is cached
-    from middlewares import LanguageMiddleware
     dp.update.outer_middleware(LanguageMiddleware())
 
     register_user_handlers(dp)
     register_admin_handlers(dp)
+    # Inline buttons of both handler modules are routed by one lookup
+    dp.include_router(cb.dispatcher.create_router())
+    return dp
+
+
+def create_hosted_bot(config: BotConfig, storage: BaseStorage | None = None) -> HostedBot:
+    # Use DefaultBotProperties for default settings (aiogram 3.24 best practice)
+    bot = Bot(
+        token=config.token,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+    bot.session.middleware(TelegramRequestTracer())
+    return HostedBot(config, bot, create_dispatcher(config, storage))
+
+
+def create_hosted_bots(storage_factory: Callable[[], BaseStorage] = MemoryStorage) -> list[HostedBot]:
+    """Every configured bot; sharded workers build theirs with checkpointed FSM storage."""
+    return [create_hosted_bot(c, storage_factory()) for c in load_bot_configs()]
+
+
+async def run_sharded(configs: list[BotConfig]) -> None:
+    supervisor = Supervisor(configs, create_hosted_bots, workers=SHARD_WORKERS)
+    metrics_runner = (
+        await start_metrics_server(METRICS_HOST, METRICS_PORT, ready=supervisor.is_ready) if METRICS_PORT else None
+    )
+    try:
+        await supervisor.start()
+        print(f"Bot is running ({len(configs)} bot{'s' if len(configs) != 1 else ''}, {SHARD_WORKERS} workers)...")
+        await supervisor.poll()
+    finally:
+        await supervisor.shutdown(timeout_s=SHUTDOWN_TIMEOUT_S, metrics_runner=metrics_runner)
+
+
+async def main():
+    configs = load_bot_configs()
+    if not all(c.token for c in configs):
+        print("Error: BOT_TOKEN not found in .env file.")
+        exit(1)
+
+    if SHARD_WORKERS > 0:
+        await run_sharded(configs)
+        return
+
+    # The backend client, caches and receipt workers are module-level and shared by all bots
+    hosted = [create_hosted_bot(c) for c in configs]
+
+    # Started first so /ready reports 503 until warm-up has finished
+    metrics_runner = (
+        await start_metrics_server(METRICS_HOST, METRICS_PORT, ready=lambda: all(h.dp.is_ready() for h in hosted))
+        if METRICS_PORT
+        else None
+    )
+
+    await warm_up(hosted)
 
-    print("Bot is running...")
+    print(f"Bot is running ({len(hosted)} bot{'s' if len(hosted) != 1 else ''})...")
     try:
-        await dp.start_polling(bot)
+        await poll(hosted)
     finally:
-        # Properly close the bot session
-        await bot.session.close()
+        await shutdown(hosted, timeout_s=SHUTDOWN_TIMEOUT_S, metrics_runner=metrics_runner)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,182 @@
+"""Inline button payloads: a compact codec and one-lookup routing.
+
+Every button action is declared once below with a short versioned code and typed
+fields; ``ACTION.pack(...)`` builds its ``callback_data`` (``"d1:12345"``) and
+``decode`` turns it back into the action plus converted field values. Bump the
+code's digit when an action's fields change so stale buttons cannot be misread.
+
+Buttons sent before the codec existed carry the old ``name_value`` strings
+(``donate_to_12345``); ``decode`` still understands those, so messages already in
+users' chats keep working.
+
+``CallbackDispatcher`` registers a single callback handler with aiogram and routes
+by a dict lookup on the decoded action instead of evaluating one ``F.data`` filter
+per handler.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from aiogram import Router
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.types import CallbackQuery
+
+logger = logging.getLogger(__name__)
+
+SEP = ":"
+# Telegram rejects callback_data longer than this
+MAX_CALLBACK_DATA_BYTES = 64
+
+
+@dataclass(frozen=True)
+class Action:
+    name: str
+    code: str
+    fields: tuple[tuple[str, type], ...] = ()
+    # Leading fields that must be present; trailing ones fall back to handler defaults
+    required: int = 0
+
+    def pack(self, *values: Any) -> str:
+        if not self.required <= len(values) <= len(self.fields):
+            raise TypeError(f"{self.name} takes {self.required}..{len(self.fields)} values, got {len(values)}")
+        parts = [self.code]
+        for value in values:
+            text = str(value)
+            if SEP in text:
+                raise ValueError(f"{self.name}: {text!r} contains {SEP!r}")
+            parts.append(text)
+        data = SEP.join(parts)
+        if len(data.encode()) > MAX_CALLBACK_DATA_BYTES:
+            raise ValueError(f"{self.name}: callback data {data!r} exceeds {MAX_CALLBACK_DATA_BYTES} bytes")
+        return data
+
+    def parse(self, raw: list[str]) -> dict[str, Any] | None:
+        if not self.required <= len(raw) <= len(self.fields):
+            return None
+        try:
+            return {name: kind(value) for (name, kind), value in zip(self.fields, raw)}
+        except ValueError:
+            return None
+
+
+_BY_CODE: dict[str, Action] = {}
+_BY_NAME: dict[str, Action] = {}
+
+
+def action(name: str, code: str, *fields: tuple[str, type], required: int | None = None) -> Action:
+    if SEP in code or code in _BY_CODE or code in _BY_NAME or name in _BY_NAME or name in _BY_CODE:
+        raise ValueError(f"Callback action {name!r}/{code!r} clashes with an existing one")
+    act = Action(name, code, tuple(fields), len(fields) if required is None else required)
+    _BY_CODE[code] = act
+    _BY_NAME[name] = act
+    return act
+
+
+# Names are the payloads (or payload prefixes) the buttons used before the codec.
+MENU_DONATE = action("menu_donate", "md1")
+MENU_HISTORY = action("menu_history", "mh1")
+MENU_PROFILE = action("menu_profile", "mp1")
+MENU_SUPPORT = action("menu_support", "ms1")
+MENU_ADMIN = action("menu_admin", "ma1")
+BACK_MENU = action("back_menu", "bm1")
+CANCEL = action("cancel", "x1")
+NOOP = action("noop", "n1")
+LANG = action("lang", "l1", ("lang", str))
+DONATE_TO = action("donate_to", "d1", ("referrer_id", int))
+CURRENCY = action("currency", "c1", ("currency", str))
+GENLINK_CUSTOM = action("genlink_custom", "gc1")
+GENLINK_PROFILE = action("genlink_profile", "gp1")
+APPROVE = action("approve", "a1", ("tx_id", int))
+REJECT = action("reject", "r1", ("tx_id", int))
+
+BACK_ADMIN = action("back_admin", "ba1")
+ADMIN_STATS = action("admin_stats", "as1")
+ADMIN_SETCARD = action("admin_setcard", "asc1")
+ADMIN_CARDS = action("admin_cards", "ac1")
+ADMIN_CURRENCIES = action("admin_currencies", "acu1")
+ADMIN_SUPPORT = action("admin_support", "asu1")
+ADMIN_PROFILE = action("admin_profile", "apr1")
+ADMIN_TOGGLE_CURRENCY = action("admin_toggle_currency", "atc1", ("currency", str))
+ADMIN_CURRENCY = action("admin_currency", "acc1", ("currency", str))
+CONFIRM_SETCARD = action("confirm_setcard", "cs1")
+CANCEL_SETCARD = action("cancel_setcard", "xs1")
+CONFIRM_SUPPORT = action("confirm_support", "cu1")
+CANCEL_SUPPORT = action("cancel_support", "xu1")
+CARD_TOGGLE = action("card_toggle", "ct1", ("card_id", int))
+CARD_DELETE = action("card_delete", "cd1", ("card_id", int))
+ADMIN_TOP = action("admin_top", "t1", ("currency", str), ("page", int), required=0)
+
+_MAX_LEGACY_FIELDS = max(len(a.fields) for a in _BY_NAME.values())
+
+
+def _decode_legacy(data: str) -> tuple[Action, dict[str, Any]] | None:
+    act = _BY_NAME.get(data)
+    if act is not None:
+        values = act.parse([])
+        return None if values is None else (act, values)
+    for n in range(1, _MAX_LEGACY_FIELDS + 1):
+        parts = data.rsplit("_", n)
+        if len(parts) <= n:
+            break
+        act = _BY_NAME.get(parts[0])
+        if act is not None:
+            values = act.parse(parts[1:])
+            if values is not None:
+                return act, values
+    return None
+
+
+def decode(data: str | None) -> tuple[Action, dict[str, Any]] | None:
+    """``(action, field values)`` for a callback payload, or None if it is not ours."""
+    if not data:
+        return None
+    code, sep, rest = data.partition(SEP)
+    act = _BY_CODE.get(code)
+    if act is None:
+        return _decode_legacy(data)
+    values = act.parse(rest.split(SEP) if sep else [])
+    return None if values is None else (act, values)
+
+
+class CallbackDispatcher:
+    """One aiogram callback handler that routes decoded payloads by action name.
+
+    Handlers receive the decoded fields as keyword arguments and ``action``, plus
+    the usual aiogram data (``state``, ``bot``, ...) they ask for by name.
+    """
+
+    def __init__(self, name: str = "callbacks"):
+        self.name = name
+        self._handlers: dict[str, CallableObject] = {}
+
+    def create_router(self) -> Router:
+        """A router to include in one dispatcher; every router shares this handler table."""
+        router = Router(name=self.name)
+        router.callback_query.register(self._dispatch)
+        return router
+
+    def route(self, *actions: Action) -> Callable[[Callable[..., Awaitable[Any]]], Callable[..., Awaitable[Any]]]:
+        def decorator(fn: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+            handler = CallableObject(fn)
+            for act in actions:
+                if act.name in self._handlers:
+                    raise ValueError(f"Callback action {act.name!r} already has a handler")
+                self._handlers[act.name] = handler
+            return fn
+
+        return decorator
+
+    async def _dispatch(self, callback: CallbackQuery, **data: Any) -> Any:
+        decoded = decode(callback.data)
+        if decoded is None:
+            return UNHANDLED
+        act, values = decoded
+        handler = self._handlers.get(act.name)
+        if handler is None:
+            return UNHANDLED
+        return await handler.call(callback, **{**data, **values, "action": act})
+
+
+dispatcher = CallbackDispatcher()
+route = dispatcher.route
@@ -0,0 +1,238 @@
+"""Opt-in capture of incoming updates for ``replay.py``.
+
+With ``CAPTURE_FILE`` set, ``CaptureMiddleware`` appends every update it sees to a
+JSONL trace rotated by size (``CAPTURE_MAX_BYTES``, ``CAPTURE_BACKUPS``). Each line
+is ``{"t": unix time, "bot": name, "update": {...}}``, plus ``"admin": true`` for
+updates from the bot's admin so a replay can grant the same rights.
+
+Updates are pseudonymized before they are written. User and chat ids become keyed
+hashes, and the same id maps to the same pseudonym everywhere, including in deep
+links and ``donate_to`` buttons, so flows between donors and creators survive.
+Names, usernames and titles are replaced, phone numbers and emails are dropped, and
+file ids and chat instances are hashed. An update with an integer id field the scrubber
+does not know is not captured at all; the warning names the field to add.
+
+Free text keeps its length but not its letters or digits. Commands and currency codes
+stay readable, and so do amounts where the bot expects one: a number sent while
+choosing a donation amount and the numeric arguments of ``/setrate``, ``/top`` and
+``/cpuprofile``. Other numbers, such as phone or card numbers, are masked. Set
+``CAPTURE_SALT`` to keep pseudonyms stable across restarts; without it each process
+uses a random salt.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import logging.handlers
+import os
+import re
+import secrets
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+import callbacks as cb
+import hosting
+from config import CAPTURE_BACKUPS, CAPTURE_FILE, CAPTURE_MAX_BYTES, CAPTURE_SALT
+from states import DonateStates
+
+logger = logging.getLogger(__name__)
+
+_salt = (CAPTURE_SALT or secrets.token_hex(16)).encode()
+
+# Objects whose "id" is a user or chat id (forward_origin holds sender_user/chat/sender_chat)
+_ID_PARENTS = frozenset({
+    "from", "chat", "user", "sender_chat", "forward_from", "forward_from_chat", "via_bot", "sender_user",
+    "new_chat_members", "left_chat_member", "actor_chat", "sender_business_bot", "winners", "chats", "story",
+})
+# Fields that are themselves a user or chat id
+_ID_KEYS = frozenset({"user_id", "chat_id", "sender_chat_id", "migrate_to_chat_id", "migrate_from_chat_id"})
+_NAME_KEYS = frozenset({"first_name", "last_name", "username", "title", "sender_user_name", "author_signature"})
+_DROP_KEYS = frozenset({"phone_number", "email", "vcard"})
+# Opaque but stable identifiers of files and chats
+_HASHED_KEYS = frozenset({"file_id", "file_unique_id", "chat_instance"})
+# Callback fields holding a user id (see callbacks.py)
+_USER_FIELDS = frozenset({"referrer_id"})
+_CURRENCY = re.compile(r"^[A-Z]{3}$")
+# Short enough not to be a phone or card number
+_AMOUNT = re.compile(r"^\d{1,9}([.,]\d{1,4})?$")
+# Commands whose arguments are amounts, rates or counts
+_AMOUNT_COMMANDS = frozenset({"/setrate", "/top", "/cpuprofile"})
+
+
+def _digest(value: str) -> bytes:
+    return hmac.new(_salt, value.encode(), hashlib.sha256).digest()
+
+
+def pseudonym_id(real_id: int) -> int:
+    # Positive ids stay positive (users, private chats), negative ones negative (groups)
+    fake = 1 + int.from_bytes(_digest(f"id:{abs(real_id)}")[:5], "big")
+    return -fake if real_id < 0 else fake
+
+
+def _pseudonym_name(value: str) -> str:
+    return "u" + _digest(f"name:{value}").hex()[:8]
+
+
+def _mask(text: str) -> str:
+    return re.sub(r"[^\W_]", "x", text)
+
+
+def _scrub_id_arg(arg: str) -> str:
+    return str(pseudonym_id(int(arg))) if arg.isdigit() else _mask(arg)
+
+
+def _scrub_start_args(args: str) -> str:
+    # Deep links: "<referrer>", "profile_<referrer>", "donate_<amount>[_<referrer>]"
+    if args.isdigit():
+        return _scrub_id_arg(args)
+    parts = args.split("_")
+    if parts[0] == "profile" and len(parts) == 2:
+        return f"profile_{_scrub_id_arg(parts[1])}"
+    if parts[0] == "donate" and len(parts) in (2, 3):
+        return "_".join(["donate", parts[1], *(_scrub_id_arg(p) for p in parts[2:])])
+    return _mask(args)
+
+
+def _keep_token(token: str, amounts: bool) -> bool:
+    return bool(_CURRENCY.match(token) or (amounts and _AMOUNT.match(token)))
+
+
+def _scrub_text(text: str, amounts: bool) -> str:
+    stripped = text.strip()
+    if _keep_token(stripped, amounts):
+        return text
+    if not stripped.startswith("/"):
+        return _mask(text)
+    command, _, args = stripped.partition(" ")
+    if not args:
+        return command
+    name = command.split("@", 1)[0]
+    if name == "/start":
+        return f"{command} {_scrub_start_args(args)}"
+    keep_amounts = name in _AMOUNT_COMMANDS
+    return " ".join([command, *(t if _keep_token(t, keep_amounts) else _mask(t) for t in args.split(" "))])
+
+
+def _scrub_callback_data(data: str) -> str:
+    decoded = cb.decode(data)
+    if decoded is None:
+        return _mask(data)
+    act, values = decoded
+    scrubbed = [pseudonym_id(v) if name in _USER_FIELDS else v for name, v in values.items()]
+    return act.pack(*scrubbed)
+
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _unscrubbed_ids(raw: Any, scrubbed: Any, path: str = "") -> list[str]:
+    """Paths of integer id fields that ``_scrub`` left unchanged, e.g. from a new Bot API shape."""
+    if isinstance(raw, list) and isinstance(scrubbed, list):
+        return [p for i, (r, s) in enumerate(zip(raw, scrubbed)) for p in _unscrubbed_ids(r, s, f"{path}[{i}]")]
+    if not (isinstance(raw, dict) and isinstance(scrubbed, dict)):
+        return []
+    leaks = []
+    for key, value in raw.items():
+        if key not in scrubbed:
+            continue
+        if (key == "id" or key in _ID_KEYS) and _is_int(value):
+            if scrubbed[key] == value:
+                leaks.append(f"{path}.{key}")
+        else:
+            leaks += _unscrubbed_ids(value, scrubbed[key], f"{path}.{key}")
+    return leaks
+
+
+def _scrub(value: Any, amounts: bool, parent: str | None = None) -> Any:
+    if isinstance(value, list):
+        return [_scrub(v, amounts, parent) for v in value]
+    if not isinstance(value, dict):
+        return value
+    out: dict[str, Any] = {}
+    for key, v in value.items():
+        if key in _DROP_KEYS:
+            continue
+        if _is_int(v) and (key in _ID_KEYS or (key == "id" and parent in _ID_PARENTS)):
+            out[key] = pseudonym_id(v)
+        elif key in _NAME_KEYS and isinstance(v, str):
+            out[key] = _pseudonym_name(v)
+        elif key in _HASHED_KEYS and isinstance(v, str):
+            out[key] = "h" + _digest(f"{key}:{v}").hex()[:16]
+        elif key in ("text", "caption") and isinstance(v, str):
+            out[key] = _scrub_text(v, amounts)
+        elif key == "data" and parent == "callback_query" and isinstance(v, str):
+            out[key] = _scrub_callback_data(v)
+        else:
+            out[key] = _scrub(v, amounts, key)
+    return out
+
+
+def pseudonymize(update: dict[str, Any], *, amounts: bool = False) -> dict[str, Any]:
+    """A copy of a raw update with people, files and free text replaced.
+
+    ``amounts`` keeps a message that is just a number, for updates sent while the bot
+    waits for a donation amount. Raises ``ValueError`` rather than return an update
+    with an integer id it does not know how to pseudonymize.
+    """
+    scrubbed = _scrub(update, amounts)
+    leaks = _unscrubbed_ids(update, scrubbed)
+    if leaks:
+        raise ValueError(f"ids left in {', '.join(leaks)}")
+    return scrubbed
+
+
+def _trace_path() -> str:
+    # Sharded workers are separate processes and must not rotate the same file
+    from sharding import worker_count
+
+    if worker_count() == 1:
+        return CAPTURE_FILE
+    root, ext = os.path.splitext(CAPTURE_FILE)
+    return f"{root}.{os.getpid()}{ext}"
+
+
+_trace: logging.Logger | None = None
+
+
+def _trace_logger() -> logging.Logger:
+    global _trace
+    if _trace is None:
+        path = _trace_path()
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=CAPTURE_MAX_BYTES, backupCount=CAPTURE_BACKUPS, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _trace = logging.getLogger(f"{__name__}.trace")
+        _trace.propagate = False
+        _trace.setLevel(logging.INFO)
+        _trace.addHandler(handler)
+        logger.info(f"Capturing incoming updates to {path}")
+    return _trace
+
+
+class CaptureMiddleware(BaseMiddleware):
+    """Outer update middleware that records each update before anything can drop it."""
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        try:
+            raw = event.model_dump(mode="json", by_alias=True, exclude_none=True)
+            record: dict[str, Any] = {"t": round(time.time(), 3), "bot": hosting.current().name}
+            user = data.get("event_from_user")
+            if user is not None and hosting.is_admin(user.id):
+                record["admin"] = True
+            # FSMContextMiddleware runs first, so the sender's state is known here
+            amounts = data.get("raw_state") == DonateStates.awaiting_amount.state
+            record["update"] = pseudonymize(raw, amounts=amounts)
+            _trace_logger().info(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        except Exception as e:
+            logger.warning(f"Failed to capture update {event.update_id}: {e}")
+        return await handler(event, data)
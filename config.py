@@ -11,3 +11,81 @@ ADMIN_ID = int(_admin_id.strip()) if _admin_id else None
 
 CONVEX_URL = os.getenv("CONVEX_URL")
 CONVEX_AUTHORIZATION = os.getenv("CONVEX_AUTHORIZATION")
+
+# Tracing: "" (disabled export), "file" or "otlp"
+TRACE_EXPORTER = (os.getenv("TRACE_EXPORTER") or "").strip().lower()
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318")
+SLOW_UPDATE_MS = float(os.getenv("SLOW_UPDATE_MS", "1000"))
+
+# Storage backend: "convex" (default) or "sqlite"
+DB_BACKEND = (os.getenv("DB_BACKEND") or "convex").strip().lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "donation_bot.db")
+
+# In-process caches in front of the backend (see database.py)
+KNOWN_USERS_CACHE_SIZE = int(os.getenv("KNOWN_USERS_CACHE_SIZE", "100000"))
+SETTINGS_CACHE_TTL_S = float(os.getenv("SETTINGS_CACHE_TTL_S", "30"))
+LEADERBOARD_CACHE_TTL_S = float(os.getenv("LEADERBOARD_CACHE_TTL_S", "60"))
+CACHE_SUBSCRIPTIONS_ENABLED = (os.getenv("CACHE_SUBSCRIPTIONS_ENABLED", "0").strip().lower() in ("1", "true", "yes"))
+
+# Flood control: token-bucket rates in cost units per second (see middlewares.py)
+FLOOD_CONTROL_ENABLED = (os.getenv("FLOOD_CONTROL_ENABLED", "1").strip().lower() not in ("0", "false", "no"))
+FLOOD_USER_RATE = float(os.getenv("FLOOD_USER_RATE", "2"))
+FLOOD_USER_BURST = float(os.getenv("FLOOD_USER_BURST", "20"))
+FLOOD_GLOBAL_RATE = float(os.getenv("FLOOD_GLOBAL_RATE", "300"))
+FLOOD_GLOBAL_BURST = float(os.getenv("FLOOD_GLOBAL_BURST", "600"))
+FLOOD_CALLBACK_COSTS = os.getenv("FLOOD_CALLBACK_COSTS", "")
+
+# Updates from one user run in order; this caps how many users are handled at once (0 = no cap)
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "100"))
+
+# Seconds to wait for in-flight updates on SIGTERM before closing clients
+SHUTDOWN_TIMEOUT_S = float(os.getenv("SHUTDOWN_TIMEOUT_S", "25"))
+
+# Totals in other currencies are converted to this one using the admin-managed rate table
+REPORTING_CURRENCY = (os.getenv("REPORTING_CURRENCY") or "USD").strip().upper()
+
+# Duplicate receipt detection (needs Pillow); hashes run in a process pool
+RECEIPT_HASHING_ENABLED = (os.getenv("RECEIPT_HASHING_ENABLED", "0").strip().lower() in ("1", "true", "yes"))
+RECEIPT_HASH_WORKERS = int(os.getenv("RECEIPT_HASH_WORKERS", "2"))
+RECEIPT_MAX_DISTANCE = min(int(os.getenv("RECEIPT_MAX_DISTANCE", "3")), 3)  # band index guarantees up to 3
+RECEIPT_HASH_TIMEOUT_S = float(os.getenv("RECEIPT_HASH_TIMEOUT_S", "5"))
+# Hash bands shared by more receipts than this (a banking app's layout) are not searched
+RECEIPT_MAX_BAND_ROWS = int(os.getenv("RECEIPT_MAX_BAND_ROWS", "200"))
+
+# Admin /export: rows fetched per backend page, and seconds between progress edits
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+EXPORT_PROGRESS_INTERVAL_S = float(os.getenv("EXPORT_PROGRESS_INTERVAL_S", "5"))
+
+# Admin /cpuprofile: milliseconds between stack samples, and the longest session allowed
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "10"))
+PROFILER_MAX_SECONDS = int(os.getenv("PROFILER_MAX_SECONDS", "120"))
+
+# Event-loop monitor (see loopmonitor.py): lag probe period, stall threshold (0 disables), task census
+LOOP_LAG_INTERVAL_MS = float(os.getenv("LOOP_LAG_INTERVAL_MS", "100"))
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "250"))
+LOOP_CENSUS_INTERVAL_S = float(os.getenv("LOOP_CENSUS_INTERVAL_S", "15"))
+LOOP_TASK_WARN = int(os.getenv("LOOP_TASK_WARN", "5000"))
+
+# Prometheus-style metrics endpoint; 0 disables it
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Messages whose last rendered content is remembered so identical edits are skipped
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "50000"))
+
+# JSON list of bots to host in this process (see hosting.py); unset runs the single BOT_TOKEN bot
+BOTS_FILE = os.getenv("BOTS_FILE")
+
+# Worker processes that handle updates, partitioned by user id (see sharding.py); 0 handles them in this process
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "0"))
+SHARD_HEARTBEAT_S = float(os.getenv("SHARD_HEARTBEAT_S", "1"))
+SHARD_HEARTBEAT_TIMEOUT_S = float(os.getenv("SHARD_HEARTBEAT_TIMEOUT_S", "10"))
+SHARD_CHECKPOINT_S = float(os.getenv("SHARD_CHECKPOINT_S", "1"))
+
+# Opt-in capture of incoming updates for replay.py: pseudonymized JSONL, rotated by size
+CAPTURE_FILE = os.getenv("CAPTURE_FILE", "")
+CAPTURE_MAX_BYTES = int(os.getenv("CAPTURE_MAX_BYTES", str(50 * 2**20)))
+CAPTURE_BACKUPS = int(os.getenv("CAPTURE_BACKUPS", "5"))
+# Keeps pseudonyms stable across restarts; a random salt is used when unset
+CAPTURE_SALT = os.getenv("CAPTURE_SALT", "")
@@ -9,8 +9,10 @@
  */
 
 import type * as cards from "../cards.js";
+import type * as creators from "../creators.js";
 import type * as meta from "../meta.js";
 import type * as migrations from "../migrations.js";
+import type * as receipts from "../receipts.js";
 import type * as settings from "../settings.js";
 import type * as transactions from "../transactions.js";
 import type * as users from "../users.js";
@@ -23,8 +25,10 @@ import type {
 
 declare const fullApi: ApiFromModules<{
   cards: typeof cards;
+  creators: typeof creators;
   meta: typeof meta;
   migrations: typeof migrations;
+  receipts: typeof receipts;
   settings: typeof settings;
   transactions: typeof transactions;
   users: typeof users;
@@ -112,8 +112,18 @@ export const activeCards = query({
 });
 
 export const nextActiveCard = mutation({
-  args: { currency: v.string() },
-  handler: async ({ db }, { currency }) => {
+  args: { currency: v.string(), tx_id: v.optional(v.union(v.number(), v.null())) },
+  handler: async ({ db }, { currency, tx_id }) => {
+    // When tied to a transaction, the card is assigned once so retries don't advance the pointer
+    const tx =
+      tx_id != null
+        ? await db
+            .query("transactions")
+            .withIndex("by_tx_id", (q) => q.eq("tx_id", tx_id))
+            .unique()
+        : null;
+    if (tx?.card_details) return tx.card_details;
+
     const ccy = currency.trim().toUpperCase();
     const cards = await db
       .query("cards")
@@ -142,6 +152,7 @@ export const nextActiveCard = mutation({
     const chosen = cards[ptr];
     const nextPtr = (ptr + 1) % cards.length;
     await setSettingValue(db, ptrKey, String(nextPtr));
+    if (tx) await db.patch(tx._id, { card_details: chosen.details });
     return chosen.details;
   },
 });
@@ -0,0 +1,82 @@
+import { query } from "./_generated/server";
+import type { DatabaseWriter } from "./_generated/server";
+import type { Doc } from "./_generated/dataModel";
+import { v } from "convex/values";
+
+type CreatorDelta = { total?: number; approved_count?: number; pending_total?: number; pending_count?: number };
+
+// Called from transactions:updateProof/updateStatus as a donation to a creator moves
+// between pending and approved. The creator's name is copied in so leaderboard pages
+// read one document per row.
+export const updateCreatorTotals = async (db: DatabaseWriter, tx: Doc<"transactions">, delta: CreatorDelta) => {
+  if (tx.referrer_id === null) return;
+  const referrer_id = tx.referrer_id;
+  const creator = await db
+    .query("users")
+    .withIndex("by_user_id", (q) => q.eq("user_id", referrer_id))
+    .unique();
+  const names = { username: creator?.username ?? null, first_name: creator?.first_name ?? null };
+  const row = await db
+    .query("creator_totals")
+    .withIndex("by_referrer_currency", (q) => q.eq("referrer_id", referrer_id).eq("currency", tx.currency))
+    .unique();
+  if (row) {
+    await db.patch(row._id, {
+      total: row.total + (delta.total ?? 0),
+      approved_count: row.approved_count + (delta.approved_count ?? 0),
+      pending_total: Math.max(0, (row.pending_total ?? 0) + (delta.pending_total ?? 0)),
+      pending_count: Math.max(0, (row.pending_count ?? 0) + (delta.pending_count ?? 0)),
+      ...names,
+    });
+  } else {
+    await db.insert("creator_totals", {
+      referrer_id,
+      currency: tx.currency,
+      total: delta.total ?? 0,
+      approved_count: delta.approved_count ?? 0,
+      pending_total: Math.max(0, delta.pending_total ?? 0),
+      pending_count: Math.max(0, delta.pending_count ?? 0),
+      ...names,
+    });
+  }
+};
+
+export const leaderboard = query({
+  args: { currency: v.string(), numItems: v.number(), cursor: v.union(v.string(), v.null()) },
+  handler: async ({ db }, { currency, numItems, cursor }) => {
+    const page = await db
+      .query("creator_totals")
+      .withIndex("by_currency_total", (q) => q.eq("currency", currency))
+      .order("desc")
+      .filter((q) => q.gt(q.field("total"), 0)) // Rows with only pending donations sort last
+      .paginate({ numItems, cursor });
+    return {
+      rows: page.page.map((row) => ({
+        referrer_id: row.referrer_id,
+        username: row.username,
+        first_name: row.first_name,
+        total: row.total,
+        approved_count: row.approved_count,
+      })),
+      cursor: page.isDone ? null : page.continueCursor,
+    };
+  },
+});
+
+// Incoming donations for one recipient: at most one row per currency
+export const dashboard = query({
+  args: { referrer_id: v.number() },
+  handler: async ({ db }, { referrer_id }) => {
+    const rows = await db
+      .query("creator_totals")
+      .withIndex("by_referrer_currency", (q) => q.eq("referrer_id", referrer_id))
+      .collect();
+    return rows.map((row) => ({
+      currency: row.currency,
+      total: row.total,
+      approved_count: row.approved_count,
+      pending_total: row.pending_total ?? 0,
+      pending_count: row.pending_count ?? 0,
+    }));
+  },
+});
@@ -30,6 +30,21 @@ export const initDefaults = mutation({
     await ensureCounter("transactions");
     await ensureCounter("cards");
 
+    // updateStatus maintains the stats aggregate incrementally, so it has to exist
+    const stats = await db
+      .query("aggregates")
+      .withIndex("by_key", (q) => q.eq("key", "stats"))
+      .unique();
+    if (!stats) {
+      await db.insert("aggregates", {
+        key: "stats",
+        total_raised: 0,
+        total_donors: 0,
+        pending_reviews: 0,
+        raised_by_currency: {},
+      });
+    }
+
     return true;
   },
 });
@@ -1,61 +1,397 @@
-import { internalMutation } from "./_generated/server";
+import { internalMutation, internalQuery } from "./_generated/server";
+import type { DatabaseWriter, MutationCtx } from "./_generated/server";
+import type { Doc } from "./_generated/dataModel";
+import { internal } from "./_generated/api";
 import { v } from "convex/values";
 
-export const backfillStats = internalMutation({
-    args: {},
-    handler: async ({ db }) => {
-        // 1. Calculate Global Stats
-        const approved = await db
-            .query("transactions")
-            .withIndex("by_status", (q) => q.eq("status", "approved"))
-            .collect();
-
-        const pending = await db
-            .query("transactions")
-            .withIndex("by_status", (q) => q.eq("status", "pending_approval"))
-            .collect();
-
-        const total_raised = approved.reduce((sum, t) => sum + (t.amount ?? 0), 0);
-        const donors = new Set(approved.map((t) => t.user_id));
-
-        // Update Aggregates
-        const existingStats = await db
-            .query("aggregates")
-            .withIndex("by_key", (q) => q.eq("key", "stats"))
-            .unique();
+// Backfills run as a chain of small mutations. Each step reads one page of the current
+// phase, applies its writes and saves the cursor and running state in the `migrations`
+// table in the same transaction, then schedules the next step. A failed step changes
+// nothing, so `migrations:run` resumes from the last committed page.
+//
+// The bot keeps writing while a backfill runs, so totals are not rebuilt in place. A run
+// clears its shadow table, scans every transaction in tx_id order adding its share to
+// the shadow totals, then copies the shadow over the live totals. Mutations that change
+// or delete a transaction call `trackTransactionChange`, which applies the change to the
+// shadow too once the scan has passed that transaction, so the shadow always equals a
+// recompute of the current data and the copy does not lose live updates. Until the copy
+// reaches a row, the row keeps its old value; global stats switch when the run finishes.
+//
+//   npx convex run migrations:backfillStats        # recompute from scratch
+//   npx convex run migrations:run '{"name": "stats"}'  # resume after a failure
+//   npx convex run migrations:status
 
-        if (existingStats) {
-            await db.patch(existingStats._id, {
-                total_raised,
-                total_donors: donors.size,
-                pending_reviews: pending.length,
-            });
-        } else {
-            await db.insert("aggregates", {
-                key: "stats",
-                total_raised,
-                total_donors: donors.size,
-                pending_reviews: pending.length,
-            });
-        }
+const DEFAULT_BATCH_SIZE = 200;
+
+type Page = { docs: any[]; isDone: boolean; cursor: string | null };
+
+type Phase<S> = {
+  name: string;
+  page: (db: DatabaseWriter, cursor: string | null, numItems: number, state: S) => Promise<Page>;
+  process: (db: DatabaseWriter, docs: any[], state: S) => Promise<void>;
+};
+
+// Transactions up to scanned_to are already counted in the shadow
+type ScanState = { scanned_to: number };
 
-        // 2. Calculate User Stats
-        const users = await db.query("users").collect();
+type Migration<S extends ScanState> = {
+  init: () => S;
+  shadow: "creator_totals_shadow" | "user_totals_shadow";
+  // Adds (1) or removes (-1) one transaction's share of the shadow totals
+  count: (db: DatabaseWriter, tx: Doc<"transactions">, sign: 1 | -1, state: S) => Promise<void>;
+  copy: Phase<S>[];
+  finish: (db: DatabaseWriter, state: S) => Promise<string>;
+};
+
+const paginate = async (query: any, cursor: string | null, numItems: number): Promise<Page> => {
+  const result = await query.paginate({ cursor, numItems });
+  return { docs: result.page, isDone: result.isDone, cursor: result.continueCursor };
+};
+
+const addToCurrency = (totals: Record<string, number>, currency: string, amount: number) => {
+  totals[currency] = (totals[currency] ?? 0) + (amount ?? 0);
+};
+
+// ===== stats: aggregates.stats and users' donated totals =====
+
+type StatsState = ScanState & {
+  total_raised: number;
+  raised_by_currency: Record<string, number>;
+  total_donors: number;
+  pending_reviews: number;
+};
+
+const statsMigration: Migration<StatsState> = {
+  init: () => ({ scanned_to: 0, total_raised: 0, raised_by_currency: {}, total_donors: 0, pending_reviews: 0 }),
+  shadow: "user_totals_shadow",
+  count: async (db, tx, sign, state) => {
+    if (tx.status === "pending_approval") {
+      state.pending_reviews += sign;
+      return;
+    }
+    if (tx.status !== "approved") return;
+    const amount = sign * (tx.amount ?? 0);
+    state.total_raised += amount;
+    addToCurrency(state.raised_by_currency, tx.currency, amount);
+    const row = await db
+      .query("user_totals_shadow")
+      .withIndex("by_user_id", (q) => q.eq("user_id", tx.user_id))
+      .unique();
+    const before = row?.approved_count ?? 0;
+    state.total_donors += Number(before + sign > 0) - Number(before > 0);
+    const by_currency = { ...(row?.by_currency ?? {}) };
+    addToCurrency(by_currency, tx.currency, amount);
+    if (row) {
+      await db.patch(row._id, { total: row.total + amount, by_currency, approved_count: before + sign });
+    } else {
+      await db.insert("user_totals_shadow", { user_id: tx.user_id, total: amount, by_currency, approved_count: sign });
+    }
+  },
+  copy: [
+    {
+      // Users without approved donations have no shadow row and go back to zero
+      name: "copy users",
+      page: (db, cursor, numItems) => paginate(db.query("users"), cursor, numItems),
+      process: async (db, users: Doc<"users">[]) => {
         for (const user of users) {
-            const userTxs = await db
-                .query("transactions")
-                .withIndex("by_user_created_at_ms", (q) => q.eq("user_id", user.user_id))
-                .collect();
-
-            const userTotal = userTxs
-                .filter((t) => t.status === "approved")
-                .reduce((sum, t) => sum + (t.amount ?? 0), 0);
-
-            await db.patch(user._id, {
-                total_donated: userTotal,
-            });
+          const row = await db
+            .query("user_totals_shadow")
+            .withIndex("by_user_id", (q) => q.eq("user_id", user.user_id))
+            .unique();
+          await db.patch(user._id, { total_donated: row?.total ?? 0, donated_by_currency: row?.by_currency ?? {} });
         }
+      },
+    },
+  ],
+  finish: async (db, state) => {
+    // updateStatus keeps total_raised current from here on; donors and pending reviews
+    // are not maintained incrementally and drift until the next run
+    const totals = {
+      total_raised: state.total_raised,
+      total_donors: state.total_donors,
+      pending_reviews: state.pending_reviews,
+      raised_by_currency: state.raised_by_currency,
+    };
+    const existing = await db
+      .query("aggregates")
+      .withIndex("by_key", (q) => q.eq("key", "stats"))
+      .unique();
+    if (existing) {
+      await db.patch(existing._id, totals);
+    } else {
+      await db.insert("aggregates", { key: "stats", ...totals });
+    }
+    return `Backfilled stats: ${state.total_donors} donors, ${state.pending_reviews} pending reviews`;
+  },
+};
+
+// ===== creator_totals: per-recipient approved and pending totals =====
+
+type CreatorState = ScanState & { approved: number; pending: number };
+
+const creatorTotalsMigration: Migration<CreatorState> = {
+  init: () => ({ scanned_to: 0, approved: 0, pending: 0 }),
+  shadow: "creator_totals_shadow",
+  count: async (db, tx, sign, state) => {
+    const approved = tx.status === "approved";
+    const pending = tx.status === "pending_approval";
+    if (tx.referrer_id === null || (!approved && !pending)) return;
+    const referrer_id = tx.referrer_id;
+    const amount = sign * (tx.amount ?? 0);
+    const delta = {
+      total: approved ? amount : 0,
+      approved_count: approved ? sign : 0,
+      pending_total: pending ? amount : 0,
+      pending_count: pending ? sign : 0,
+    };
+    state.approved += delta.approved_count;
+    state.pending += delta.pending_count;
+    const row = await db
+      .query("creator_totals_shadow")
+      .withIndex("by_referrer_currency", (q) => q.eq("referrer_id", referrer_id).eq("currency", tx.currency))
+      .unique();
+    if (row) {
+      await db.patch(row._id, {
+        total: row.total + delta.total,
+        approved_count: row.approved_count + delta.approved_count,
+        pending_total: row.pending_total + delta.pending_total,
+        pending_count: row.pending_count + delta.pending_count,
+      });
+    } else {
+      await db.insert("creator_totals_shadow", { referrer_id, currency: tx.currency, ...delta });
+    }
+  },
+  copy: [
+    {
+      name: "copy",
+      page: (db, cursor, numItems) => paginate(db.query("creator_totals_shadow"), cursor, numItems),
+      process: async (db, rows: Doc<"creator_totals_shadow">[]) => {
+        for (const row of rows) {
+          const creator = await db
+            .query("users")
+            .withIndex("by_user_id", (q) => q.eq("user_id", row.referrer_id))
+            .unique();
+          const values = {
+            total: row.total,
+            approved_count: row.approved_count,
+            pending_total: Math.max(0, row.pending_total),
+            pending_count: Math.max(0, row.pending_count),
+            username: creator?.username ?? null,
+            first_name: creator?.first_name ?? null,
+          };
+          const live = await db
+            .query("creator_totals")
+            .withIndex("by_referrer_currency", (q) => q.eq("referrer_id", row.referrer_id).eq("currency", row.currency))
+            .unique();
+          if (live) {
+            await db.patch(live._id, values);
+          } else {
+            await db.insert("creator_totals", { referrer_id: row.referrer_id, currency: row.currency, ...values });
+          }
+        }
+      },
+    },
+    {
+      // Live rows no transaction accounts for any more
+      name: "remove stale",
+      page: (db, cursor, numItems) => paginate(db.query("creator_totals"), cursor, numItems),
+      process: async (db, rows: Doc<"creator_totals">[]) => {
+        for (const row of rows) {
+          const shadow = await db
+            .query("creator_totals_shadow")
+            .withIndex("by_referrer_currency", (q) => q.eq("referrer_id", row.referrer_id).eq("currency", row.currency))
+            .unique();
+          if (!shadow) await db.delete(row._id);
+        }
+      },
+    },
+  ],
+  finish: async (_db, state) =>
+    `Backfilled creator totals from ${state.approved} approved and ${state.pending} pending donations`,
+};
 
-        return "Migration Complete";
+const MIGRATIONS: Record<string, Migration<any>> = {
+  stats: statsMigration,
+  creator_totals: creatorTotalsMigration,
+};
+
+// ===== phases =====
+
+const SCAN_PHASE = 1;
+
+const phasesOf = <S extends ScanState>(migration: Migration<S>): Phase<S>[] => [
+  {
+    // Left over from the previous run; deleted rows drop out of the next take()
+    name: "clear shadow",
+    page: async (db, _cursor, numItems) => {
+      const docs = await db.query(migration.shadow).take(numItems);
+      return { docs, isDone: docs.length < numItems, cursor: null };
+    },
+    process: async (db, rows) => {
+      for (const row of rows) await db.delete(row._id);
+    },
+  },
+  {
+    // tx_id order, so whether a change is already counted is one comparison
+    name: "transactions",
+    page: async (db, _cursor, numItems, state) => {
+      const docs = await db
+        .query("transactions")
+        .withIndex("by_tx_id", (q) => q.gt("tx_id", state.scanned_to))
+        .take(numItems);
+      return { docs, isDone: docs.length < numItems, cursor: null };
+    },
+    process: async (db, txs: Doc<"transactions">[], state) => {
+      for (const tx of txs) {
+        await migration.count(db, tx, 1, state);
+        state.scanned_to = tx.tx_id;
+      }
     },
+  },
+  ...migration.copy,
+];
+
+const PHASES: Record<string, Phase<any>[]> = Object.fromEntries(
+  Object.entries(MIGRATIONS).map(([name, migration]) => [name, phasesOf(migration)]),
+);
+
+// Called before a transaction's status, amount or recipient changes (after = null when
+// it is deleted). While a run is scanning or copying, a transaction it has already
+// counted moves from its old share of the shadow totals to its new one.
+export const trackTransactionChange = async (
+  db: DatabaseWriter,
+  before: Doc<"transactions">,
+  after: Doc<"transactions"> | null,
+) => {
+  for (const [name, migration] of Object.entries(MIGRATIONS)) {
+    const progress = await db
+      .query("migrations")
+      .withIndex("by_name", (q) => q.eq("name", name))
+      .unique();
+    if (!progress || progress.done || progress.phase < SCAN_PHASE) continue;
+    const state = progress.state;
+    if (progress.phase === SCAN_PHASE && before.tx_id > state.scanned_to) continue;
+    await migration.count(db, before, -1, state);
+    if (after) await migration.count(db, after, 1, state);
+    await db.patch(progress._id, { state });
+  }
+};
+
+// ===== runner =====
+
+// Every manual start takes a new run_id, so a chain still scheduled from an earlier
+// start stops at its next step instead of racing the new one.
+const start = async (
+  ctx: MutationCtx,
+  name: string,
+  batchSize: number | undefined,
+  restart: boolean,
+): Promise<string | null> => {
+  const migration = MIGRATIONS[name];
+  if (!migration) throw new Error(`Unknown migration: ${name}`);
+  const now = Date.now();
+  const progress = await ctx.db
+    .query("migrations")
+    .withIndex("by_name", (q) => q.eq("name", name))
+    .unique();
+  if (progress?.done && !restart) return progress.result;
+
+  const run_id = (progress?.run_id ?? 0) + 1;
+  if (!progress) {
+    await ctx.db.insert("migrations", {
+      name,
+      run_id,
+      phase: 0,
+      cursor: null,
+      state: migration.init(),
+      processed: 0,
+      done: false,
+      result: null,
+      started_at_ms: now,
+      updated_at_ms: now,
+    });
+  } else if (restart) {
+    await ctx.db.patch(progress._id, {
+      run_id,
+      phase: 0,
+      cursor: null,
+      state: migration.init(),
+      processed: 0,
+      done: false,
+      result: null,
+      started_at_ms: now,
+      updated_at_ms: now,
+    });
+  } else {
+    await ctx.db.patch(progress._id, { run_id, updated_at_ms: now });
+  }
+  await ctx.scheduler.runAfter(0, internal.migrations.step, {
+    name,
+    run_id,
+    batchSize: batchSize ?? DEFAULT_BATCH_SIZE,
+  });
+  return `${name}: started run ${run_id}`;
+};
+
+export const run = internalMutation({
+  args: { name: v.string(), batchSize: v.optional(v.number()), restart: v.optional(v.boolean()) },
+  handler: async (ctx, { name, batchSize, restart }) => start(ctx, name, batchSize, restart ?? false),
+});
+
+export const step = internalMutation({
+  args: { name: v.string(), run_id: v.number(), batchSize: v.number() },
+  handler: async (ctx, { name, run_id, batchSize }): Promise<void> => {
+    const migration = MIGRATIONS[name];
+    const progress = await ctx.db
+      .query("migrations")
+      .withIndex("by_name", (q) => q.eq("name", name))
+      .unique();
+    if (!migration || !progress || progress.done || progress.run_id !== run_id) return;
+
+    const phases = PHASES[name];
+    const phase = phases[progress.phase];
+    const state = progress.state;
+    const page = await phase.page(ctx.db, progress.cursor, batchSize, state);
+    await phase.process(ctx.db, page.docs, state);
+
+    const next = {
+      phase: page.isDone ? progress.phase + 1 : progress.phase,
+      cursor: page.isDone ? null : page.cursor,
+      processed: progress.processed + page.docs.length,
+      state,
+      updated_at_ms: Date.now(),
+    };
+    if (next.phase < phases.length) {
+      await ctx.db.patch(progress._id, next);
+      await ctx.scheduler.runAfter(0, internal.migrations.step, { name, run_id, batchSize });
+      return;
+    }
+    const result = await migration.finish(ctx.db, state);
+    await ctx.db.patch(progress._id, { ...next, done: true, result });
+    console.log(`Migration ${name} finished after ${next.processed} documents: ${result}`);
+  },
+});
+
+export const status = internalQuery({
+  args: {},
+  handler: async ({ db }) =>
+    (await db.query("migrations").collect()).map((m) => ({
+      name: m.name,
+      phase: PHASES[m.name]?.[m.phase]?.name ?? "finished",
+      processed: m.processed,
+      done: m.done,
+      result: m.result,
+      updated_at_ms: m.updated_at_ms,
+    })),
+});
+
+// Recompute from scratch; kept under their original names
+export const backfillStats = internalMutation({
+  args: { batchSize: v.optional(v.number()) },
+  handler: async (ctx, { batchSize }) => start(ctx, "stats", batchSize, true),
+});
+
+export const backfillCreatorTotals = internalMutation({
+  args: { batchSize: v.optional(v.number()) },
+  handler: async (ctx, { batchSize }) => start(ctx, "creator_totals", batchSize, true),
 });
@@ -0,0 +1,66 @@
+import { mutation } from "./_generated/server";
+import { v } from "convex/values";
+
+const DEFAULT_MAX_BAND_ROWS = 200;
+
+// Hashes are 64-bit, so compare them as four 16-bit chunks to stay within JS number precision
+const hammingDistance = (a: string, b: string) => {
+  let distance = 0;
+  for (let i = 0; i < a.length; i += 4) {
+    let x = parseInt(a.slice(i, i + 4), 16) ^ parseInt(b.slice(i, i + 4), 16);
+    while (x) {
+      distance += x & 1;
+      x >>= 1;
+    }
+  }
+  return distance;
+};
+
+export const record = mutation({
+  args: {
+    tx_id: v.number(),
+    user_id: v.number(),
+    phash: v.string(),
+    bands: v.array(v.string()),
+    max_distance: v.number(),
+    max_band_rows: v.optional(v.number()),
+  },
+  handler: async ({ db }, { tx_id, user_id, phash, bands, max_distance, max_band_rows }) => {
+    // Candidates share at least one band; that finds everything within distance 3.
+    // Receipts from one banking app can share a band through their layout alone; such a
+    // band would grow with the table, so one holding more than max_band_rows receipts is
+    // skipped and only the other bands are searched.
+    const limit = max_band_rows ?? DEFAULT_MAX_BAND_ROWS;
+    const candidates = new Map<number, { user_id: number; phash: string }>();
+    for (const band of bands) {
+      const rows = await db
+        .query("receipt_hashes")
+        .withIndex("by_band_created_at_ms", (q) => q.eq("band", band))
+        .order("desc")
+        .take(limit + 1);
+      if (rows.length > limit) continue;
+      for (const row of rows) {
+        if (row.tx_id !== tx_id) candidates.set(row.tx_id, { user_id: row.user_id, phash: row.phash });
+      }
+    }
+
+    // A re-uploaded proof replaces the transaction's previous hash
+    const previous = await db
+      .query("receipt_hashes")
+      .withIndex("by_tx_id", (q) => q.eq("tx_id", tx_id))
+      .collect();
+    for (const row of previous) await db.delete(row._id);
+    const created_at_ms = Date.now();
+    for (const band of bands) {
+      await db.insert("receipt_hashes", { tx_id, user_id, phash, band, created_at_ms });
+    }
+
+    const matches = [];
+    for (const [other_tx_id, row] of candidates) {
+      const distance = hammingDistance(phash, row.phash);
+      if (distance <= max_distance) matches.push({ tx_id: other_tx_id, user_id: row.user_id, distance });
+    }
+    matches.sort((a, b) => a.distance - b.distance || a.tx_id - b.tx_id);
+    return matches;
+  },
+});
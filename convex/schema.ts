@@ -11,6 +11,7 @@ export default defineSchema({
     joined_at: v.string(),
     joined_at_ms: v.number(),
     total_donated: v.optional(v.number()), // Aggregated stats
+    donated_by_currency: v.optional(v.record(v.string(), v.number())), // Approved amounts per currency
   }).index("by_user_id", ["user_id"]),
 
   aggregates: defineTable({
@@ -18,6 +19,7 @@ export default defineSchema({
     total_raised: v.number(),
     total_donors: v.number(),
     pending_reviews: v.number(),
+    raised_by_currency: v.optional(v.record(v.string(), v.number())),
   }).index("by_key", ["key"]),
 
   transactions: defineTable({
@@ -30,10 +32,16 @@ export default defineSchema({
     created_at: v.string(),
     created_at_ms: v.number(),
     referrer_id: v.union(v.number(), v.null()),
+    idempotency_key: v.optional(v.string()), // Dedupes retried/double-tapped creates
+    card_details: v.optional(v.string()), // Card assigned by cards:nextActiveCard
   })
     .index("by_tx_id", ["tx_id"])
     .index("by_status", ["status"])
-    .index("by_user_created_at_ms", ["user_id", "created_at_ms"]),
+    .index("by_status_created_at_ms", ["status", "created_at_ms"])
+    .index("by_created_at_ms", ["created_at_ms"])
+    .index("by_user_created_at_ms", ["user_id", "created_at_ms"])
+    .index("by_referrer_created_at_ms", ["referrer_id", "created_at_ms"])
+    .index("by_idempotency_key", ["idempotency_key"]),
 
   settings: defineTable({
     key: v.string(),
@@ -60,5 +68,60 @@ export default defineSchema({
     key: v.string(),
     value: v.number(),
   }).index("by_key", ["key"]),
-});
 
+  // Donations per recipient (referrer_id) and currency; approved ones ranked by total
+  creator_totals: defineTable({
+    referrer_id: v.number(),
+    currency: v.string(),
+    total: v.number(),
+    approved_count: v.number(),
+    pending_total: v.optional(v.number()), // Proof uploaded, awaiting review
+    pending_count: v.optional(v.number()),
+    username: v.union(v.string(), v.null()), // Copied from users on each update
+    first_name: v.union(v.string(), v.null()),
+  })
+    .index("by_referrer_currency", ["referrer_id", "currency"])
+    .index("by_currency_total", ["currency", "total"]),
+
+  // Totals a running backfill recomputes before copying them over the live ones (see migrations.ts)
+  creator_totals_shadow: defineTable({
+    referrer_id: v.number(),
+    currency: v.string(),
+    total: v.number(),
+    approved_count: v.number(),
+    pending_total: v.number(),
+    pending_count: v.number(),
+  }).index("by_referrer_currency", ["referrer_id", "currency"]),
+
+  user_totals_shadow: defineTable({
+    user_id: v.number(),
+    total: v.number(),
+    by_currency: v.record(v.string(), v.number()),
+    approved_count: v.number(),
+  }).index("by_user_id", ["user_id"]),
+
+  // One row per 16-bit band of a proof's perceptual hash (see receipts.ts)
+  receipt_hashes: defineTable({
+    tx_id: v.number(),
+    user_id: v.number(),
+    phash: v.string(), // 64-bit dHash as 16 hex chars
+    band: v.string(), // "<index>:<4 hex chars>"
+    created_at_ms: v.number(),
+  })
+    .index("by_band_created_at_ms", ["band", "created_at_ms"])
+    .index("by_tx_id", ["tx_id"]),
+
+  // Progress of batched backfills (see migrations.ts); `state` holds running totals
+  migrations: defineTable({
+    name: v.string(),
+    run_id: v.number(),
+    phase: v.number(),
+    cursor: v.union(v.string(), v.null()),
+    state: v.any(),
+    processed: v.number(),
+    done: v.boolean(),
+    result: v.union(v.string(), v.null()),
+    started_at_ms: v.number(),
+    updated_at_ms: v.number(),
+  }).index("by_name", ["name"]),
+});
@@ -5,6 +5,12 @@ import { v } from "convex/values";
 
 const SUPPORTED_CURRENCIES = ["UAH", "RUB", "USD"];
 const DONATION_ENABLED_CURRENCIES_KEY = "donation_enabled_currencies";
+// JSON object: units of the reporting currency per 1 unit of each currency
+const EXCHANGE_RATES_KEY = "exchange_rates";
+
+// Bots hosted in one process keep their own settings under "<namespace>:<key>"
+const namespacedKey = (key: string, namespace?: string): string =>
+  namespace ? `${namespace}:${key}` : key;
 
 const getSettingDoc = async (
   db: DatabaseReader | DatabaseWriter,
@@ -38,30 +44,31 @@ export const set = mutation({
 });
 
 export const getSupportMessage = query({
-  args: {},
-  handler: async ({ db }) => {
-    const doc = await getSettingDoc(db, "support_message");
+  args: { namespace: v.optional(v.string()) },
+  handler: async ({ db }, { namespace }) => {
+    const doc = await getSettingDoc(db, namespacedKey("support_message", namespace));
     return doc?.value ?? null;
   },
 });
 
 export const setSupportMessage = mutation({
-  args: { message: v.string() },
-  handler: async ({ db }, { message }) => {
-    const doc = await getSettingDoc(db, "support_message");
+  args: { message: v.string(), namespace: v.optional(v.string()) },
+  handler: async ({ db }, { message, namespace }) => {
+    const key = namespacedKey("support_message", namespace);
+    const doc = await getSettingDoc(db, key);
     if (doc) {
       await db.patch(doc._id, { value: message });
       return true;
     }
-    await db.insert("settings", { key: "support_message", value: message });
+    await db.insert("settings", { key, value: message });
     return true;
   },
 });
 
 export const getEnabledDonationCurrencies = query({
-  args: {},
-  handler: async ({ db }) => {
-    const doc = await getSettingDoc(db, DONATION_ENABLED_CURRENCIES_KEY);
+  args: { namespace: v.optional(v.string()) },
+  handler: async ({ db }, { namespace }) => {
+    const doc = await getSettingDoc(db, namespacedKey(DONATION_ENABLED_CURRENCIES_KEY, namespace));
     const raw = doc?.value ?? SUPPORTED_CURRENCIES.join(",");
     const values = raw
       .split(",")
@@ -73,10 +80,11 @@ export const getEnabledDonationCurrencies = query({
 });
 
 export const setDonationCurrencyEnabled = mutation({
-  args: { currency: v.string(), enabled: v.boolean() },
-  handler: async ({ db }, { currency, enabled }) => {
+  args: { currency: v.string(), enabled: v.boolean(), namespace: v.optional(v.string()) },
+  handler: async ({ db }, { currency, enabled, namespace }) => {
     const ccy = currency.trim().toUpperCase();
-    const doc = await getSettingDoc(db, DONATION_ENABLED_CURRENCIES_KEY);
+    const key = namespacedKey(DONATION_ENABLED_CURRENCIES_KEY, namespace);
+    const doc = await getSettingDoc(db, key);
     const current = (doc?.value ?? SUPPORTED_CURRENCIES.join(","))
       .split(",")
       .map((v) => v.trim().toUpperCase())
@@ -91,21 +99,18 @@ export const setDonationCurrencyEnabled = mutation({
     const value = ordered.join(",");
 
     if (doc) await db.patch(doc._id, { value });
-    else await db.insert("settings", { key: DONATION_ENABLED_CURRENCIES_KEY, value });
+    else await db.insert("settings", { key, value });
 
     return ordered;
   },
 });
 
 export const isDonationCurrencyEnabled = query({
-  args: { currency: v.string() },
-  handler: async ({ db }, { currency }) => {
+  args: { currency: v.string(), namespace: v.optional(v.string()) },
+  handler: async ({ db }, { currency, namespace }) => {
     const ccy = currency.trim().toUpperCase();
     if (!SUPPORTED_CURRENCIES.includes(ccy)) return false;
-    const enabled = await db
-      .query("settings")
-      .withIndex("by_key", (q) => q.eq("key", DONATION_ENABLED_CURRENCIES_KEY))
-      .unique();
+    const enabled = await getSettingDoc(db, namespacedKey(DONATION_ENABLED_CURRENCIES_KEY, namespace));
     const raw = enabled?.value ?? SUPPORTED_CURRENCIES.join(",");
     const values = raw
       .split(",")
@@ -114,3 +119,34 @@ export const isDonationCurrencyEnabled = query({
     return values.includes(ccy);
   },
 });
+
+const parseRates = (raw: string | undefined): Record<string, number> => {
+  try {
+    return raw ? JSON.parse(raw) : {};
+  } catch {
+    return {};
+  }
+};
+
+export const getExchangeRates = query({
+  args: {},
+  handler: async ({ db }) => {
+    const doc = await getSettingDoc(db, EXCHANGE_RATES_KEY);
+    return parseRates(doc?.value);
+  },
+});
+
+export const setExchangeRate = mutation({
+  args: { currency: v.string(), rate: v.union(v.number(), v.null()) },
+  handler: async ({ db }, { currency, rate }) => {
+    const ccy = currency.trim().toUpperCase();
+    const doc = await getSettingDoc(db, EXCHANGE_RATES_KEY);
+    const rates = parseRates(doc?.value);
+    if (rate === null) delete rates[ccy];
+    else rates[ccy] = rate;
+    const value = JSON.stringify(rates);
+    if (doc) await db.patch(doc._id, { value });
+    else await db.insert("settings", { key: EXCHANGE_RATES_KEY, value });
+    return rates;
+  },
+});
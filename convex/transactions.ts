@@ -1,5 +1,7 @@
 import { mutation, query } from "./_generated/server";
 import { v } from "convex/values";
+import { updateCreatorTotals } from "./creators";
+import { trackTransactionChange } from "./migrations";
 
 const formatTimestamp = (ms: number) => {
   const d = new Date(ms);
@@ -23,6 +25,11 @@ const nextCounterValue = async (db: any, key: string) => {
   return { id: doc._id, value: next };
 };
 
+const addToCurrency = (totals: Record<string, number> | undefined, currency: string, amount: number) => ({
+  ...(totals ?? {}),
+  [currency]: (totals?.[currency] ?? 0) + amount,
+});
+
 const getTxById = async (db: any, tx_id: number) => {
   return await db
     .query("transactions")
@@ -36,8 +43,17 @@ export const create = mutation({
     amount: v.number(),
     referrer_id: v.union(v.number(), v.null()),
     currency: v.string(),
+    idempotency_key: v.optional(v.union(v.string(), v.null())),
   },
-  handler: async ({ db }, { user_id, amount, referrer_id, currency }) => {
+  handler: async ({ db }, { user_id, amount, referrer_id, currency, idempotency_key }) => {
+    // A retried or double-tapped create returns the original tx without new writes
+    if (idempotency_key) {
+      const existing = await db
+        .query("transactions")
+        .withIndex("by_idempotency_key", (q) => q.eq("idempotency_key", idempotency_key))
+        .first();
+      if (existing) return existing.tx_id;
+    }
     const { value: tx_id } = await nextCounterValue(db, "transactions");
     const ms = Date.now();
     await db.insert("transactions", {
@@ -50,6 +66,7 @@ export const create = mutation({
       created_at: formatTimestamp(ms),
       created_at_ms: ms,
       referrer_id,
+      ...(idempotency_key ? { idempotency_key } : {}),
     });
     return tx_id;
   },
@@ -60,6 +77,11 @@ export const updateProof = mutation({
   handler: async ({ db }, { tx_id, proof_image_id }) => {
     const tx = await getTxById(db, tx_id);
     if (!tx) return false;
+    // A re-uploaded proof must not count the donation as pending twice
+    if (tx.status !== "pending_approval") {
+      await updateCreatorTotals(db, tx, { pending_total: tx.amount, pending_count: 1 });
+    }
+    await trackTransactionChange(db, tx, { ...tx, proof_image_id, status: "pending_approval" });
     await db.patch(tx._id, { proof_image_id, status: "pending_approval" });
     return true;
   },
@@ -78,6 +100,7 @@ export const updateStatus = mutation({
       if (stats) {
         await db.patch(stats._id, {
           total_raised: stats.total_raised + tx.amount,
+          raised_by_currency: addToCurrency(stats.raised_by_currency, tx.currency, tx.amount),
           // Note: total_donors is harder to maintain perfectly accurate in O(1) without a set, 
           // but we can check if this is user's first approved tx. 
           // For simplicity/performance, we might skip accurate unique donor count here or do a check:
@@ -89,11 +112,25 @@ export const updateStatus = mutation({
       const user = await db.query("users").withIndex("by_user_id", q => q.eq("user_id", tx.user_id)).unique();
       if (user) {
         await db.patch(user._id, {
-          total_donated: (user.total_donated ?? 0) + tx.amount
+          total_donated: (user.total_donated ?? 0) + tx.amount,
+          donated_by_currency: addToCurrency(user.donated_by_currency, tx.currency, tx.amount),
         });
       }
     }
 
+    // 3. Update the recipient's totals (leaderboard and dashboard)
+    const leavesPending = tx.status === "pending_approval" && status !== "pending_approval";
+    const approves = tx.status !== "approved" && status === "approved";
+    if (leavesPending || approves) {
+      await updateCreatorTotals(db, tx, {
+        total: approves ? tx.amount : 0,
+        approved_count: approves ? 1 : 0,
+        pending_total: leavesPending ? -tx.amount : 0,
+        pending_count: leavesPending ? -1 : 0,
+      });
+    }
+
+    await trackTransactionChange(db, tx, { ...tx, status });
     await db.patch(tx._id, { status });
     return true;
   },
@@ -139,6 +176,18 @@ export const deleteTx = mutation({
   handler: async ({ db }, { tx_id }) => {
     const tx = await getTxById(db, tx_id);
     if (!tx) return false;
+    // Take the donation back out of the recipient's totals
+    const pending = tx.status === "pending_approval";
+    const approved = tx.status === "approved";
+    if (pending || approved) {
+      await updateCreatorTotals(db, tx, {
+        total: approved ? -tx.amount : 0,
+        approved_count: approved ? -1 : 0,
+        pending_total: pending ? -tx.amount : 0,
+        pending_count: pending ? -1 : 0,
+      });
+    }
+    await trackTransactionChange(db, tx, null);
     await db.delete(tx._id);
     return true;
   },
@@ -152,6 +201,7 @@ export const stats = query({
       total_raised: stats?.total_raised ?? 0,
       pending_reviews: stats?.pending_reviews ?? 0, // Note: pending_reviews needs maintenance too if we want it O(1)
       total_donors: stats?.total_donors ?? 0,
+      raised_by_currency: stats?.raised_by_currency ?? {},
     };
   },
 });
@@ -164,3 +214,66 @@ export const userTotalDonated = query({
   },
 });
 
+
+export const userDonatedByCurrency = query({
+  args: { user_id: v.number() },
+  handler: async ({ db }, { user_id }) => {
+    const user = await db.query("users").withIndex("by_user_id", q => q.eq("user_id", user_id)).unique();
+    return user?.donated_by_currency ?? {};
+  },
+});
+
+// Rows an export page may read for the filters its index does not cover
+const EXPORT_MAX_ROWS_READ = 4000;
+
+// One page of an admin export, oldest first. A recipient, or else a status, and the
+// date range use an index; the remaining filters apply within the rows read. A page
+// stops after EXPORT_MAX_ROWS_READ rows, so sparse matches come back as short (even
+// empty) pages with a cursor rather than hitting Convex read limits.
+export const exportPage = query({
+  args: {
+    status: v.union(v.string(), v.null()),
+    currency: v.union(v.string(), v.null()),
+    referrer_id: v.union(v.number(), v.null()),
+    since_ms: v.union(v.number(), v.null()),
+    until_ms: v.union(v.number(), v.null()),
+    numItems: v.number(),
+    cursor: v.union(v.string(), v.null()),
+  },
+  handler: async ({ db }, { status, currency, referrer_id, since_ms, until_ms, numItems, cursor }) => {
+    const since = since_ms ?? 0;
+    const until = until_ms ?? Number.MAX_SAFE_INTEGER;
+    const transactions = db.query("transactions");
+    const indexed =
+      referrer_id !== null
+        ? transactions.withIndex("by_referrer_created_at_ms", (q) =>
+            q.eq("referrer_id", referrer_id).gte("created_at_ms", since).lt("created_at_ms", until),
+          )
+        : status !== null
+          ? transactions.withIndex("by_status_created_at_ms", (q) =>
+              q.eq("status", status).gte("created_at_ms", since).lt("created_at_ms", until),
+            )
+          : transactions.withIndex("by_created_at_ms", (q) => q.gte("created_at_ms", since).lt("created_at_ms", until));
+    const page = await indexed
+      .order("asc")
+      .filter((q) =>
+        q.and(
+          status === null || q.eq(q.field("status"), status),
+          currency === null || q.eq(q.field("currency"), currency),
+        ),
+      )
+      .paginate({ numItems, cursor, maximumRowsRead: Math.max(numItems, EXPORT_MAX_ROWS_READ) });
+    return {
+      rows: page.page.map((tx) => ({
+        tx_id: tx.tx_id,
+        user_id: tx.user_id,
+        amount: tx.amount,
+        currency: tx.currency,
+        status: tx.status,
+        created_at: tx.created_at,
+        referrer_id: tx.referrer_id,
+      })),
+      cursor: page.isDone ? null : page.continueCursor,
+    };
+  },
+});
@@ -37,6 +37,38 @@ export const add = mutation({
   },
 });
 
+export const ensure = mutation({
+  args: {
+    user_id: v.number(),
+    username: v.union(v.string(), v.null()),
+    first_name: v.union(v.string(), v.null()),
+  },
+  handler: async ({ db }, { user_id, username, first_name }) => {
+    const existing = await db
+      .query("users")
+      .withIndex("by_user_id", (q) => q.eq("user_id", user_id))
+      .unique();
+    if (existing) {
+      return {
+        created: false,
+        language: existing.language,
+        preferred_referrer_id: existing.preferred_referrer_id,
+      };
+    }
+    const ms = Date.now();
+    await db.insert("users", {
+      user_id,
+      username,
+      first_name,
+      language: null,
+      preferred_referrer_id: null,
+      joined_at: formatTimestamp(ms),
+      joined_at_ms: ms,
+    });
+    return { created: true, language: null, preferred_referrer_id: null };
+  },
+});
+
 export const get = query({
   args: { user_id: v.number() },
   handler: async ({ db }, { user_id }) => {
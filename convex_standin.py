@@ -0,0 +1,707 @@
+"""In-process stand-in for the Convex HTTP API used by ``database.Database``.
+
+Speaks the ``POST /api/query`` and ``POST /api/mutation`` JSON protocol and implements
+the functions in ``convex/*.ts`` against memory-backed tables that mirror
+``convex/schema.ts``. Latency is injectable so handler performance can be measured
+reproducibly without a live deployment. The sync WebSocket serves the subset used
+by ``convex_sync.QuerySubscriber``: subscribed queries are re-run after every
+mutation and changed results are pushed.
+
+    python convex_standin.py --port 3210 --latency-ms 25
+    CONVEX_URL=http://127.0.0.1:3210 python loadtest.py
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_CURRENCIES = ["UAH", "RUB", "USD"]
+DONATION_ENABLED_CURRENCIES_KEY = "donation_enabled_currencies"
+EXCHANGE_RATES_KEY = "exchange_rates"
+
+
+def _format_timestamp(ms: int) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ms / 1000))
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _namespaced(key: str, namespace: str | None) -> str:
+    return f"{namespace}:{key}" if namespace else key
+
+
+@dataclass
+class Store:
+    """Memory-backed tables keyed by their primary ``by_*`` index."""
+
+    users: dict[int, dict[str, Any]] = field(default_factory=dict)
+    aggregates: dict[str, dict[str, Any]] = field(default_factory=dict)
+    transactions: dict[int, dict[str, Any]] = field(default_factory=dict)
+    settings: dict[str, str] = field(default_factory=dict)
+    cards: dict[int, dict[str, Any]] = field(default_factory=dict)
+    counters: dict[str, int] = field(default_factory=dict)
+    tx_by_idempotency_key: dict[str, int] = field(default_factory=dict)
+    creator_totals: dict[tuple[int, str], dict[str, Any]] = field(default_factory=dict)
+    receipt_hashes: dict[int, dict[str, Any]] = field(default_factory=dict)
+    receipt_bands: dict[str, set[int]] = field(default_factory=dict)
+
+    def next_counter(self, key: str) -> int:
+        self.counters[key] = self.counters.get(key, 0) + 1
+        return self.counters[key]
+
+    def enabled_currencies(self, namespace: str | None = None) -> list[str]:
+        raw = self.settings.get(_namespaced(DONATION_ENABLED_CURRENCIES_KEY, namespace), ",".join(SUPPORTED_CURRENCIES))
+        values = [v.strip().upper() for v in raw.split(",") if v.strip()]
+        return [v for v in values if v in SUPPORTED_CURRENCIES]
+
+
+_FUNCTIONS: dict[str, tuple[str, Callable[[Store, dict[str, Any]], Any]]] = {}
+
+
+def _register(kind: str, path: str):
+    def deco(fn: Callable[[Store, dict[str, Any]], Any]):
+        _FUNCTIONS[path] = (kind, fn)
+        return fn
+
+    return deco
+
+
+def query(path: str):
+    return _register("query", path)
+
+
+def mutation(path: str):
+    return _register("mutation", path)
+
+
+# ===== meta =====
+
+@mutation("meta:initDefaults")
+def _init_defaults(s: Store, a: dict[str, Any]) -> bool:
+    s.settings.setdefault(DONATION_ENABLED_CURRENCIES_KEY, ",".join(SUPPORTED_CURRENCIES))
+    s.counters.setdefault("transactions", 0)
+    s.counters.setdefault("cards", 0)
+    s.aggregates.setdefault(
+        "stats", {"total_raised": 0, "total_donors": 0, "pending_reviews": 0, "raised_by_currency": {}}
+    )
+    return True
+
+
+# ===== users =====
+
+@mutation("users:add")
+def _users_add(s: Store, a: dict[str, Any]) -> bool:
+    if a["user_id"] in s.users:
+        return False
+    ms = _now_ms()
+    s.users[a["user_id"]] = {
+        "user_id": a["user_id"],
+        "username": a["username"],
+        "first_name": a["first_name"],
+        "language": None,
+        "preferred_referrer_id": None,
+        "joined_at": _format_timestamp(ms),
+        "joined_at_ms": ms,
+    }
+    return True
+
+
+@mutation("users:ensure")
+def _users_ensure(s: Store, a: dict[str, Any]) -> dict[str, Any]:
+    existing = s.users.get(a["user_id"])
+    if existing:
+        return {
+            "created": False,
+            "language": existing["language"],
+            "preferred_referrer_id": existing["preferred_referrer_id"],
+        }
+    _users_add(s, a)
+    return {"created": True, "language": None, "preferred_referrer_id": None}
+
+
+@query("users:get")
+def _users_get(s: Store, a: dict[str, Any]) -> dict[str, Any] | None:
+    user = s.users.get(a["user_id"])
+    if not user:
+        return None
+    return {k: user[k] for k in ("user_id", "username", "first_name", "language", "preferred_referrer_id")}
+
+
+@query("users:listAllUserIds")
+def _users_list_ids(s: Store, a: dict[str, Any]) -> dict[str, Any]:
+    opts = a["paginationOpts"]
+    start = int(opts.get("cursor") or 0)
+    ids = list(s.users)[start : start + int(opts["numItems"])]
+    end = start + len(ids)
+    return {"users": ids, "continueCursor": str(end), "isDone": end >= len(s.users)}
+
+
+@mutation("users:setLanguage")
+def _users_set_language(s: Store, a: dict[str, Any]) -> bool:
+    user = s.users.get(a["user_id"])
+    if not user:
+        return False
+    user["language"] = a["language"]
+    return True
+
+
+@query("users:getLanguage")
+def _users_get_language(s: Store, a: dict[str, Any]) -> str | None:
+    user = s.users.get(a["user_id"])
+    return user["language"] if user else None
+
+
+@mutation("users:setPreferredReferrer")
+def _users_set_referrer(s: Store, a: dict[str, Any]) -> bool:
+    user = s.users.get(a["user_id"])
+    if not user:
+        return False
+    user["preferred_referrer_id"] = a["referrer_id"]
+    return True
+
+
+@query("users:getPreferredReferrer")
+def _users_get_referrer(s: Store, a: dict[str, Any]) -> int | None:
+    user = s.users.get(a["user_id"])
+    return user["preferred_referrer_id"] if user else None
+
+
+# ===== transactions =====
+
+@mutation("transactions:create")
+def _tx_create(s: Store, a: dict[str, Any]) -> int:
+    key = a.get("idempotency_key")
+    if key and s.tx_by_idempotency_key.get(key) in s.transactions:
+        return s.tx_by_idempotency_key[key]
+    tx_id = s.next_counter("transactions")
+    ms = _now_ms()
+    s.transactions[tx_id] = {
+        "tx_id": tx_id,
+        "user_id": a["user_id"],
+        "amount": a["amount"],
+        "currency": a["currency"],
+        "status": "pending_proof",
+        "proof_image_id": None,
+        "created_at": _format_timestamp(ms),
+        "created_at_ms": ms,
+        "referrer_id": a["referrer_id"],
+    }
+    if key:
+        s.tx_by_idempotency_key[key] = tx_id
+    return tx_id
+
+
+def _add_creator_totals(s: Store, tx: dict[str, Any], **delta: float) -> None:
+    if tx["referrer_id"] is None:
+        return
+    creator = s.users.get(tx["referrer_id"]) or {}
+    row = s.creator_totals.setdefault(
+        (tx["referrer_id"], tx["currency"]),
+        {
+            "referrer_id": tx["referrer_id"],
+            "total": 0,
+            "approved_count": 0,
+            "pending_total": 0,
+            "pending_count": 0,
+        },
+    )
+    for name, value in delta.items():
+        row[name] = row[name] + value
+    row["pending_total"] = max(row["pending_total"], 0)
+    row["pending_count"] = max(row["pending_count"], 0)
+    row["username"] = creator.get("username")
+    row["first_name"] = creator.get("first_name")
+
+
+@mutation("transactions:updateProof")
+def _tx_update_proof(s: Store, a: dict[str, Any]) -> bool:
+    tx = s.transactions.get(a["tx_id"])
+    if not tx:
+        return False
+    if tx["status"] != "pending_approval":
+        _add_creator_totals(s, tx, pending_total=tx["amount"], pending_count=1)
+    tx["proof_image_id"] = a["proof_image_id"]
+    tx["status"] = "pending_approval"
+    return True
+
+
+@mutation("transactions:updateStatus")
+def _tx_update_status(s: Store, a: dict[str, Any]) -> bool:
+    tx = s.transactions.get(a["tx_id"])
+    if not tx:
+        return False
+    status = a["status"]
+    if tx["status"] != "approved" and status == "approved":
+        ccy, amount = tx["currency"], tx["amount"]
+        stats = s.aggregates.get("stats")
+        if stats:
+            stats["total_raised"] += amount
+            by_ccy = stats.setdefault("raised_by_currency", {})
+            by_ccy[ccy] = by_ccy.get(ccy, 0) + amount
+        user = s.users.get(tx["user_id"])
+        if user:
+            user["total_donated"] = user.get("total_donated", 0) + amount
+            by_ccy = user.setdefault("donated_by_currency", {})
+            by_ccy[ccy] = by_ccy.get(ccy, 0) + amount
+    approves = tx["status"] != "approved" and status == "approved"
+    leaves_pending = tx["status"] == "pending_approval" and status != "pending_approval"
+    if approves or leaves_pending:
+        _add_creator_totals(
+            s,
+            tx,
+            total=tx["amount"] if approves else 0,
+            approved_count=1 if approves else 0,
+            pending_total=-tx["amount"] if leaves_pending else 0,
+            pending_count=-1 if leaves_pending else 0,
+        )
+    tx["status"] = status
+    return True
+
+
+@query("transactions:get")
+def _tx_get(s: Store, a: dict[str, Any]) -> dict[str, Any] | None:
+    tx = s.transactions.get(a["tx_id"])
+    if not tx:
+        return None
+    return {k: tx[k] for k in ("tx_id", "user_id", "amount", "currency", "status", "proof_image_id", "created_at", "referrer_id")}
+
+
+@query("transactions:history")
+def _tx_history(s: Store, a: dict[str, Any]) -> list[dict[str, Any]]:
+    rows = [tx for tx in s.transactions.values() if tx["user_id"] == a["user_id"]]
+    rows.sort(key=lambda tx: tx["created_at_ms"], reverse=True)
+    return [
+        {"tx_id": tx["tx_id"], "amount": tx["amount"], "status": tx["status"], "created_at": tx["created_at"]}
+        for tx in rows[:10]
+    ]
+
+
+@mutation("transactions:deleteTx")
+def _tx_delete(s: Store, a: dict[str, Any]) -> bool:
+    tx = s.transactions.pop(a["tx_id"], None)
+    if tx is None:
+        return False
+    pending = tx["status"] == "pending_approval"
+    approved = tx["status"] == "approved"
+    if pending or approved:
+        _add_creator_totals(
+            s,
+            tx,
+            total=-tx["amount"] if approved else 0,
+            approved_count=-1 if approved else 0,
+            pending_total=-tx["amount"] if pending else 0,
+            pending_count=-1 if pending else 0,
+        )
+    return True
+
+
+@query("transactions:stats")
+def _tx_stats(s: Store, a: dict[str, Any]) -> dict[str, Any]:
+    stats = s.aggregates.get("stats") or {}
+    return {
+        "total_raised": stats.get("total_raised", 0),
+        "pending_reviews": stats.get("pending_reviews", 0),
+        "total_donors": stats.get("total_donors", 0),
+        "raised_by_currency": dict(stats.get("raised_by_currency", {})),
+    }
+
+
+@query("transactions:userTotalDonated")
+def _tx_user_total(s: Store, a: dict[str, Any]) -> float:
+    user = s.users.get(a["user_id"])
+    return user.get("total_donated", 0) if user else 0
+
+
+@query("transactions:userDonatedByCurrency")
+def _tx_user_by_currency(s: Store, a: dict[str, Any]) -> dict[str, float]:
+    user = s.users.get(a["user_id"])
+    return dict(user.get("donated_by_currency", {})) if user else {}
+
+
+@query("transactions:exportPage")
+def _tx_export_page(s: Store, a: dict[str, Any]) -> dict[str, Any]:
+    since = a["since_ms"] if a["since_ms"] is not None else 0
+    until = a["until_ms"] if a["until_ms"] is not None else float("inf")
+    rows = [
+        tx
+        for tx in s.transactions.values()
+        if since <= tx["created_at_ms"] < until
+        and all(a[k] is None or tx[k] == a[k] for k in ("status", "currency", "referrer_id"))
+    ]
+    rows.sort(key=lambda tx: (tx["created_at_ms"], tx["tx_id"]))
+    start = int(a["cursor"] or 0)
+    end = start + a["numItems"]
+    keys = ("tx_id", "user_id", "amount", "currency", "status", "created_at", "referrer_id")
+    return {
+        "rows": [{k: tx[k] for k in keys} for tx in rows[start:end]],
+        "cursor": str(end) if end < len(rows) else None,
+    }
+
+
+# ===== creators =====
+
+@query("creators:leaderboard")
+def _creators_leaderboard(s: Store, a: dict[str, Any]) -> dict[str, Any]:
+    rows = [r for (_, ccy), r in s.creator_totals.items() if ccy == a["currency"] and r["total"] > 0]
+    rows.sort(key=lambda r: r["total"], reverse=True)
+    start = int(a["cursor"] or 0)
+    end = start + a["numItems"]
+    return {"rows": [dict(r) for r in rows[start:end]], "cursor": str(end) if end < len(rows) else None}
+
+
+@query("creators:dashboard")
+def _creators_dashboard(s: Store, a: dict[str, Any]) -> list[dict[str, Any]]:
+    return [
+        {"currency": ccy, **{k: r[k] for k in ("total", "approved_count", "pending_total", "pending_count")}}
+        for (referrer_id, ccy), r in s.creator_totals.items()
+        if referrer_id == a["referrer_id"]
+    ]
+
+
+# ===== settings =====
+
+@query("settings:get")
+def _settings_get(s: Store, a: dict[str, Any]) -> str | None:
+    return s.settings.get(a["key"])
+
+
+@mutation("settings:set")
+def _settings_set(s: Store, a: dict[str, Any]) -> bool:
+    s.settings[a["key"]] = a["value"]
+    return True
+
+
+@query("settings:getSupportMessage")
+def _settings_get_support(s: Store, a: dict[str, Any]) -> str | None:
+    return s.settings.get(_namespaced("support_message", a.get("namespace")))
+
+
+@mutation("settings:setSupportMessage")
+def _settings_set_support(s: Store, a: dict[str, Any]) -> bool:
+    s.settings[_namespaced("support_message", a.get("namespace"))] = a["message"]
+    return True
+
+
+@query("settings:getEnabledDonationCurrencies")
+def _settings_enabled(s: Store, a: dict[str, Any]) -> list[str]:
+    return s.enabled_currencies(a.get("namespace"))
+
+
+@mutation("settings:setDonationCurrencyEnabled")
+def _settings_set_enabled(s: Store, a: dict[str, Any]) -> list[str]:
+    ccy = a["currency"].strip().upper()
+    current = set(s.enabled_currencies(a.get("namespace")))
+    if ccy in SUPPORTED_CURRENCIES:
+        if a["enabled"]:
+            current.add(ccy)
+        else:
+            current.discard(ccy)
+    ordered = [c for c in SUPPORTED_CURRENCIES if c in current]
+    s.settings[_namespaced(DONATION_ENABLED_CURRENCIES_KEY, a.get("namespace"))] = ",".join(ordered)
+    return ordered
+
+
+@query("settings:isDonationCurrencyEnabled")
+def _settings_is_enabled(s: Store, a: dict[str, Any]) -> bool:
+    ccy = a["currency"].strip().upper()
+    return ccy in SUPPORTED_CURRENCIES and ccy in s.enabled_currencies(a.get("namespace"))
+
+
+@query("settings:getExchangeRates")
+def _settings_get_rates(s: Store, a: dict[str, Any]) -> dict[str, float]:
+    try:
+        return json.loads(s.settings.get(EXCHANGE_RATES_KEY, "{}"))
+    except ValueError:
+        return {}
+
+
+@mutation("settings:setExchangeRate")
+def _settings_set_rate(s: Store, a: dict[str, Any]) -> dict[str, float]:
+    rates = _settings_get_rates(s, {})
+    ccy = a["currency"].strip().upper()
+    if a["rate"] is None:
+        rates.pop(ccy, None)
+    else:
+        rates[ccy] = a["rate"]
+    s.settings[EXCHANGE_RATES_KEY] = json.dumps(rates)
+    return rates
+
+
+# ===== cards =====
+
+@mutation("cards:add")
+def _cards_add(s: Store, a: dict[str, Any]) -> int:
+    card_id = s.next_counter("cards")
+    ms = _now_ms()
+    s.cards[card_id] = {
+        "card_id": card_id,
+        "details": a["details"],
+        "currency": a["currency"],
+        "is_active": a["active"],
+        "created_at": _format_timestamp(ms),
+        "created_at_ms": ms,
+    }
+    return card_id
+
+
+@query("cards:list")
+def _cards_list(s: Store, a: dict[str, Any]) -> list[dict[str, Any]]:
+    active_only = a.get("active_only")
+    cards = [c for c in s.cards.values() if active_only is None or c["is_active"] == active_only]
+    cards.sort(key=lambda c: c["created_at_ms"], reverse=True)
+    return [{k: v for k, v in c.items() if k != "created_at_ms"} for c in cards]
+
+
+@mutation("cards:setActive")
+def _cards_set_active(s: Store, a: dict[str, Any]) -> bool:
+    card = s.cards.get(a["card_id"])
+    if not card:
+        return False
+    card["is_active"] = a["active"]
+    return True
+
+
+@mutation("cards:deleteCard")
+def _cards_delete(s: Store, a: dict[str, Any]) -> bool:
+    return s.cards.pop(a["card_id"], None) is not None
+
+
+@query("cards:activeCards")
+def _cards_active(s: Store, a: dict[str, Any]) -> list[str]:
+    active = [c for c in s.cards.values() if c["is_active"]]
+    active.sort(key=lambda c: c["created_at_ms"], reverse=True)
+    return [c["details"] for c in active]
+
+
+@mutation("cards:nextActiveCard")
+def _cards_next_active(s: Store, a: dict[str, Any]) -> str | None:
+    tx = s.transactions.get(a["tx_id"]) if a.get("tx_id") is not None else None
+    if tx and tx.get("card_details"):
+        return tx["card_details"]
+    ccy = a["currency"].strip().upper()
+    cards = [c for c in s.cards.values() if c["currency"] == ccy and c["is_active"]]
+    cards.sort(key=lambda c: (c["created_at_ms"], c["card_id"]))
+    if not cards:
+        return None
+    ptr_key = f"card_rr_pointer_{ccy}"
+    try:
+        ptr = int(s.settings.get(ptr_key, "0")) % len(cards)
+    except ValueError:
+        ptr = 0
+    s.settings[ptr_key] = str((ptr + 1) % len(cards))
+    if tx:
+        tx["card_details"] = cards[ptr]["details"]
+    return cards[ptr]["details"]
+
+
+@query("cards:currenciesWithActiveCards")
+def _cards_currencies(s: Store, a: dict[str, Any]) -> list[str]:
+    return list(dict.fromkeys(c["currency"] for c in s.cards.values() if c["is_active"]))
+
+
+@mutation("receipts:record")
+def _receipts_record(s: Store, a: dict[str, Any]) -> list[dict[str, Any]]:
+    tx_id, phash = a["tx_id"], a["phash"]
+    max_band_rows = a.get("max_band_rows", 200)
+    candidates = {
+        t for band in a["bands"] if len(s.receipt_bands.get(band, ())) <= max_band_rows for t in s.receipt_bands[band]
+    } - {tx_id}
+    previous = s.receipt_hashes.pop(tx_id, None)
+    for band in previous["bands"] if previous else ():
+        s.receipt_bands[band].discard(tx_id)
+    s.receipt_hashes[tx_id] = {"user_id": a["user_id"], "phash": phash, "bands": list(a["bands"])}
+    for band in a["bands"]:
+        s.receipt_bands.setdefault(band, set()).add(tx_id)
+    matches = []
+    for other in candidates:
+        row = s.receipt_hashes[other]
+        distance = (int(phash, 16) ^ int(row["phash"], 16)).bit_count()
+        if distance <= a["max_distance"]:
+            matches.append({"tx_id": other, "user_id": row["user_id"], "distance": distance})
+    matches.sort(key=lambda m: (m["distance"], m["tx_id"]))
+    return matches
+
+
+@dataclass(eq=False)
+class _SyncSession:
+    ws: web.WebSocketResponse
+    query_set: int = 0
+    # query id -> (udf path, args, last result as JSON)
+    queries: dict[int, tuple[str, dict[str, Any], str | None]] = field(default_factory=dict)
+
+
+def _sync_ts() -> str:
+    return base64.b64encode((time.time_ns()).to_bytes(8, "little")).decode()
+
+
+class ConvexStandIn:
+    """aiohttp server exposing ``Store`` through the Convex HTTP and sync APIs."""
+
+    def __init__(self, *, latency_ms: float = 0.0, jitter_ms: float = 0.0, seed: int = 0, store: Store | None = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.store = store or Store()
+        self.calls: dict[str, int] = {}
+        self._rng = random.Random(seed)
+        self._runner: web.AppRunner | None = None
+        self._sync_sessions: set[_SyncSession] = set()
+        self._ts = _sync_ts()
+        self.url: str | None = None
+
+    def _delay_s(self) -> float:
+        jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        kind = request.match_info["kind"]
+        body = await request.json()
+        path = body.get("path", "")
+        delay = self._delay_s()
+        if delay:
+            await asyncio.sleep(delay)
+
+        entry = _FUNCTIONS.get(path)
+        if entry is None or entry[0] != kind:
+            return web.json_response(
+                {"status": "error", "errorMessage": f"Could not find public function for '{path}'"}, status=404
+            )
+        self.calls[path] = self.calls.get(path, 0) + 1
+        try:
+            value = entry[1](self.store, body.get("args") or {})
+        except Exception as e:
+            logger.exception(f"Stand-in function {path} failed")
+            return web.json_response({"status": "error", "errorMessage": str(e)})
+        if kind == "mutation" and self._sync_sessions:
+            await self.publish()
+        return web.json_response({"status": "success", "value": value})
+
+    def _run_query(self, path: str, args: dict[str, Any]) -> dict[str, Any]:
+        entry = _FUNCTIONS.get(path)
+        if entry is None or entry[0] != "query":
+            return {"type": "QueryFailed", "errorMessage": f"Could not find public function for '{path}'", "logLines": []}
+        try:
+            return {"type": "QueryUpdated", "value": entry[1](self.store, args), "logLines": []}
+        except Exception as e:
+            return {"type": "QueryFailed", "errorMessage": str(e), "logLines": []}
+
+    async def _send_transition(self, session: _SyncSession, modifications: list[dict[str, Any]], query_set: int) -> None:
+        start = {"querySet": session.query_set, "identity": 0, "ts": self._ts}
+        self._ts = _sync_ts()
+        session.query_set = query_set
+        end = {"querySet": query_set, "identity": 0, "ts": self._ts}
+        await session.ws.send_json(
+            {"type": "Transition", "startVersion": start, "endVersion": end, "modifications": modifications}
+        )
+
+    def _refresh(self, session: _SyncSession, query_ids: list[int]) -> list[dict[str, Any]]:
+        changes = []
+        for query_id in query_ids:
+            path, args, last = session.queries[query_id]
+            result = self._run_query(path, args)
+            encoded = json.dumps(result, sort_keys=True)
+            if encoded != last:
+                session.queries[query_id] = (path, args, encoded)
+                changes.append({"queryId": query_id, **result})
+        return changes
+
+    async def publish(self) -> None:
+        """Push changed query results; call after editing ``store`` directly."""
+        for session in list(self._sync_sessions):
+            changes = self._refresh(session, list(session.queries))
+            if changes:
+                try:
+                    await self._send_transition(session, changes, session.query_set)
+                except ConnectionResetError:
+                    self._sync_sessions.discard(session)
+
+    async def _sync(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        session = _SyncSession(ws)
+        self._sync_sessions.add(session)
+        try:
+            async for msg in ws:
+                if msg.type != web.WSMsgType.TEXT:
+                    break
+                data = json.loads(msg.data)
+                if data.get("type") != "ModifyQuerySet":
+                    continue  # Connect carries nothing the stand-in needs
+                added = []
+                for mod in data.get("modifications") or []:
+                    if mod.get("type") == "Add":
+                        args = (mod.get("args") or [{}])[0]
+                        session.queries[mod["queryId"]] = (mod["udfPath"], args, None)
+                        added.append(mod["queryId"])
+                    elif mod.get("type") == "Remove":
+                        session.queries.pop(mod["queryId"], None)
+                await self._send_transition(session, self._refresh(session, added), data["newVersion"])
+        finally:
+            self._sync_sessions.discard(session)
+        return ws
+
+    async def close_sync_sessions(self) -> None:
+        """Drop every sync connection, as a deployment restart would."""
+        for session in list(self._sync_sessions):
+            await session.ws.close()
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/{kind:query|mutation}", self._handle)
+        app.router.add_get("/api/{version}/sync", self._sync)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{bound_port}"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self.close_sync_sessions()
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "ConvexStandIn":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.stop()
+
+
+async def _serve(ns: argparse.Namespace) -> None:
+    standin = ConvexStandIn(latency_ms=ns.latency_ms, jitter_ms=ns.jitter_ms, seed=ns.seed)
+    url = await standin.start(ns.host, ns.port)
+    print(f"Convex stand-in listening on {url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await standin.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local Convex HTTP API stand-in.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3210)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added to every call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="uniform +/- jitter on top of latency")
+    parser.add_argument("--seed", type=int, default=0)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,137 @@
+"""Live query subscriptions over the Convex sync (WebSocket) protocol.
+
+Implements the small part of the protocol the bot needs: open a session, add a fixed
+set of public queries, and report every new result the deployment pushes in a
+``Transition``. The session is re-established with backoff after errors; while
+disconnected, callers should treat their cached results as unverified.
+
+``convex_standin.py`` serves the same subset, so this runs offline too.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Callable
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Client version sent in the sync URL; matches the convex package in package.json
+SYNC_API_VERSION = "1.17.0"
+
+
+def sync_url(convex_url: str) -> str:
+    base = convex_url.rstrip("/")
+    if base.startswith("https://"):
+        base = "wss://" + base[len("https://"):]
+    elif base.startswith("http://"):
+        base = "ws://" + base[len("http://"):]
+    return f"{base}/api/{SYNC_API_VERSION}/sync"
+
+
+class QuerySubscriber:
+    """Subscribes to ``queries`` (name -> (udf path, args)) and reports their results.
+
+    ``on_update(name, value)`` runs for the initial result and every change;
+    ``on_disconnect()`` runs when an established session drops.
+    """
+
+    def __init__(
+        self,
+        convex_url: str,
+        queries: dict[str, tuple[str, dict[str, Any]]],
+        on_update: Callable[[str, Any], None],
+        on_disconnect: Callable[[], None],
+        *,
+        max_backoff_s: float = 30.0,
+    ):
+        self.url = sync_url(convex_url)
+        self.queries = dict(queries)
+        self.on_update = on_update
+        self.on_disconnect = on_disconnect
+        self.max_backoff_s = max_backoff_s
+        self.connected = False
+        self._session_id = str(uuid.uuid4())
+        self._connection_count = 0
+        self._last_close_reason: str | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="convex-sync")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        backoff_s = 1.0
+        async with aiohttp.ClientSession() as http:
+            while True:
+                try:
+                    await self._session(http)
+                    self._last_close_reason = "closed by server"
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self._last_close_reason = str(e) or type(e).__name__
+                    logger.warning(f"Convex subscription lost: {self._last_close_reason}; retrying in {backoff_s:g}s")
+                finally:
+                    if self.connected:
+                        self.connected = False
+                        self.on_disconnect()
+                        backoff_s = 1.0
+                await asyncio.sleep(backoff_s)
+                backoff_s = min(backoff_s * 2, self.max_backoff_s)
+
+    async def _session(self, http: aiohttp.ClientSession) -> None:
+        ids = {i: name for i, name in enumerate(self.queries)}
+        async with http.ws_connect(self.url) as ws:
+            await ws.send_json(
+                {
+                    "type": "Connect",
+                    "sessionId": self._session_id,
+                    "connectionCount": self._connection_count,
+                    "lastCloseReason": self._last_close_reason,
+                    "clientTs": int(time.time() * 1000),
+                }
+            )
+            self._connection_count += 1
+            await ws.send_json(
+                {
+                    "type": "ModifyQuerySet",
+                    "baseVersion": 0,
+                    "newVersion": 1,
+                    "modifications": [
+                        {"type": "Add", "queryId": i, "udfPath": self.queries[name][0], "args": [self.queries[name][1]]}
+                        for i, name in ids.items()
+                    ],
+                }
+            )
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    break
+                data = json.loads(msg.data)
+                kind = data.get("type")
+                if kind == "Transition":
+                    if not self.connected:
+                        self.connected = True
+                        logger.info(f"Subscribed to {len(ids)} Convex queries")
+                    for mod in data.get("modifications") or []:
+                        name = ids.get(mod.get("queryId"))
+                        if name is None:
+                            continue
+                        if mod.get("type") == "QueryUpdated":
+                            self.on_update(name, mod.get("value"))
+                        elif mod.get("type") == "QueryFailed":
+                            logger.warning(f"Subscribed query {name} failed: {mod.get('errorMessage')}")
+                elif kind in ("FatalError", "AuthError"):
+                    raise RuntimeError(data.get("error") or kind)
+                # Ping and responses to requests this client never sends need no reply
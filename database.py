@@ -1,23 +1,296 @@
+import asyncio
 import logging
 import os
-from dataclasses import dataclass
-from typing import Any
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, NamedTuple
 
 import httpx
 
+from config import (
+    CACHE_SUBSCRIPTIONS_ENABLED,
+    DB_BACKEND,
+    KNOWN_USERS_CACHE_SIZE,
+    LEADERBOARD_CACHE_TTL_S,
+    SETTINGS_CACHE_TTL_S,
+    SQLITE_PATH,
+)
+from tracing import tracer
+
+try:
+    import orjson  # optional: faster encoding and decoding of Convex calls
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 SUPPORTED_CURRENCIES: tuple[str, ...] = ("UAH", "RUB", "USD")
 
+# Receipt hashes are 64-bit, stored as 16 hex chars and indexed by four 16-bit bands:
+# any two hashes within Hamming distance 3 share at least one band exactly.
+RECEIPT_HASH_BANDS = 4
+
+
+def receipt_hash_bands(phash: str) -> list[str]:
+    width = len(phash) // RECEIPT_HASH_BANDS
+    return [f"{i}:{phash[i * width:(i + 1) * width]}" for i in range(RECEIPT_HASH_BANDS)]
+
+
+def hamming_distance(a: str, b: str) -> int:
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+
+def _float_map(value: Any) -> dict[str, float]:
+    return {str(k): float(v) for k, v in (value or {}).items()}
+
+
+def _str_list(value: Any) -> list[str]:
+    return [str(x) for x in value or []]
+
+
+# Bots hosted in one process (see hosting.py) keep their own support message and
+# enabled currencies; "" is the unprefixed namespace a single bot uses.
+settings_namespace: ContextVar[str] = ContextVar("settings_namespace", default="")
+
+
+def _namespace_arg(namespace: str) -> dict[str, str]:
+    # Omitted for the default namespace so older Convex deployments accept the call
+    return {"namespace": namespace} if namespace else {}
+
+
+def _namespaced(key: str, namespace: str) -> str:
+    return f"{namespace}:{key}" if namespace else key
+
+
+# Rows are NamedTuples: attribute access for new code, while indexing and unpacking
+# (``tx[7]``, ``_, name, _ = user``) keep working for callers written against the
+# plain tuples these replaced. Unlike frozen dataclasses they build almost as fast as a
+# bare tuple (``python bench_decode.py`` compares the two per row).
+class User(NamedTuple):
+    user_id: int
+    username: str | None
+    first_name: str | None
+
+
+class Transaction(NamedTuple):
+    tx_id: int
+    user_id: int
+    amount: float
+    currency: str
+    status: str
+    proof_image_id: str | None
+    created_at: str
+    referrer_id: int | None
+
+
+class Card(NamedTuple):
+    card_id: int
+    details: str
+    is_active: bool
+    created_at: str
+    currency: str
+
+
+def _user_from_convex(doc: dict[str, Any]) -> User:
+    return User(int(doc["user_id"]), doc.get("username"), doc.get("first_name"))
+
+
+def _transaction_from_convex(doc: dict[str, Any]) -> Transaction:
+    referrer_id = doc.get("referrer_id")
+    return Transaction(
+        int(doc["tx_id"]),
+        int(doc["user_id"]),
+        float(doc["amount"]),
+        str(doc["currency"]),
+        str(doc["status"]),
+        doc.get("proof_image_id"),
+        str(doc["created_at"]),
+        int(referrer_id) if referrer_id is not None else None,
+    )
+
+
+def _card_from_convex(doc: dict[str, Any]) -> Card:
+    return Card(
+        int(doc["card_id"]),
+        str(doc["details"]),
+        bool(doc["is_active"]),
+        str(doc["created_at"]),
+        str(doc["currency"]),
+    )
+
 
 @dataclass(frozen=True)
 class Stats:
     total_raised: float
     pending_reviews: int
     total_donors: int
+    raised_by_currency: dict[str, float] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class TransactionFilter:
+    """Export filters; ``until_ms`` is exclusive."""
+    status: str | None = None
+    currency: str | None = None
+    referrer_id: int | None = None
+    since_ms: int | None = None
+    until_ms: int | None = None
+
+
+@dataclass(frozen=True)
+class CreatorIncoming:
+    """Donations addressed to one creator: approved and awaiting review, per currency."""
+    approved: dict[str, float] = field(default_factory=dict)
+    approved_count: int = 0
+    pending: dict[str, float] = field(default_factory=dict)
+    pending_count: int = 0
+
+
+class DatabaseBackend(ABC):
+    """Storage interface used by handlers; implemented by Convex and SQLite backends."""
+
+    @abstractmethod
+    async def close(self) -> None: ...
+
+    @abstractmethod
+    async def init(self) -> None: ...
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        """Run several calls atomically where the backend can; Convex commits each call on its own."""
+        yield
+
+    @abstractmethod
+    async def add_user(self, user_id: int, username: str | None, first_name: str | None) -> None: ...
 
+    @abstractmethod
+    async def ensure_user(self, user_id: int, username: str | None, first_name: str | None) -> tuple[bool, str | None, int | None]: ...
 
-class Database:
+    @abstractmethod
+    async def get_all_users(self) -> list[int]: ...
+
+    @abstractmethod
+    async def create_transaction(
+        self, user_id: int, amount: float, referrer_id: int | None = None, currency: str = "USD", idempotency_key: str | None = None
+    ) -> int | None: ...
+
+    @abstractmethod
+    async def update_transaction_proof(self, transaction_id: int, proof_image_id: str) -> None: ...
+
+    @abstractmethod
+    async def update_transaction_status(self, transaction_id: int, status: str) -> None: ...
+
+    @abstractmethod
+    async def get_transaction(self, transaction_id: int) -> Transaction | None: ...
+
+    @abstractmethod
+    async def get_user_history(self, user_id: int) -> list[tuple[Any, ...]]: ...
+
+    @abstractmethod
+    async def delete_transaction(self, transaction_id: int) -> None: ...
+
+    # Stores the proof hash of a transaction; returns earlier near-duplicates as (tx_id, user_id, distance)
+    @abstractmethod
+    async def record_receipt_hash(
+        self, transaction_id: int, user_id: int, phash: str, max_distance: int = 3, max_band_rows: int = 200
+    ) -> list[tuple[int, int, int]]: ...
+
+    @abstractmethod
+    async def set_active_card(self, card_details: str) -> None: ...
+
+    @abstractmethod
+    async def get_active_card(self) -> str: ...
+
+    @abstractmethod
+    async def add_card(self, details: str, active: bool = True, currency: str = "USD") -> int | None: ...
+
+    @abstractmethod
+    async def list_cards(self, active_only: bool | None = None) -> list[Card]: ...
+
+    @abstractmethod
+    async def set_card_active(self, card_id: int, active: bool) -> None: ...
+
+    @abstractmethod
+    async def delete_card(self, card_id: int) -> None: ...
+
+    @abstractmethod
+    async def get_active_cards(self) -> list[str]: ...
+
+    @abstractmethod
+    async def get_next_active_card(self, currency: str = "USD", transaction_id: int | None = None) -> str | None: ...
+
+    @abstractmethod
+    async def get_currencies_with_active_cards(self) -> list[str]: ...
+
+    @abstractmethod
+    async def set_support_message(self, message: str, namespace: str = "") -> None: ...
+
+    @abstractmethod
+    async def get_support_message(self, namespace: str = "") -> str | None: ...
+
+    @abstractmethod
+    async def get_enabled_donation_currencies(self, namespace: str = "") -> list[str]: ...
+
+    @abstractmethod
+    async def set_donation_currency_enabled(self, currency: str, enabled: bool, namespace: str = "") -> list[str]: ...
+
+    @abstractmethod
+    async def is_donation_currency_enabled(self, currency: str, namespace: str = "") -> bool: ...
+
+    @abstractmethod
+    async def get_stats(self) -> Stats: ...
+
+    @abstractmethod
+    async def get_user_total_donated(self, user_id: int) -> float: ...
+
+    # Rows are (referrer_id, username, first_name, total, approved_count), highest total first;
+    # the returned cursor is opaque and None on the last page
+    @abstractmethod
+    async def get_creator_leaderboard(
+        self, currency: str, limit: int = 10, cursor: str | None = None
+    ) -> tuple[list[tuple[int, str | None, str | None, float, int]], str | None]: ...
+
+    @abstractmethod
+    async def get_creator_incoming(self, referrer_id: int) -> CreatorIncoming: ...
+
+    # Rows are (tx_id, user_id, amount, currency, status, created_at, referrer_id), oldest first;
+    # the returned cursor is opaque and None on the last page
+    @abstractmethod
+    async def export_transactions(
+        self, filters: TransactionFilter, limit: int = 1000, cursor: str | None = None
+    ) -> tuple[list[tuple[Any, ...]], str | None]: ...
+
+    @abstractmethod
+    async def get_user_donated_by_currency(self, user_id: int) -> dict[str, float]: ...
+
+    # Rates are units of REPORTING_CURRENCY per 1 unit of each currency
+    @abstractmethod
+    async def get_exchange_rates(self) -> dict[str, float]: ...
+
+    @abstractmethod
+    async def set_exchange_rate(self, currency: str, rate: float | None) -> dict[str, float]: ...
+
+    @abstractmethod
+    async def get_user(self, user_id: int) -> User | None: ...
+
+    @abstractmethod
+    async def set_user_language(self, user_id: int, lang: str) -> None: ...
+
+    @abstractmethod
+    async def get_user_language(self, user_id: int) -> str | None: ...
+
+    @abstractmethod
+    async def set_user_preferred_referrer(self, user_id: int, referrer_id: int | None) -> None: ...
+
+    @abstractmethod
+    async def get_user_preferred_referrer(self, user_id: int) -> int | None: ...
+
+
+class Database(DatabaseBackend):
     """Async Convex HTTP API database client with connection pooling."""
 
     def __init__(self, convex_url: str, *, auth_header: str | None = None, timeout_s: float = 10.0):
@@ -42,16 +315,22 @@ class Database:
     async def _call(self, kind: str, path: str, args: dict[str, Any]) -> Any:
         client = await self._get_client()
         payload = {"path": path, "args": args, "format": "json"}
-        try:
-            resp = await client.post(f"/api/{kind}", json=payload)
-            resp.raise_for_status()
-            out = resp.json()
-        except httpx.HTTPStatusError as e:
-            raise RuntimeError(f"Convex HTTP error: {e.response.status_code}") from e
-        except httpx.RequestError as e:
-            raise RuntimeError(f"Convex connection error: {e}") from e
-        except Exception as e:
-            raise RuntimeError(f"Convex error: {e}") from e
+        with tracer.span(f"convex.{kind}", path=path):
+            try:
+                if orjson is not None:
+                    resp = await client.post(f"/api/{kind}", content=orjson.dumps(payload))
+                    resp.raise_for_status()
+                    out = orjson.loads(resp.content)
+                else:
+                    resp = await client.post(f"/api/{kind}", json=payload)
+                    resp.raise_for_status()
+                    out = resp.json()
+            except httpx.HTTPStatusError as e:
+                raise RuntimeError(f"Convex HTTP error: {e.response.status_code}") from e
+            except httpx.RequestError as e:
+                raise RuntimeError(f"Convex connection error: {e}") from e
+            except Exception as e:
+                raise RuntimeError(f"Convex error: {e}") from e
 
         if out.get("status") != "success":
             msg = out.get("errorMessage") or "Unknown Convex error"
@@ -78,6 +357,15 @@ class Database:
             {"user_id": int(user_id), "username": username, "first_name": first_name},
         )
 
+    async def ensure_user(self, user_id: int, username: str | None, first_name: str | None) -> tuple[bool, str | None, int | None]:
+        """Create the user if missing; returns (created, language, preferred_referrer_id)."""
+        out = await self.mutation(
+            "users:ensure",
+            {"user_id": int(user_id), "username": username, "first_name": first_name},
+        ) or {}
+        referrer = out.get("preferred_referrer_id")
+        return bool(out.get("created")), out.get("language"), int(referrer) if referrer is not None else None
+
     async def get_all_users(self) -> list[int]:
         all_ids = []
         cursor = None
@@ -98,7 +386,9 @@ class Database:
             cursor = resp.get("continueCursor")
         return all_ids
 
-    async def create_transaction(self, user_id: int, amount: float, referrer_id: int | None = None, currency: str = "USD") -> int | None:
+    async def create_transaction(
+        self, user_id: int, amount: float, referrer_id: int | None = None, currency: str = "USD", idempotency_key: str | None = None
+    ) -> int | None:
         tx_id = await self.mutation(
             "transactions:create",
             {
@@ -106,6 +396,7 @@ class Database:
                 "amount": float(amount),
                 "referrer_id": int(referrer_id) if referrer_id is not None else None,
                 "currency": str(currency),
+                "idempotency_key": str(idempotency_key) if idempotency_key else None,
             },
         )
         return int(tx_id) if tx_id is not None else None
@@ -122,20 +413,9 @@ class Database:
             {"tx_id": int(transaction_id), "status": str(status)},
         )
 
-    async def get_transaction(self, transaction_id: int) -> tuple[Any, ...] | None:
+    async def get_transaction(self, transaction_id: int) -> Transaction | None:
         tx = await self.query("transactions:get", {"tx_id": int(transaction_id)})
-        if not tx:
-            return None
-        return (
-            int(tx["tx_id"]),
-            int(tx["user_id"]),
-            float(tx["amount"]),
-            str(tx["currency"]),
-            str(tx["status"]),
-            tx.get("proof_image_id"),
-            str(tx["created_at"]),
-            int(tx["referrer_id"]) if tx.get("referrer_id") is not None else None,
-        )
+        return _transaction_from_convex(tx) if tx else None
 
     async def get_user_history(self, user_id: int) -> list[tuple[Any, ...]]:
         rows = await self.query("transactions:history", {"user_id": int(user_id)}) or []
@@ -147,6 +427,22 @@ class Database:
     async def delete_transaction(self, transaction_id: int) -> None:
         await self.mutation("transactions:deleteTx", {"tx_id": int(transaction_id)})
 
+    async def record_receipt_hash(
+        self, transaction_id: int, user_id: int, phash: str, max_distance: int = 3, max_band_rows: int = 200
+    ) -> list[tuple[int, int, int]]:
+        rows = await self.mutation(
+            "receipts:record",
+            {
+                "tx_id": int(transaction_id),
+                "user_id": int(user_id),
+                "phash": str(phash),
+                "bands": receipt_hash_bands(phash),
+                "max_distance": int(max_distance),
+                "max_band_rows": int(max_band_rows),
+            },
+        ) or []
+        return [(int(r["tx_id"]), int(r["user_id"]), int(r["distance"])) for r in rows]
+
     async def set_active_card(self, card_details: str) -> None:
         await self.mutation("settings:set", {"key": "active_card", "value": str(card_details)})
 
@@ -161,23 +457,12 @@ class Database:
         )
         return int(card_id) if card_id is not None else None
 
-    async def list_cards(self, active_only: bool | None = None) -> list[tuple[int, str, int, str, str]]:
+    async def list_cards(self, active_only: bool | None = None) -> list[Card]:
         rows = await self.query(
             "cards:list",
             {"active_only": active_only if active_only is not None else None},
         ) or []
-        out: list[tuple[int, str, int, str, str]] = []
-        for r in rows:
-            out.append(
-                (
-                    int(r["card_id"]),
-                    str(r["details"]),
-                    1 if bool(r["is_active"]) else 0,
-                    str(r["created_at"]),
-                    str(r["currency"]),
-                )
-            )
-        return out
+        return [_card_from_convex(r) for r in rows]
 
     async def set_card_active(self, card_id: int, active: bool) -> None:
         await self.mutation("cards:setActive", {"card_id": int(card_id), "active": bool(active)})
@@ -189,32 +474,35 @@ class Database:
         rows = await self.query("cards:activeCards", {}) or []
         return [str(x) for x in rows]
 
-    async def get_next_active_card(self, currency: str = "USD") -> str | None:
-        return await self.mutation("cards:nextActiveCard", {"currency": str(currency)})
+    async def get_next_active_card(self, currency: str = "USD", transaction_id: int | None = None) -> str | None:
+        return await self.mutation(
+            "cards:nextActiveCard",
+            {"currency": str(currency), "tx_id": int(transaction_id) if transaction_id is not None else None},
+        )
 
     async def get_currencies_with_active_cards(self) -> list[str]:
-        rows = await self.query("cards:currenciesWithActiveCards", {}) or []
-        return [str(x) for x in rows]
+        return _str_list(await self.query("cards:currenciesWithActiveCards", {}))
 
-    async def set_support_message(self, message: str) -> None:
-        await self.mutation("settings:setSupportMessage", {"message": str(message)})
+    async def set_support_message(self, message: str, namespace: str = "") -> None:
+        await self.mutation("settings:setSupportMessage", {"message": str(message), **_namespace_arg(namespace)})
 
-    async def get_support_message(self) -> str | None:
-        return await self.query("settings:getSupportMessage", {})
+    async def get_support_message(self, namespace: str = "") -> str | None:
+        return await self.query("settings:getSupportMessage", _namespace_arg(namespace))
 
-    async def get_enabled_donation_currencies(self) -> list[str]:
-        rows = await self.query("settings:getEnabledDonationCurrencies", {}) or []
-        return [str(x) for x in rows]
+    async def get_enabled_donation_currencies(self, namespace: str = "") -> list[str]:
+        return _str_list(await self.query("settings:getEnabledDonationCurrencies", _namespace_arg(namespace)))
 
-    async def set_donation_currency_enabled(self, currency: str, enabled: bool) -> list[str]:
+    async def set_donation_currency_enabled(self, currency: str, enabled: bool, namespace: str = "") -> list[str]:
         rows = await self.mutation(
             "settings:setDonationCurrencyEnabled",
-            {"currency": str(currency), "enabled": bool(enabled)},
+            {"currency": str(currency), "enabled": bool(enabled), **_namespace_arg(namespace)},
         ) or []
         return [str(x) for x in rows]
 
-    async def is_donation_currency_enabled(self, currency: str) -> bool:
-        return bool(await self.query("settings:isDonationCurrencyEnabled", {"currency": str(currency)}))
+    async def is_donation_currency_enabled(self, currency: str, namespace: str = "") -> bool:
+        return bool(
+            await self.query("settings:isDonationCurrencyEnabled", {"currency": str(currency), **_namespace_arg(namespace)})
+        )
 
     async def get_stats(self) -> Stats:
         data = await self.query("transactions:stats", {}) or {}
@@ -222,17 +510,80 @@ class Database:
             total_raised=float(data.get("total_raised") or 0.0),
             pending_reviews=int(data.get("pending_reviews") or 0),
             total_donors=int(data.get("total_donors") or 0),
+            raised_by_currency=_float_map(data.get("raised_by_currency")),
         )
 
     async def get_user_total_donated(self, user_id: int) -> float:
         value = await self.query("transactions:userTotalDonated", {"user_id": int(user_id)})
         return float(value or 0.0)
 
-    async def get_user(self, user_id: int) -> tuple[Any, ...] | None:
+    async def get_creator_leaderboard(
+        self, currency: str, limit: int = 10, cursor: str | None = None
+    ) -> tuple[list[tuple[int, str | None, str | None, float, int]], str | None]:
+        out = await self.query(
+            "creators:leaderboard",
+            {"currency": str(currency).strip().upper(), "numItems": int(limit), "cursor": cursor},
+        ) or {}
+        rows = [
+            (int(r["referrer_id"]), r.get("username"), r.get("first_name"), float(r["total"]), int(r["approved_count"]))
+            for r in out.get("rows") or []
+        ]
+        return rows, out.get("cursor")
+
+    async def get_creator_incoming(self, referrer_id: int) -> CreatorIncoming:
+        rows = await self.query("creators:dashboard", {"referrer_id": int(referrer_id)}) or []
+        return CreatorIncoming(
+            approved={r["currency"]: float(r["total"]) for r in rows},
+            approved_count=sum(int(r["approved_count"]) for r in rows),
+            pending={r["currency"]: float(r["pending_total"]) for r in rows},
+            pending_count=sum(int(r["pending_count"]) for r in rows),
+        )
+
+    async def export_transactions(
+        self, filters: TransactionFilter, limit: int = 1000, cursor: str | None = None
+    ) -> tuple[list[tuple[Any, ...]], str | None]:
+        out = await self.query(
+            "transactions:exportPage",
+            {
+                "status": filters.status,
+                "currency": filters.currency,
+                "referrer_id": filters.referrer_id,
+                "since_ms": filters.since_ms,
+                "until_ms": filters.until_ms,
+                "numItems": int(limit),
+                "cursor": cursor,
+            },
+        ) or {}
+        rows = [
+            (
+                int(r["tx_id"]),
+                int(r["user_id"]),
+                float(r["amount"]),
+                str(r["currency"]),
+                str(r["status"]),
+                str(r["created_at"]),
+                int(r["referrer_id"]) if r.get("referrer_id") is not None else None,
+            )
+            for r in out.get("rows") or []
+        ]
+        return rows, out.get("cursor")
+
+    async def get_user_donated_by_currency(self, user_id: int) -> dict[str, float]:
+        return _float_map(await self.query("transactions:userDonatedByCurrency", {"user_id": int(user_id)}))
+
+    async def get_exchange_rates(self) -> dict[str, float]:
+        return _float_map(await self.query("settings:getExchangeRates", {}))
+
+    async def set_exchange_rate(self, currency: str, rate: float | None) -> dict[str, float]:
+        rates = await self.mutation(
+            "settings:setExchangeRate",
+            {"currency": str(currency).strip().upper(), "rate": float(rate) if rate is not None else None},
+        )
+        return _float_map(rates)
+
+    async def get_user(self, user_id: int) -> User | None:
         user = await self.query("users:get", {"user_id": int(user_id)})
-        if not user:
-            return None
-        return (int(user["user_id"]), user.get("username"), user.get("first_name"))
+        return _user_from_convex(user) if user else None
 
     async def set_user_language(self, user_id: int, lang: str) -> None:
         await self.mutation("users:setLanguage", {"user_id": int(user_id), "language": str(lang)})
@@ -251,13 +602,144 @@ class Database:
         return int(value) if value is not None else None
 
 
+class _KnownUsers:
+    """Bounded LRU set of user ids that exist and have picked a language."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._ids: OrderedDict[int, None] = OrderedDict()
+
+    def __contains__(self, user_id: int) -> bool:
+        if user_id in self._ids:
+            self._ids.move_to_end(user_id)
+            return True
+        return False
+
+    def add(self, user_id: int) -> None:
+        self._ids[user_id] = None
+        self._ids.move_to_end(user_id)
+        if len(self._ids) > self.max_size:
+            self._ids.popitem(last=False)
+
+    def discard(self, user_id: int) -> None:
+        self._ids.pop(user_id, None)
+
+
+_known_users = _KnownUsers(KNOWN_USERS_CACHE_SIZE)
+
+
+def is_known_user(user_id: int) -> bool:
+    return user_id in _known_users
+
+
+def mark_known_user(user_id: int) -> None:
+    _known_users.add(user_id)
+
+
+class _TTLCache:
+    """Short-lived in-process cache for read-mostly values.
+
+    Writes made through this module invalidate their key immediately; changes made
+    elsewhere (dashboard, another process) show up within ``ttl_s``, or as soon as
+    they are pushed when a subscription keeps the key current (see
+    ``start_cache_subscriptions``). Concurrent misses for one key share a single
+    backend call. Every ``set``/``invalidate`` bumps the key's version; a load that
+    was in flight meanwhile returns its result to its callers but doesn't cache it,
+    since it may predate the write or push.
+    """
+
+    def __init__(self, ttl_s: float):
+        self.ttl_s = ttl_s
+        self._values: dict[str, tuple[float, Any]] = {}
+        self._loading: dict[str, asyncio.Future] = {}
+        self._versions: dict[str, int] = {}
+
+    async def get(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            hit = self._values.get(key)
+            if hit is not None and hit[0] > time.monotonic():
+                return hit[1]
+            pending = self._loading.get(key)
+            if pending is None:
+                return await self._load(key, loader)
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # The caller running the load was cancelled, not us: load it ourselves
+                if pending.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._loading[key] = asyncio.get_running_loop().create_future()
+        version = self._versions.get(key, 0)
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        else:
+            if self._versions.get(key, 0) == version:
+                self._store(key, value, self.ttl_s)
+            future.set_result(value)
+            return value
+        finally:
+            if self._loading.get(key) is future:
+                del self._loading[key]
+
+    def set(self, key: str, value: Any, ttl_s: float | None = None) -> None:
+        self._bump(key)
+        self._store(key, value, self.ttl_s if ttl_s is None else ttl_s)
+
+    def invalidate(self, *keys: str) -> None:
+        for key in keys:
+            self._bump(key)
+            self._values.pop(key, None)
+
+    def _bump(self, key: str) -> None:
+        self._versions[key] = self._versions.get(key, 0) + 1
+        # Later misses start a fresh load instead of joining the outdated one
+        self._loading.pop(key, None)
+
+    def _store(self, key: str, value: Any, ttl_s: float) -> None:
+        if ttl_s > 0:
+            self._values[key] = (time.monotonic() + ttl_s, value)
+
+
+# Settings shown on nearly every menu
+_settings = _TTLCache(SETTINGS_CACHE_TTL_S)
+# Leaderboard pages, keyed by currency, page size and page number
+_leaderboard = _TTLCache(LEADERBOARD_CACHE_TTL_S)
+
+
+# Settings a Convex subscription can keep current: cache key -> (query, decode, per namespace)
+_SUBSCRIBED_SETTINGS: dict[str, tuple[str, Callable[[Any], Any], bool]] = {
+    "enabled_currencies": ("settings:getEnabledDonationCurrencies", _str_list, True),
+    "card_currencies": ("cards:currenciesWithActiveCards", _str_list, False),
+    "support_message": ("settings:getSupportMessage", lambda value: value, True),
+    "exchange_rates": ("settings:getExchangeRates", _float_map, False),
+}
+_subscriber = None  # convex_sync.QuerySubscriber while subscriptions run
+
+
 # Module-level database instance
-_db: Database | None = None
+_db: DatabaseBackend | None = None
 
 
-def _get_db() -> Database:
+def _get_db() -> DatabaseBackend:
     global _db
     if _db is None:
+        if DB_BACKEND == "sqlite":
+            from database_sqlite import SQLiteDatabase
+
+            _db = SQLiteDatabase(SQLITE_PATH.strip())
+            return _db
+        if DB_BACKEND != "convex":
+            raise RuntimeError(f"Unknown DB_BACKEND: {DB_BACKEND}")
         url = (os.getenv("CONVEX_URL") or "").strip()
         if not url:
             raise RuntimeError("CONVEX_URL environment variable is required")
@@ -271,16 +753,81 @@ async def init_db():
     await _get_db().init()
 
 
+async def _in_namespace(namespace: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+    token = settings_namespace.set(namespace)
+    try:
+        return await fn()
+    finally:
+        settings_namespace.reset(token)
+
+
+async def preload_settings(namespaces: Iterable[str] = ("",)) -> None:
+    """Fill the settings cache so the first menus render without backend calls."""
+    await asyncio.gather(
+        get_currencies_with_active_cards(),
+        get_exchange_rates(),
+        *(_in_namespace(ns, get_enabled_donation_currencies) for ns in namespaces),
+        *(_in_namespace(ns, get_support_message) for ns in namespaces),
+    )
+
+
+def start_cache_subscriptions(namespaces: Iterable[str] = ("",)) -> bool:
+    """Keep the settings cache current from live Convex queries (CACHE_SUBSCRIPTIONS_ENABLED=1).
+
+    Pushed results never expire while the session is up; if it drops, they are
+    discarded and the cache falls back to SETTINGS_CACHE_TTL_S until it reconnects.
+    Other backends have no writers outside this process and keep plain TTLs.
+    """
+    global _subscriber
+    db = _get_db()
+    if not CACHE_SUBSCRIPTIONS_ENABLED or _subscriber is not None or not isinstance(db, Database):
+        return False
+    from convex_sync import QuerySubscriber
+
+    queries: dict[str, tuple[str, dict[str, Any]]] = {}
+    decoders: dict[str, Callable[[Any], Any]] = {}
+    for key, (path, decode, per_namespace) in _SUBSCRIBED_SETTINGS.items():
+        for ns in (list(namespaces) if per_namespace else [""]):
+            queries[_namespaced(key, ns)] = (path, _namespace_arg(ns))
+            decoders[_namespaced(key, ns)] = decode
+
+    def on_update(key: str, value: Any) -> None:
+        _settings.set(key, decoders[key](value), ttl_s=float("inf"))
+
+    def on_disconnect() -> None:
+        _settings.invalidate(*queries)
+
+    _subscriber = QuerySubscriber(db.convex_url, queries, on_update, on_disconnect)
+    _subscriber.start()
+    return True
+
+
+async def close_db():
+    global _subscriber
+    if _subscriber is not None:
+        await _subscriber.stop()
+        _subscriber = None
+    if _db is not None:
+        await _db.close()
+
+
 async def add_user(user_id, username, first_name):
     await _get_db().add_user(user_id, username, first_name)
 
 
+async def ensure_user(user_id, username, first_name):
+    created, language, preferred_referrer = await _get_db().ensure_user(user_id, username, first_name)
+    if language:
+        mark_known_user(user_id)
+    return created, language, preferred_referrer
+
+
 async def get_all_users():
     return await _get_db().get_all_users()
 
 
-async def create_transaction(user_id, amount, referrer_id=None, currency="USD"):
-    return await _get_db().create_transaction(user_id, amount, referrer_id, currency)
+async def create_transaction(user_id, amount, referrer_id=None, currency="USD", idempotency_key=None):
+    return await _get_db().create_transaction(user_id, amount, referrer_id, currency, idempotency_key)
 
 
 async def update_transaction_proof(transaction_id, proof_image_id):
@@ -303,8 +850,21 @@ async def delete_transaction(transaction_id: int) -> None:
     await _get_db().delete_transaction(transaction_id)
 
 
+@asynccontextmanager
+async def transaction() -> AsyncIterator[None]:
+    async with _get_db().transaction():
+        yield
+
+
+async def record_receipt_hash(
+    transaction_id: int, user_id: int, phash: str, max_distance: int = 3, max_band_rows: int = 200
+) -> list[tuple[int, int, int]]:
+    return await _get_db().record_receipt_hash(transaction_id, user_id, phash, max_distance, max_band_rows)
+
+
 async def set_active_card(card_details):
     await _get_db().set_active_card(card_details)
+    _settings.invalidate("card_currencies")
 
 
 async def get_active_card():
@@ -312,51 +872,64 @@ async def get_active_card():
 
 
 async def add_card(details: str, active: bool = True, currency: str = "USD") -> int | None:
-    return await _get_db().add_card(details, active, currency)
+    card_id = await _get_db().add_card(details, active, currency)
+    _settings.invalidate("card_currencies")
+    return card_id
 
 
-async def list_cards(active_only: bool | None = None) -> list[tuple[int, str, int, str, str]]:
+async def list_cards(active_only: bool | None = None) -> list[Card]:
     return await _get_db().list_cards(active_only)
 
 
 async def set_card_active(card_id: int, active: bool) -> None:
     await _get_db().set_card_active(card_id, active)
+    _settings.invalidate("card_currencies")
 
 
 async def delete_card(card_id: int) -> None:
     await _get_db().delete_card(card_id)
+    _settings.invalidate("card_currencies")
 
 
 async def get_active_cards() -> list[str]:
     return await _get_db().get_active_cards()
 
 
-async def get_next_active_card(currency: str = "USD") -> str | None:
-    return await _get_db().get_next_active_card(currency)
+async def get_next_active_card(currency: str = "USD", transaction_id: int | None = None) -> str | None:
+    return await _get_db().get_next_active_card(currency, transaction_id)
 
 
 async def get_currencies_with_active_cards() -> list[str]:
-    return await _get_db().get_currencies_with_active_cards()
+    return list(await _settings.get("card_currencies", _get_db().get_currencies_with_active_cards))
 
 
 async def set_support_message(message: str) -> None:
-    await _get_db().set_support_message(message)
+    ns = settings_namespace.get()
+    await _get_db().set_support_message(message, ns)
+    _settings.invalidate(_namespaced("support_message", ns))
 
 
 async def get_support_message() -> str | None:
-    return await _get_db().get_support_message()
+    ns = settings_namespace.get()
+    return await _settings.get(_namespaced("support_message", ns), lambda: _get_db().get_support_message(ns))
 
 
 async def get_enabled_donation_currencies() -> list[str]:
-    return await _get_db().get_enabled_donation_currencies()
+    ns = settings_namespace.get()
+    return list(
+        await _settings.get(_namespaced("enabled_currencies", ns), lambda: _get_db().get_enabled_donation_currencies(ns))
+    )
 
 
 async def set_donation_currency_enabled(currency: str, enabled: bool) -> list[str]:
-    return await _get_db().set_donation_currency_enabled(currency, enabled)
+    ns = settings_namespace.get()
+    result = await _get_db().set_donation_currency_enabled(currency, enabled, ns)
+    _settings.set(_namespaced("enabled_currencies", ns), list(result))
+    return result
 
 
 async def is_donation_currency_enabled(currency: str) -> bool:
-    return await _get_db().is_donation_currency_enabled(currency)
+    return await _get_db().is_donation_currency_enabled(currency, settings_namespace.get())
 
 
 async def get_stats():
@@ -365,6 +938,7 @@ async def get_stats():
         "total_raised": stats.total_raised,
         "pending_reviews": stats.pending_reviews,
         "total_donors": stats.total_donors,
+        "raised_by_currency": stats.raised_by_currency,
     }
 
 
@@ -372,16 +946,67 @@ async def get_user_total_donated(user_id):
     return await _get_db().get_user_total_donated(user_id)
 
 
+async def get_creator_leaderboard(currency: str, limit: int = 10, cursor: str | None = None):
+    return await _get_db().get_creator_leaderboard(currency, limit, cursor)
+
+
+async def get_creator_leaderboard_page(
+    currency: str, page: int, page_size: int = 10
+) -> tuple[list[tuple[int, str | None, str | None, float, int]], bool]:
+    """Cached page (0-based) of the leaderboard and whether another page follows.
+
+    Backend cursors are opaque and too long for callback data, so pages are
+    addressed by number and earlier pages' cursors come from the cache.
+    """
+    ccy = str(currency).strip().upper()
+    cursor: str | None = None
+    rows: list[tuple[int, str | None, str | None, float, int]] = []
+    for n in range(page + 1):
+        if n and cursor is None:
+            return [], False
+        rows, cursor = await _leaderboard.get(
+            f"{ccy}:{page_size}:{n}",
+            lambda c=cursor: _get_db().get_creator_leaderboard(ccy, page_size, c),
+        )
+    return list(rows), cursor is not None
+
+
+async def get_creator_incoming(referrer_id: int) -> CreatorIncoming:
+    return await _get_db().get_creator_incoming(referrer_id)
+
+
+async def export_transactions(filters: TransactionFilter, limit: int = 1000, cursor: str | None = None):
+    return await _get_db().export_transactions(filters, limit, cursor)
+
+
+async def get_user_donated_by_currency(user_id: int) -> dict[str, float]:
+    return await _get_db().get_user_donated_by_currency(user_id)
+
+
+async def get_exchange_rates() -> dict[str, float]:
+    return dict(await _settings.get("exchange_rates", _get_db().get_exchange_rates))
+
+
+async def set_exchange_rate(currency: str, rate: float | None) -> dict[str, float]:
+    rates = await _get_db().set_exchange_rate(currency, rate)
+    _settings.set("exchange_rates", dict(rates))
+    return rates
+
+
 async def get_user(user_id):
     return await _get_db().get_user(user_id)
 
 
 async def set_user_language(user_id, lang):
     await _get_db().set_user_language(user_id, lang)
+    mark_known_user(user_id)
 
 
 async def get_user_language(user_id):
-    return await _get_db().get_user_language(user_id)
+    lang = await _get_db().get_user_language(user_id)
+    if lang:
+        mark_known_user(user_id)
+    return lang
 
 
 async def set_user_preferred_referrer(user_id: int, referrer_id: int | None) -> None:
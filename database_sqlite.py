@@ -0,0 +1,888 @@
+"""Embedded SQLite implementation of ``DatabaseBackend``.
+
+Mirrors the tables and indexes of ``convex/schema.ts`` and the semantics of the
+functions in ``convex/*.ts``. All SQLite work runs on a single dedicated thread so
+the event loop never blocks; ``transaction()`` groups several calls atomically.
+
+Select it with ``DB_BACKEND=sqlite`` (``SQLITE_PATH`` defaults to ``donation_bot.db``).
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, TypeVar
+
+from database import (
+    SUPPORTED_CURRENCIES,
+    Card,
+    CreatorIncoming,
+    DatabaseBackend,
+    Stats,
+    Transaction,
+    TransactionFilter,
+    User,
+    hamming_distance,
+    receipt_hash_bands,
+)
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DONATION_ENABLED_CURRENCIES_KEY = "donation_enabled_currencies"
+EXCHANGE_RATES_KEY = "exchange_rates"
+
+# Primary keys stand in for the unique by_user_id / by_tx_id / by_card_id / by_key indexes.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT,
+    first_name TEXT,
+    language TEXT,
+    preferred_referrer_id INTEGER,
+    joined_at TEXT NOT NULL,
+    joined_at_ms INTEGER NOT NULL,
+    total_donated REAL,
+    donated_by_currency TEXT
+);
+
+CREATE TABLE IF NOT EXISTS aggregates (
+    key TEXT PRIMARY KEY,
+    total_raised REAL NOT NULL,
+    total_donors INTEGER NOT NULL,
+    pending_reviews INTEGER NOT NULL,
+    raised_by_currency TEXT
+);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    tx_id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    currency TEXT NOT NULL,
+    status TEXT NOT NULL,
+    proof_image_id TEXT,
+    created_at TEXT NOT NULL,
+    created_at_ms INTEGER NOT NULL,
+    referrer_id INTEGER,
+    idempotency_key TEXT,
+    card_details TEXT
+);
+CREATE INDEX IF NOT EXISTS transactions_by_status ON transactions (status);
+CREATE INDEX IF NOT EXISTS transactions_by_status_created_at_ms ON transactions (status, created_at_ms, tx_id);
+CREATE INDEX IF NOT EXISTS transactions_by_user_created_at_ms ON transactions (user_id, created_at_ms);
+CREATE INDEX IF NOT EXISTS transactions_by_created_at_ms ON transactions (created_at_ms, tx_id);
+CREATE INDEX IF NOT EXISTS transactions_by_referrer_created_at_ms ON transactions (referrer_id, created_at_ms, tx_id);
+
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS cards (
+    card_id INTEGER PRIMARY KEY,
+    details TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    is_active INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    created_at_ms INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cards_by_currency_active_created_at_ms
+    ON cards (currency, is_active, created_at_ms, card_id);
+
+CREATE TABLE IF NOT EXISTS counters (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS creator_totals (
+    referrer_id INTEGER NOT NULL,
+    currency TEXT NOT NULL,
+    total REAL NOT NULL,
+    approved_count INTEGER NOT NULL,
+    pending_total REAL NOT NULL DEFAULT 0,
+    pending_count INTEGER NOT NULL DEFAULT 0,
+    username TEXT,
+    first_name TEXT,
+    PRIMARY KEY (referrer_id, currency)
+);
+CREATE INDEX IF NOT EXISTS creator_totals_by_currency_total ON creator_totals (currency, total, referrer_id);
+
+CREATE TABLE IF NOT EXISTS receipt_hashes (
+    tx_id INTEGER NOT NULL,
+    band TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    phash TEXT NOT NULL,
+    created_at_ms INTEGER NOT NULL,
+    PRIMARY KEY (tx_id, band)
+);
+CREATE INDEX IF NOT EXISTS receipt_hashes_by_band_created_at_ms ON receipt_hashes (band, created_at_ms);
+"""
+
+# Columns added after the first release; applied to existing files before the indexes below.
+_ADDED_COLUMNS: dict[str, dict[str, str]] = {
+    "transactions": {"idempotency_key": "TEXT", "card_details": "TEXT"},
+    "users": {"donated_by_currency": "TEXT"},
+    "aggregates": {"raised_by_currency": "TEXT"},
+    "creator_totals": {"pending_total": "REAL NOT NULL DEFAULT 0", "pending_count": "INTEGER NOT NULL DEFAULT 0"},
+}
+
+_POST_MIGRATION_SCHEMA = """
+CREATE UNIQUE INDEX IF NOT EXISTS transactions_by_idempotency_key
+    ON transactions (idempotency_key) WHERE idempotency_key IS NOT NULL;
+"""
+
+_TABLE_COLUMNS: dict[str, tuple[str, ...]] = {
+    "users": (
+        "user_id", "username", "first_name", "language", "preferred_referrer_id", "joined_at", "joined_at_ms",
+        "total_donated", "donated_by_currency",
+    ),
+    "aggregates": ("key", "total_raised", "total_donors", "pending_reviews", "raised_by_currency"),
+    "transactions": (
+        "tx_id", "user_id", "amount", "currency", "status", "proof_image_id", "created_at", "created_at_ms",
+        "referrer_id", "idempotency_key", "card_details",
+    ),
+    "settings": ("key", "value"),
+    "cards": ("card_id", "details", "currency", "is_active", "created_at", "created_at_ms"),
+    "counters": ("key", "value"),
+    "creator_totals": (
+        "referrer_id", "currency", "total", "approved_count", "pending_total", "pending_count", "username", "first_name",
+    ),
+    "receipt_hashes": ("tx_id", "band", "user_id", "phash", "created_at_ms"),
+}
+
+
+def _now() -> tuple[str, int]:
+    ms = int(time.time() * 1000)
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ms / 1000)), ms
+
+
+def _next_counter(conn: sqlite3.Connection, key: str) -> int:
+    row = conn.execute(
+        "INSERT INTO counters (key, value) VALUES (?, 1) "
+        "ON CONFLICT(key) DO UPDATE SET value = value + 1 RETURNING value",
+        (key,),
+    ).fetchone()
+    return int(row[0])
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    for table, columns in _ADDED_COLUMNS.items():
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for name, decl in columns.items():
+            if name not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+    conn.executescript(_POST_MIGRATION_SCHEMA)
+
+
+def _add_creator_totals(
+    conn: sqlite3.Connection,
+    referrer_id: int,
+    currency: str,
+    *,
+    total: float = 0.0,
+    approved_count: int = 0,
+    pending_total: float = 0.0,
+    pending_count: int = 0,
+) -> None:
+    # The creator's name is copied in so leaderboard pages need no join
+    conn.execute(
+        "INSERT INTO creator_totals "
+        "(referrer_id, currency, total, approved_count, pending_total, pending_count, username, first_name) "
+        "SELECT ?, ?, ?, ?, MAX(?, 0), MAX(?, 0), u.username, u.first_name FROM (SELECT 1) "
+        "LEFT JOIN users u ON u.user_id = ? WHERE true "
+        "ON CONFLICT(referrer_id, currency) DO UPDATE SET total = total + excluded.total, "
+        "approved_count = approved_count + excluded.approved_count, "
+        "pending_total = MAX(pending_total + ?, 0), pending_count = MAX(pending_count + ?, 0), "
+        "username = excluded.username, first_name = excluded.first_name",
+        (
+            referrer_id, currency, total, approved_count, pending_total, pending_count, referrer_id,
+            pending_total, pending_count,
+        ),
+    )
+
+
+def _get_setting(conn: sqlite3.Connection, key: str) -> str | None:
+    row = conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def _set_setting(conn: sqlite3.Connection, key: str, value: str) -> None:
+    conn.execute(
+        "INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, value),
+    )
+
+
+def _namespaced(key: str, namespace: str) -> str:
+    return f"{namespace}:{key}" if namespace else key
+
+
+def _enabled_currencies(conn: sqlite3.Connection, namespace: str = "") -> list[str]:
+    raw = _get_setting(conn, _namespaced(DONATION_ENABLED_CURRENCIES_KEY, namespace)) or ",".join(SUPPORTED_CURRENCIES)
+    values = [v.strip().upper() for v in raw.split(",") if v.strip()]
+    return [v for v in values if v in SUPPORTED_CURRENCIES]
+
+
+class SQLiteDatabase(DatabaseBackend):
+    """SQLite (WAL) storage engine with the same interface as the Convex client."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._lock = asyncio.Lock()
+        # Task inside transaction(); tasks it spawns don't join the transaction
+        self._tx_owner: asyncio.Task | None = None
+
+    # ----- plumbing -----
+
+    def _connection(self) -> sqlite3.Connection:
+        # Only ever called on the executor thread.
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript(_SCHEMA)
+            _migrate(conn)
+            self._conn = conn
+        return self._conn
+
+    def _atomic(self, fn: Callable[[sqlite3.Connection], T], write: bool) -> T:
+        conn = self._connection()
+        if not write:
+            return fn(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    async def _run(self, name: str, fn: Callable[[sqlite3.Connection], T], *, write: bool = False) -> T:
+        loop = asyncio.get_running_loop()
+        with tracer.span(f"sqlite.{name}"):
+            if self._tx_owner is not None and self._tx_owner is asyncio.current_task():
+                # Inside transaction(): the lock is held and BEGIN already issued.
+                return await loop.run_in_executor(self._executor, lambda: fn(self._connection()))
+            async with self._lock:
+                return await loop.run_in_executor(self._executor, self._atomic, fn, write)
+
+    async def _exec(self, sql: str) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, lambda: self._connection().execute(sql))
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        """Run several calls atomically; nested use joins the outer transaction."""
+        if self._tx_owner is not None and self._tx_owner is asyncio.current_task():
+            yield
+            return
+        async with self._lock:
+            self._tx_owner = asyncio.current_task()
+            try:
+                await self._exec("BEGIN IMMEDIATE")
+                try:
+                    yield
+                except BaseException:
+                    await self._exec("ROLLBACK")
+                    raise
+                await self._exec("COMMIT")
+            finally:
+                self._tx_owner = None
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            conn = self._conn
+            self._conn = None
+            await asyncio.get_running_loop().run_in_executor(self._executor, conn.close)
+        self._executor.shutdown(wait=False)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+
+    # ----- meta -----
+
+    async def init(self) -> None:
+        def fn(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                "INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)",
+                (DONATION_ENABLED_CURRENCIES_KEY, ",".join(SUPPORTED_CURRENCIES)),
+            )
+            conn.execute("INSERT OR IGNORE INTO counters (key, value) VALUES ('transactions', 0)")
+            conn.execute("INSERT OR IGNORE INTO counters (key, value) VALUES ('cards', 0)")
+            conn.execute(
+                "INSERT OR IGNORE INTO aggregates (key, total_raised, total_donors, pending_reviews, raised_by_currency) "
+                "VALUES ('stats', 0, 0, 0, '{}')"
+            )
+
+        await self._run("init", fn, write=True)
+
+    # ----- users -----
+
+    async def add_user(self, user_id: int, username: str | None, first_name: str | None) -> None:
+        joined_at, ms = _now()
+
+        def fn(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                "INSERT OR IGNORE INTO users (user_id, username, first_name, joined_at, joined_at_ms) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (int(user_id), username, first_name, joined_at, ms),
+            )
+
+        await self._run("add_user", fn, write=True)
+
+    async def ensure_user(self, user_id: int, username: str | None, first_name: str | None) -> tuple[bool, str | None, int | None]:
+        joined_at, ms = _now()
+
+        def fn(conn: sqlite3.Connection) -> tuple[bool, str | None, int | None]:
+            row = conn.execute(
+                "SELECT language, preferred_referrer_id FROM users WHERE user_id = ?", (int(user_id),)
+            ).fetchone()
+            if row:
+                return False, row[0], int(row[1]) if row[1] is not None else None
+            conn.execute(
+                "INSERT INTO users (user_id, username, first_name, joined_at, joined_at_ms) VALUES (?, ?, ?, ?, ?)",
+                (int(user_id), username, first_name, joined_at, ms),
+            )
+            return True, None, None
+
+        return await self._run("ensure_user", fn, write=True)
+
+    async def get_all_users(self) -> list[int]:
+        rows = await self._run("get_all_users", lambda c: c.execute("SELECT user_id FROM users ORDER BY joined_at_ms").fetchall())
+        return [int(r[0]) for r in rows]
+
+    async def get_user(self, user_id: int) -> User | None:
+        row = await self._run(
+            "get_user",
+            lambda c: c.execute("SELECT user_id, username, first_name FROM users WHERE user_id = ?", (int(user_id),)).fetchone(),
+        )
+        return User(int(row[0]), row[1], row[2]) if row else None
+
+    async def set_user_language(self, user_id: int, lang: str) -> None:
+        await self._run(
+            "set_user_language",
+            lambda c: c.execute("UPDATE users SET language = ? WHERE user_id = ?", (str(lang), int(user_id))),
+            write=True,
+        )
+
+    async def get_user_language(self, user_id: int) -> str | None:
+        row = await self._run(
+            "get_user_language",
+            lambda c: c.execute("SELECT language FROM users WHERE user_id = ?", (int(user_id),)).fetchone(),
+        )
+        return row[0] if row else None
+
+    async def set_user_preferred_referrer(self, user_id: int, referrer_id: int | None) -> None:
+        ref = int(referrer_id) if referrer_id is not None else None
+        await self._run(
+            "set_user_preferred_referrer",
+            lambda c: c.execute("UPDATE users SET preferred_referrer_id = ? WHERE user_id = ?", (ref, int(user_id))),
+            write=True,
+        )
+
+    async def get_user_preferred_referrer(self, user_id: int) -> int | None:
+        row = await self._run(
+            "get_user_preferred_referrer",
+            lambda c: c.execute("SELECT preferred_referrer_id FROM users WHERE user_id = ?", (int(user_id),)).fetchone(),
+        )
+        return int(row[0]) if row and row[0] is not None else None
+
+    # ----- transactions -----
+
+    async def create_transaction(
+        self, user_id: int, amount: float, referrer_id: int | None = None, currency: str = "USD", idempotency_key: str | None = None
+    ) -> int | None:
+        created_at, ms = _now()
+        key = str(idempotency_key) if idempotency_key else None
+
+        def fn(conn: sqlite3.Connection) -> int:
+            if key:
+                row = conn.execute("SELECT tx_id FROM transactions WHERE idempotency_key = ?", (key,)).fetchone()
+                if row:
+                    return int(row[0])
+            tx_id = _next_counter(conn, "transactions")
+            conn.execute(
+                "INSERT INTO transactions (tx_id, user_id, amount, currency, status, proof_image_id, created_at, created_at_ms, referrer_id, idempotency_key) "
+                "VALUES (?, ?, ?, ?, 'pending_proof', NULL, ?, ?, ?, ?)",
+                (
+                    tx_id,
+                    int(user_id),
+                    float(amount),
+                    str(currency),
+                    created_at,
+                    ms,
+                    int(referrer_id) if referrer_id is not None else None,
+                    key,
+                ),
+            )
+            return tx_id
+
+        return await self._run("create_transaction", fn, write=True)
+
+    async def update_transaction_proof(self, transaction_id: int, proof_image_id: str) -> None:
+        def fn(conn: sqlite3.Connection) -> None:
+            tx = conn.execute(
+                "SELECT amount, currency, status, referrer_id FROM transactions WHERE tx_id = ?",
+                (int(transaction_id),),
+            ).fetchone()
+            if not tx:
+                return
+            amount, currency, old_status, referrer_id = tx
+            # A re-uploaded proof must not count the donation as pending twice
+            if old_status != "pending_approval" and referrer_id is not None:
+                _add_creator_totals(conn, referrer_id, currency, pending_total=amount, pending_count=1)
+            conn.execute(
+                "UPDATE transactions SET proof_image_id = ?, status = 'pending_approval' WHERE tx_id = ?",
+                (str(proof_image_id), int(transaction_id)),
+            )
+
+        await self._run("update_transaction_proof", fn, write=True)
+
+    async def update_transaction_status(self, transaction_id: int, status: str) -> None:
+        def fn(conn: sqlite3.Connection) -> None:
+            tx = conn.execute(
+                "SELECT user_id, amount, currency, status, referrer_id FROM transactions WHERE tx_id = ?",
+                (int(transaction_id),),
+            ).fetchone()
+            if not tx:
+                return
+            user_id, amount, currency, old_status, referrer_id = tx
+            approves = old_status != "approved" and status == "approved"
+            leaves_pending = old_status == "pending_approval" and status != "pending_approval"
+            if approves:
+                conn.execute(
+                    "UPDATE aggregates SET total_raised = total_raised + ?, "
+                    "raised_by_currency = json_set(COALESCE(raised_by_currency, '{}'), ?, "
+                    "COALESCE(json_extract(raised_by_currency, ?), 0) + ?) WHERE key = 'stats'",
+                    (amount, f"$.{currency}", f"$.{currency}", amount),
+                )
+                conn.execute(
+                    "UPDATE users SET total_donated = COALESCE(total_donated, 0) + ?, "
+                    "donated_by_currency = json_set(COALESCE(donated_by_currency, '{}'), ?, "
+                    "COALESCE(json_extract(donated_by_currency, ?), 0) + ?) WHERE user_id = ?",
+                    (amount, f"$.{currency}", f"$.{currency}", amount, user_id),
+                )
+            if referrer_id is not None and (approves or leaves_pending):
+                _add_creator_totals(
+                    conn,
+                    referrer_id,
+                    currency,
+                    total=amount if approves else 0.0,
+                    approved_count=1 if approves else 0,
+                    pending_total=-amount if leaves_pending else 0.0,
+                    pending_count=-1 if leaves_pending else 0,
+                )
+            conn.execute("UPDATE transactions SET status = ? WHERE tx_id = ?", (str(status), int(transaction_id)))
+
+        await self._run("update_transaction_status", fn, write=True)
+
+    async def get_transaction(self, transaction_id: int) -> Transaction | None:
+        row = await self._run(
+            "get_transaction",
+            lambda c: c.execute(
+                "SELECT tx_id, user_id, amount, currency, status, proof_image_id, created_at, referrer_id "
+                "FROM transactions WHERE tx_id = ?",
+                (int(transaction_id),),
+            ).fetchone(),
+        )
+        if not row:
+            return None
+        return Transaction(
+            int(row[0]),
+            int(row[1]),
+            float(row[2]),
+            str(row[3]),
+            str(row[4]),
+            row[5],
+            str(row[6]),
+            int(row[7]) if row[7] is not None else None,
+        )
+
+    async def get_user_history(self, user_id: int) -> list[tuple[Any, ...]]:
+        rows = await self._run(
+            "get_user_history",
+            lambda c: c.execute(
+                "SELECT tx_id, amount, status, created_at FROM transactions WHERE user_id = ? "
+                "ORDER BY created_at_ms DESC, tx_id DESC LIMIT 10",
+                (int(user_id),),
+            ).fetchall(),
+        )
+        return [(int(r[0]), float(r[1]), str(r[2]), str(r[3])) for r in rows]
+
+    async def delete_transaction(self, transaction_id: int) -> None:
+        def fn(conn: sqlite3.Connection) -> None:
+            tx = conn.execute(
+                "SELECT amount, currency, status, referrer_id FROM transactions WHERE tx_id = ?",
+                (int(transaction_id),),
+            ).fetchone()
+            if not tx:
+                return
+            amount, currency, status, referrer_id = tx
+            # Take the donation back out of the recipient's totals
+            pending = status == "pending_approval"
+            approved = status == "approved"
+            if referrer_id is not None and (pending or approved):
+                _add_creator_totals(
+                    conn,
+                    referrer_id,
+                    currency,
+                    total=-amount if approved else 0.0,
+                    approved_count=-1 if approved else 0,
+                    pending_total=-amount if pending else 0.0,
+                    pending_count=-1 if pending else 0,
+                )
+            conn.execute("DELETE FROM transactions WHERE tx_id = ?", (int(transaction_id),))
+
+        await self._run("delete_transaction", fn, write=True)
+
+    async def get_stats(self) -> Stats:
+        row = await self._run(
+            "get_stats",
+            lambda c: c.execute(
+                "SELECT total_raised, pending_reviews, total_donors, raised_by_currency FROM aggregates WHERE key = 'stats'"
+            ).fetchone(),
+        )
+        if not row:
+            return Stats(total_raised=0.0, pending_reviews=0, total_donors=0)
+        return Stats(
+            total_raised=float(row[0] or 0.0),
+            pending_reviews=int(row[1] or 0),
+            total_donors=int(row[2] or 0),
+            raised_by_currency=_json_floats(row[3]),
+        )
+
+    async def get_user_total_donated(self, user_id: int) -> float:
+        row = await self._run(
+            "get_user_total_donated",
+            lambda c: c.execute("SELECT total_donated FROM users WHERE user_id = ?", (int(user_id),)).fetchone(),
+        )
+        return float(row[0] or 0.0) if row else 0.0
+
+    async def get_creator_leaderboard(
+        self, currency: str, limit: int = 10, cursor: str | None = None
+    ) -> tuple[list[tuple[int, str | None, str | None, float, int]], str | None]:
+        ccy = str(currency).strip().upper()
+
+        def fn(conn: sqlite3.Connection) -> list[tuple[Any, ...]]:
+            sql = (
+                "SELECT referrer_id, username, first_name, total, approved_count FROM creator_totals "
+                "WHERE currency = ? AND total > 0"
+            )
+            params: list[Any] = [ccy]
+            if cursor:
+                # Keyset cursor "<total>:<referrer_id>" of the last row on the previous page
+                total, _, referrer_id = cursor.partition(":")
+                sql += " AND (total < ? OR (total = ? AND referrer_id < ?))"
+                params += [float(total), float(total), int(referrer_id)]
+            sql += " ORDER BY total DESC, referrer_id DESC LIMIT ?"
+            return conn.execute(sql, (*params, int(limit) + 1)).fetchall()
+
+        rows = await self._run("get_creator_leaderboard", fn)
+        page = [(int(r[0]), r[1], r[2], float(r[3]), int(r[4])) for r in rows[:limit]]
+        next_cursor = f"{page[-1][3]!r}:{page[-1][0]}" if len(rows) > limit else None
+        return page, next_cursor
+
+    async def get_creator_incoming(self, referrer_id: int) -> CreatorIncoming:
+        rows = await self._run(
+            "get_creator_incoming",
+            lambda c: c.execute(
+                "SELECT currency, total, approved_count, pending_total, pending_count FROM creator_totals "
+                "WHERE referrer_id = ?",
+                (int(referrer_id),),
+            ).fetchall(),
+        )
+        return CreatorIncoming(
+            approved={str(r[0]): float(r[1]) for r in rows},
+            approved_count=sum(int(r[2]) for r in rows),
+            pending={str(r[0]): float(r[3]) for r in rows},
+            pending_count=sum(int(r[4]) for r in rows),
+        )
+
+    async def export_transactions(
+        self, filters: TransactionFilter, limit: int = 1000, cursor: str | None = None
+    ) -> tuple[list[tuple[Any, ...]], str | None]:
+        where: list[str] = []
+        params: list[Any] = []
+        for column, value in (
+            ("status", filters.status),
+            ("currency", filters.currency),
+            ("referrer_id", filters.referrer_id),
+        ):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if filters.since_ms is not None:
+            where.append("created_at_ms >= ?")
+            params.append(int(filters.since_ms))
+        if filters.until_ms is not None:
+            where.append("created_at_ms < ?")
+            params.append(int(filters.until_ms))
+        if cursor:
+            # Keyset cursor "<created_at_ms>:<tx_id>" of the last row on the previous page
+            created_at_ms, _, tx_id = cursor.partition(":")
+            where.append("(created_at_ms > ? OR (created_at_ms = ? AND tx_id > ?))")
+            params += [int(created_at_ms), int(created_at_ms), int(tx_id)]
+        sql = (
+            "SELECT tx_id, user_id, amount, currency, status, created_at, referrer_id, created_at_ms FROM transactions"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + " ORDER BY created_at_ms, tx_id LIMIT ?"
+        )
+        rows = await self._run(
+            "export_transactions", lambda c: c.execute(sql, (*params, int(limit) + 1)).fetchall()
+        )
+        page = [
+            (int(r[0]), int(r[1]), float(r[2]), str(r[3]), str(r[4]), str(r[5]), int(r[6]) if r[6] is not None else None)
+            for r in rows[:limit]
+        ]
+        next_cursor = f"{rows[limit - 1][7]}:{rows[limit - 1][0]}" if len(rows) > limit else None
+        return page, next_cursor
+
+    async def get_user_donated_by_currency(self, user_id: int) -> dict[str, float]:
+        row = await self._run(
+            "get_user_donated_by_currency",
+            lambda c: c.execute("SELECT donated_by_currency FROM users WHERE user_id = ?", (int(user_id),)).fetchone(),
+        )
+        return _json_floats(row[0]) if row else {}
+
+    # ----- settings -----
+
+    async def get_exchange_rates(self) -> dict[str, float]:
+        raw = await self._run("get_exchange_rates", lambda c: _get_setting(c, EXCHANGE_RATES_KEY))
+        return _json_floats(raw)
+
+    async def set_exchange_rate(self, currency: str, rate: float | None) -> dict[str, float]:
+        ccy = str(currency).strip().upper()
+
+        def fn(conn: sqlite3.Connection) -> dict[str, float]:
+            rates = _json_floats(_get_setting(conn, EXCHANGE_RATES_KEY))
+            if rate is None:
+                rates.pop(ccy, None)
+            else:
+                rates[ccy] = float(rate)
+            _set_setting(conn, EXCHANGE_RATES_KEY, json.dumps(rates))
+            return rates
+
+        return await self._run("set_exchange_rate", fn, write=True)
+
+    async def set_active_card(self, card_details: str) -> None:
+        await self._run("set_active_card", lambda c: _set_setting(c, "active_card", str(card_details)), write=True)
+
+    async def get_active_card(self) -> str:
+        value = await self._run("get_active_card", lambda c: _get_setting(c, "active_card"))
+        return str(value) if value else "No card set. Contact admin."
+
+    async def set_support_message(self, message: str, namespace: str = "") -> None:
+        key = _namespaced("support_message", namespace)
+        await self._run("set_support_message", lambda c: _set_setting(c, key, str(message)), write=True)
+
+    async def get_support_message(self, namespace: str = "") -> str | None:
+        key = _namespaced("support_message", namespace)
+        return await self._run("get_support_message", lambda c: _get_setting(c, key))
+
+    async def get_enabled_donation_currencies(self, namespace: str = "") -> list[str]:
+        return await self._run("get_enabled_donation_currencies", lambda c: _enabled_currencies(c, namespace))
+
+    async def set_donation_currency_enabled(self, currency: str, enabled: bool, namespace: str = "") -> list[str]:
+        ccy = str(currency).strip().upper()
+
+        def fn(conn: sqlite3.Connection) -> list[str]:
+            current = set(_enabled_currencies(conn, namespace))
+            if ccy in SUPPORTED_CURRENCIES:
+                if enabled:
+                    current.add(ccy)
+                else:
+                    current.discard(ccy)
+            ordered = [c for c in SUPPORTED_CURRENCIES if c in current]
+            _set_setting(conn, _namespaced(DONATION_ENABLED_CURRENCIES_KEY, namespace), ",".join(ordered))
+            return ordered
+
+        return await self._run("set_donation_currency_enabled", fn, write=True)
+
+    async def is_donation_currency_enabled(self, currency: str, namespace: str = "") -> bool:
+        ccy = str(currency).strip().upper()
+        if ccy not in SUPPORTED_CURRENCIES:
+            return False
+        return ccy in await self.get_enabled_donation_currencies(namespace)
+
+    # ----- cards -----
+
+    async def add_card(self, details: str, active: bool = True, currency: str = "USD") -> int | None:
+        created_at, ms = _now()
+
+        def fn(conn: sqlite3.Connection) -> int:
+            card_id = _next_counter(conn, "cards")
+            conn.execute(
+                "INSERT INTO cards (card_id, details, currency, is_active, created_at, created_at_ms) VALUES (?, ?, ?, ?, ?, ?)",
+                (card_id, str(details), str(currency), 1 if active else 0, created_at, ms),
+            )
+            return card_id
+
+        return await self._run("add_card", fn, write=True)
+
+    async def list_cards(self, active_only: bool | None = None) -> list[Card]:
+        def fn(conn: sqlite3.Connection) -> list[tuple[Any, ...]]:
+            sql = "SELECT card_id, details, is_active, created_at, currency FROM cards"
+            params: tuple[Any, ...] = ()
+            if active_only is not None:
+                sql += " WHERE is_active = ?"
+                params = (1 if active_only else 0,)
+            return conn.execute(sql + " ORDER BY created_at_ms DESC", params).fetchall()
+
+        rows = await self._run("list_cards", fn)
+        return [Card(int(r[0]), str(r[1]), bool(r[2]), str(r[3]), str(r[4])) for r in rows]
+
+    async def set_card_active(self, card_id: int, active: bool) -> None:
+        await self._run(
+            "set_card_active",
+            lambda c: c.execute("UPDATE cards SET is_active = ? WHERE card_id = ?", (1 if active else 0, int(card_id))),
+            write=True,
+        )
+
+    async def delete_card(self, card_id: int) -> None:
+        await self._run(
+            "delete_card", lambda c: c.execute("DELETE FROM cards WHERE card_id = ?", (int(card_id),)), write=True
+        )
+
+    async def get_active_cards(self) -> list[str]:
+        rows = await self._run(
+            "get_active_cards",
+            lambda c: c.execute("SELECT details FROM cards WHERE is_active = 1 ORDER BY created_at_ms DESC").fetchall(),
+        )
+        return [str(r[0]) for r in rows]
+
+    async def get_next_active_card(self, currency: str = "USD", transaction_id: int | None = None) -> str | None:
+        ccy = str(currency).strip().upper()
+        tx_id = int(transaction_id) if transaction_id is not None else None
+
+        def fn(conn: sqlite3.Connection) -> str | None:
+            if tx_id is not None:
+                row = conn.execute("SELECT card_details FROM transactions WHERE tx_id = ?", (tx_id,)).fetchone()
+                if row and row[0]:
+                    return str(row[0])
+            cards = conn.execute(
+                "SELECT details FROM cards WHERE currency = ? AND is_active = 1 ORDER BY created_at_ms, card_id",
+                (ccy,),
+            ).fetchall()
+            if not cards:
+                return None
+            ptr_key = f"card_rr_pointer_{ccy}"
+            try:
+                ptr = int(_get_setting(conn, ptr_key) or "0") % len(cards)
+            except ValueError:
+                ptr = 0
+            _set_setting(conn, ptr_key, str((ptr + 1) % len(cards)))
+            if tx_id is not None:
+                conn.execute("UPDATE transactions SET card_details = ? WHERE tx_id = ?", (cards[ptr][0], tx_id))
+            return str(cards[ptr][0])
+
+        return await self._run("get_next_active_card", fn, write=True)
+
+    async def get_currencies_with_active_cards(self) -> list[str]:
+        rows = await self._run(
+            "get_currencies_with_active_cards",
+            lambda c: c.execute(
+                "SELECT currency FROM cards WHERE is_active = 1 GROUP BY currency ORDER BY MIN(card_id)"
+            ).fetchall(),
+        )
+        return [str(r[0]) for r in rows]
+
+    # ----- receipts -----
+
+    async def record_receipt_hash(
+        self, transaction_id: int, user_id: int, phash: str, max_distance: int = 3, max_band_rows: int = 200
+    ) -> list[tuple[int, int, int]]:
+        tx_id = int(transaction_id)
+        bands = receipt_hash_bands(phash)
+
+        def fn(conn: sqlite3.Connection) -> list[tuple[int, int, int]]:
+            candidates: dict[int, tuple[int, str]] = {}
+            for band in bands:
+                band_rows = conn.execute(
+                    "SELECT tx_id, user_id, phash FROM receipt_hashes WHERE band = ? "
+                    "ORDER BY created_at_ms DESC LIMIT ?",
+                    (band, int(max_band_rows) + 1),
+                ).fetchall()
+                # Shared by too many receipts to tell them apart (see receipts:record)
+                if len(band_rows) > max_band_rows:
+                    continue
+                candidates.update((int(r[0]), (int(r[1]), r[2])) for r in band_rows if r[0] != tx_id)
+            rows = [(t, u, p) for t, (u, p) in candidates.items()]
+            # A re-uploaded proof replaces the transaction's previous hash
+            conn.execute("DELETE FROM receipt_hashes WHERE tx_id = ?", (tx_id,))
+            _, now = _now()
+            conn.executemany(
+                "INSERT INTO receipt_hashes (tx_id, band, user_id, phash, created_at_ms) VALUES (?, ?, ?, ?, ?)",
+                [(tx_id, band, int(user_id), phash, now) for band in bands],
+            )
+            matches = [(int(r[0]), int(r[1]), hamming_distance(phash, r[2])) for r in rows]
+            return sorted((m for m in matches if m[2] <= max_distance), key=lambda m: (m[2], m[0]))
+
+        return await self._run("record_receipt_hash", fn, write=True)
+
+    # ----- migration -----
+
+    async def import_convex_export(self, zip_path: str) -> dict[str, int]:
+        """Load a ``npx convex export`` snapshot (``<table>/documents.jsonl``) into this database."""
+
+        def fn(conn: sqlite3.Connection) -> dict[str, int]:
+            counts: dict[str, int] = {}
+            with zipfile.ZipFile(zip_path) as zf:
+                for table, columns in _TABLE_COLUMNS.items():
+                    member = f"{table}/documents.jsonl"
+                    if member not in zf.namelist():
+                        continue
+                    placeholders = ", ".join("?" for _ in columns)
+                    sql = f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+                    n = 0
+                    with zf.open(member) as f:
+                        for line in f:
+                            if not line.strip():
+                                continue
+                            doc = json.loads(line)
+                            conn.execute(sql, tuple(_sqlite_value(doc.get(c)) for c in columns))
+                            n += 1
+                    counts[table] = n
+            return counts
+
+        return await self._run("import_convex_export", fn, write=True)
+
+
+def _json_floats(raw: str | None) -> dict[str, float]:
+    try:
+        return {str(k): float(v) for k, v in json.loads(raw).items()} if raw else {}
+    except (ValueError, AttributeError):
+        return {}
+
+
+def _sqlite_value(value: Any) -> Any:
+    if isinstance(value, bool):
+        return 1 if value else 0
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return value
+
+
+async def _import_main(zip_path: str, db_path: str) -> None:
+    db = SQLiteDatabase(db_path)
+    await db.init()
+    counts = await db.import_convex_export(zip_path)
+    await db.close()
+    for table, n in counts.items():
+        print(f"{table}: {n} rows")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import a Convex snapshot export into a SQLite database.")
+    parser.add_argument("export_zip", help="zip produced by `npx convex export --path ...`")
+    parser.add_argument("--db", default="donation_bot.db", help="target SQLite file")
+    ns = parser.parse_args()
+    asyncio.run(_import_main(ns.export_zip, ns.db))
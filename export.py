@@ -0,0 +1,111 @@
+"""Admin export of transactions to a gzip-compressed CSV or JSONL file.
+
+Pages are fetched from the backend with its cursor and written as they arrive, so
+memory stays flat however many rows match. The next page is requested while the
+current one is compressed on a worker thread.
+"""
+import asyncio
+import csv
+import gzip
+import json
+import logging
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import IO, Any, Awaitable, Callable
+
+import database as db
+from config import EXPORT_PAGE_SIZE
+from database import TransactionFilter
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "jsonl")
+STATUSES = ("pending_proof", "pending_approval", "approved", "rejected")
+COLUMNS = ("tx_id", "user_id", "amount", "currency", "status", "created_at", "referrer_id")
+MAX_DOCUMENT_BYTES = 50 * 1024 * 1024  # Bot API upload limit
+
+
+def _day_ms(value: str) -> int:
+    day = datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    return int(day.timestamp() * 1000)
+
+
+def parse_args(args: str | None) -> tuple[str, TransactionFilter]:
+    """``[csv|jsonl] [status=..] [currency=..] [referrer=ID] [from=YYYY-MM-DD] [to=YYYY-MM-DD]``.
+
+    Dates are UTC days and ``to`` is inclusive. Raises ValueError on anything else.
+    """
+    fmt = "csv"
+    options: dict[str, Any] = {}
+    for token in (args or "").split():
+        if token.lower() in FORMATS:
+            fmt = token.lower()
+            continue
+        key, sep, value = token.partition("=")
+        key = key.lower()
+        if not sep or not value:
+            raise ValueError(token)
+        if key == "status" and value.lower() in STATUSES:
+            options["status"] = value.lower()
+        elif key == "currency" and value.upper() in db.SUPPORTED_CURRENCIES:
+            options["currency"] = value.upper()
+        elif key == "referrer" and value.isdigit():
+            options["referrer_id"] = int(value)
+        elif key == "from":
+            options["since_ms"] = _day_ms(value)
+        elif key == "to":
+            options["until_ms"] = _day_ms(value) + int(timedelta(days=1).total_seconds() * 1000)
+        else:
+            raise ValueError(token)
+    return fmt, TransactionFilter(**options)
+
+
+def _write_rows(fmt: str, out: IO[str], writer: Any, rows: list[tuple[Any, ...]]) -> None:
+    if fmt == "csv":
+        writer.writerows(rows)
+    else:
+        out.writelines(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + "\n" for row in rows)
+
+
+async def export_transactions(
+    filters: TransactionFilter,
+    fmt: str = "csv",
+    progress: Callable[[int], Awaitable[None]] | None = None,
+) -> tuple[str, int]:
+    """Write matching transactions to a temporary ``.gz`` file; returns (path, rows).
+
+    The caller owns the file and must remove it.
+    """
+    fd, path = tempfile.mkstemp(prefix="transactions-", suffix=f".{fmt}.gz")
+    os.close(fd)
+    total = 0
+    try:
+        with gzip.open(path, "wt", encoding="utf-8", newline="") as out:
+            writer = csv.writer(out) if fmt == "csv" else None
+            if writer:
+                writer.writerow(COLUMNS)
+            rows, cursor = await db.export_transactions(filters, EXPORT_PAGE_SIZE)
+            while True:
+                next_page = (
+                    asyncio.ensure_future(db.export_transactions(filters, EXPORT_PAGE_SIZE, cursor))
+                    if cursor
+                    else None
+                )
+                try:
+                    await asyncio.to_thread(_write_rows, fmt, out, writer, rows)
+                except BaseException:
+                    if next_page:
+                        next_page.cancel()
+                    raise
+                total += len(rows)
+                if progress:
+                    await progress(total)
+                if next_page is None:
+                    break
+                rows, cursor = await next_page
+    except BaseException:
+        os.remove(path)
+        raise
+    logger.info(f"Exported {total} transactions to {path} ({os.path.getsize(path)} bytes)")
+    return path, total
@@ -1,40 +1,66 @@
+import asyncio
+import html
+import json
 import logging
+import os
 import re
+import time
+from datetime import datetime, timezone
 
-from aiogram import Bot, Dispatcher, F, Router
+from aiogram import Bot, Dispatcher, Router
 from aiogram.filters import Command
 from aiogram.filters.command import CommandObject
 from aiogram.types import (
+    BufferedInputFile,
     CallbackQuery,
+    FSInputFile,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
     Message,
 )
 from aiogram.fsm.context import FSMContext
 
+import callbacks as cb
 import database as db
-from config import ADMIN_ID
+import export
+import hosting
+import profiler
+import render
+from config import EXPORT_PROGRESS_INTERVAL_S, PROFILER_MAX_SECONDS, REPORTING_CURRENCY
+from database import TransactionFilter
 from i18n import t_for
 from keyboards import get_admin_currency_keyboard
+from money import format_amount, format_totals
 from states import AdminSetCardStates, AdminSupportMessageStates
 
 logger = logging.getLogger(__name__)
 
 router = Router(name="admin")
 
+# Length of the CPU profile started from the admin panel button
+PANEL_PROFILE_SECONDS = min(30, PROFILER_MAX_SECONDS)
+PROFILE_FORMATS = ("collapsed", "speedscope")
+
 def _is_admin(user_id: int) -> bool:
-    return ADMIN_ID is not None and user_id == ADMIN_ID
+    return hosting.is_admin(user_id)
 
 
 def _get_admin_panel_keyboard(user_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text=t_for(user_id, "BTN_VIEW_STATS"), callback_data="admin_stats")],
-            [InlineKeyboardButton(text=t_for(user_id, "BTN_ADD_CARD"), callback_data="admin_setcard")],
-            [InlineKeyboardButton(text=t_for(user_id, "BTN_MANAGE_CARDS"), callback_data="admin_cards")],
-            [InlineKeyboardButton(text=t_for(user_id, "BTN_MANAGE_CURRENCIES"), callback_data="admin_currencies")],
-            [InlineKeyboardButton(text=t_for(user_id, "BTN_MANAGE_SUPPORT"), callback_data="admin_support")],
-            [InlineKeyboardButton(text="⬅️ " + t_for(user_id, "BACK"), callback_data="back_menu")],
+            [InlineKeyboardButton(text=t_for(user_id, "BTN_VIEW_STATS"), callback_data=cb.ADMIN_STATS.pack())],
+            [InlineKeyboardButton(text=t_for(user_id, "BTN_LEADERBOARD"), callback_data=cb.ADMIN_TOP.pack())],
+            [InlineKeyboardButton(text=t_for(user_id, "BTN_ADD_CARD"), callback_data=cb.ADMIN_SETCARD.pack())],
+            [InlineKeyboardButton(text=t_for(user_id, "BTN_MANAGE_CARDS"), callback_data=cb.ADMIN_CARDS.pack())],
+            [InlineKeyboardButton(text=t_for(user_id, "BTN_MANAGE_CURRENCIES"), callback_data=cb.ADMIN_CURRENCIES.pack())],
+            [InlineKeyboardButton(text=t_for(user_id, "BTN_MANAGE_SUPPORT"), callback_data=cb.ADMIN_SUPPORT.pack())],
+            [
+                InlineKeyboardButton(
+                    text=t_for(user_id, "BTN_CPU_PROFILE", seconds=PANEL_PROFILE_SECONDS),
+                    callback_data=cb.ADMIN_PROFILE.pack(),
+                )
+            ],
+            [InlineKeyboardButton(text="⬅️ " + t_for(user_id, "BACK"), callback_data=cb.BACK_MENU.pack())],
         ]
     )
 
@@ -45,47 +71,53 @@ def _card_number_label(details: str) -> str | None:
         return " ".join(groups)
     return None
 
+async def _stats_text(user_id: int) -> str:
+    data, rates = await asyncio.gather(db.get_stats(), db.get_exchange_rates())
+    by_currency = data["raised_by_currency"]
+    # Totals from before per-currency tracking have no breakdown until backfillStats is run
+    if by_currency or not data["total_raised"]:
+        total_raised = format_totals(by_currency, rates)
+    else:
+        total_raised = f"{data['total_raised']:,.2f}"
+    return t_for(user_id, "STATS_TITLE") + "\n\n" + t_for(
+        user_id,
+        "STATS_DETAILS",
+        total_raised=total_raised,
+        total_donors=data["total_donors"],
+        pending_reviews=data["pending_reviews"],
+    )
+
+
 async def _send_manage_cards(message: Message, user_id: int, *, replace: bool = False):
     cards = await db.list_cards()
     if not cards:
         text = t_for(user_id, "ADMIN_NO_CARDS")
         keyboard = InlineKeyboardMarkup(
-            inline_keyboard=[[InlineKeyboardButton(text=t_for(user_id, "BTN_ADD_CARD"), callback_data="admin_setcard")]]
+            inline_keyboard=[[InlineKeyboardButton(text=t_for(user_id, "BTN_ADD_CARD"), callback_data=cb.ADMIN_SETCARD.pack())]]
         )
-        if replace:
-            try:
-                await message.edit_text(text, reply_markup=keyboard)
-                return
-            except Exception:
-                pass
-        await message.answer(text, reply_markup=keyboard)
+        await render.show(message, text, reply_markup=keyboard, edit=replace)
         return
     rows = []
-    for cid, details, is_active, created_at, currency in cards:
-        status = t_for(user_id, "STATUS_ACTIVE") if is_active == 1 else t_for(user_id, "STATUS_INACTIVE")
+    for card in cards:
+        cid, details, is_active = card.card_id, card.details, card.is_active
+        status = t_for(user_id, "STATUS_ACTIVE") if is_active else t_for(user_id, "STATUS_INACTIVE")
         label = _card_number_label(details) or (details if len(details) <= 90 else details[:90] + "...")
-        label = f"[{currency}] {label}"
-        rows.append([InlineKeyboardButton(text=f"{label} • {status}", callback_data="noop")])
+        label = f"[{card.currency}] {label}"
+        rows.append([InlineKeyboardButton(text=f"{label} • {status}", callback_data=cb.NOOP.pack())])
         rows.append(
             [
                 InlineKeyboardButton(
-                    text=(t_for(user_id, "BTN_DEACTIVATE") if is_active == 1 else t_for(user_id, "BTN_ACTIVATE")),
-                    callback_data=f"card_toggle_{cid}",
+                    text=(t_for(user_id, "BTN_DEACTIVATE") if is_active else t_for(user_id, "BTN_ACTIVATE")),
+                    callback_data=cb.CARD_TOGGLE.pack(cid),
                 ),
-                InlineKeyboardButton(text=t_for(user_id, "BTN_DELETE"), callback_data=f"card_delete_{cid}"),
+                InlineKeyboardButton(text=t_for(user_id, "BTN_DELETE"), callback_data=cb.CARD_DELETE.pack(cid)),
             ]
         )
-    rows.append([InlineKeyboardButton(text=t_for(user_id, "BTN_ADD_CARD"), callback_data="admin_setcard")])
-    rows.append([InlineKeyboardButton(text="⬅️ Back", callback_data="back_admin")])
+    rows.append([InlineKeyboardButton(text=t_for(user_id, "BTN_ADD_CARD"), callback_data=cb.ADMIN_SETCARD.pack())])
+    rows.append([InlineKeyboardButton(text="⬅️ Back", callback_data=cb.BACK_ADMIN.pack())])
     text = t_for(user_id, "MANAGE_CARDS_TITLE")
     markup = InlineKeyboardMarkup(inline_keyboard=rows)
-    if replace:
-        try:
-            await message.edit_text(text, parse_mode="HTML", reply_markup=markup)
-            return
-        except Exception:
-            pass
-    await message.answer(text, parse_mode="HTML", reply_markup=markup)
+    await render.show(message, text, parse_mode="HTML", reply_markup=markup, edit=replace)
 
 async def _send_manage_currencies(message: Message, user_id: int, *, replace: bool = False):
     enabled = set(await db.get_enabled_donation_currencies())
@@ -98,23 +130,17 @@ async def _send_manage_currencies(message: Message, user_id: int, *, replace: bo
             [
                 InlineKeyboardButton(
                     text=f"{mark} {code} • {status}",
-                    callback_data=f"admin_toggle_currency_{code}",
+                    callback_data=cb.ADMIN_TOGGLE_CURRENCY.pack(code),
                 )
             ]
         )
-    rows.append([InlineKeyboardButton(text="⬅️ Back", callback_data="back_admin")])
+    rows.append([InlineKeyboardButton(text="⬅️ Back", callback_data=cb.BACK_ADMIN.pack())])
     markup = InlineKeyboardMarkup(inline_keyboard=rows)
     text = t_for(user_id, "MANAGE_CURRENCIES_TITLE")
-    if replace:
-        try:
-            await message.edit_text(text, parse_mode="HTML", reply_markup=markup)
-            return
-        except Exception:
-            pass
-    await message.answer(text, parse_mode="HTML", reply_markup=markup)
+    await render.show(message, text, parse_mode="HTML", reply_markup=markup, edit=replace)
 
 
-@router.callback_query(F.data == "menu_admin")
+@cb.route(cb.MENU_ADMIN)
 async def admin_panel_callback_from_menu(callback: CallbackQuery):
     user_id = callback.from_user.id
     if not _is_admin(user_id):
@@ -122,14 +148,11 @@ async def admin_panel_callback_from_menu(callback: CallbackQuery):
         return
     text = t_for(user_id, "ADMIN_PANEL_TITLE")
     keyboard = _get_admin_panel_keyboard(user_id)
-    try:
-        await callback.message.edit_text(text, reply_markup=keyboard)
-    except Exception:
-        await callback.message.answer(text, reply_markup=keyboard)
+    await render.show(callback.message, text, reply_markup=keyboard)
     await callback.answer()
 
 
-@router.callback_query(F.data == "back_admin")
+@cb.route(cb.BACK_ADMIN)
 async def back_admin_callback(callback: CallbackQuery):
     user_id = callback.from_user.id
     if not _is_admin(user_id):
@@ -137,68 +160,49 @@ async def back_admin_callback(callback: CallbackQuery):
         return
     text = t_for(user_id, "ADMIN_PANEL_TITLE")
     keyboard = _get_admin_panel_keyboard(user_id)
-    try:
-        await callback.message.edit_text(text, reply_markup=keyboard)
-    except Exception:
-        await callback.message.answer(text, reply_markup=keyboard)
+    await render.show(callback.message, text, reply_markup=keyboard)
     await callback.answer()
 
 
-@router.callback_query(F.data.in_(("admin_stats", "admin_setcard", "admin_cards", "admin_currencies", "admin_support")))
-async def admin_panel_callback(callback: CallbackQuery, state: FSMContext):
+@cb.route(cb.ADMIN_STATS, cb.ADMIN_SETCARD, cb.ADMIN_CARDS, cb.ADMIN_CURRENCIES, cb.ADMIN_SUPPORT)
+async def admin_panel_callback(callback: CallbackQuery, state: FSMContext, action: cb.Action):
     user_id = callback.from_user.id
     if not _is_admin(user_id):
         await callback.answer(t_for(user_id, "ALERT_NOT_AUTHORIZED"), show_alert=True)
         return
-    action = callback.data
-    if action == "admin_stats":
-        data = await db.get_stats()
-        text = t_for(user_id, "STATS_TITLE") + "\n\n" + t_for(user_id, "STATS_DETAILS", **data)
+    if action is cb.ADMIN_STATS:
+        text = await _stats_text(user_id)
         keyboard = InlineKeyboardMarkup(
-            inline_keyboard=[[InlineKeyboardButton(text="⬅️ " + t_for(user_id, "BACK"), callback_data="back_admin")]]
+            inline_keyboard=[[InlineKeyboardButton(text="⬅️ " + t_for(user_id, "BACK"), callback_data=cb.BACK_ADMIN.pack())]]
         )
-        try:
-            await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
-        except Exception:
-            await callback.message.answer(text, parse_mode="HTML", reply_markup=keyboard)
-    elif action == "admin_setcard":
+        await render.show(callback.message, text, parse_mode="HTML", reply_markup=keyboard)
+    elif action is cb.ADMIN_SETCARD:
         text = t_for(user_id, "PROMPT_ADD_CARD")
         keyboard = InlineKeyboardMarkup(
-            inline_keyboard=[[InlineKeyboardButton(text="⬅️ " + t_for(user_id, "BACK"), callback_data="back_admin")]]
+            inline_keyboard=[[InlineKeyboardButton(text="⬅️ " + t_for(user_id, "BACK"), callback_data=cb.BACK_ADMIN.pack())]]
         )
-        try:
-            await callback.message.edit_text(text, reply_markup=keyboard)
-        except Exception:
-            await callback.message.answer(text, reply_markup=keyboard)
+        await render.show(callback.message, text, reply_markup=keyboard)
         await state.set_state(AdminSetCardStates.awaiting_card)
-    elif action == "admin_cards":
+    elif action is cb.ADMIN_CARDS:
         await _send_manage_cards(callback.message, user_id, replace=True)
-    elif action == "admin_currencies":
+    elif action is cb.ADMIN_CURRENCIES:
         await _send_manage_currencies(callback.message, user_id, replace=True)
-    elif action == "admin_support":
+    elif action is cb.ADMIN_SUPPORT:
         current = await db.get_support_message() or t_for(user_id, "NO_SUPPORT_MESSAGE")
         text = t_for(user_id, "PROMPT_UPDATE_SUPPORT", current=current)
         keyboard = InlineKeyboardMarkup(
-            inline_keyboard=[[InlineKeyboardButton(text="⬅️ " + t_for(user_id, "BACK"), callback_data="back_admin")]]
+            inline_keyboard=[[InlineKeyboardButton(text="⬅️ " + t_for(user_id, "BACK"), callback_data=cb.BACK_ADMIN.pack())]]
         )
-        try:
-            await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
-        except Exception:
-            await callback.message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+        await render.show(callback.message, text, parse_mode="HTML", reply_markup=keyboard)
         await state.set_state(AdminSupportMessageStates.awaiting_message)
     await callback.answer()
 
-@router.callback_query(F.data.startswith("admin_toggle_currency_"))
-async def admin_toggle_currency_callback(callback: CallbackQuery):
+@cb.route(cb.ADMIN_TOGGLE_CURRENCY)
+async def admin_toggle_currency_callback(callback: CallbackQuery, currency: str):
     user_id = callback.from_user.id
     if not _is_admin(user_id):
         await callback.answer(t_for(user_id, "ALERT_NOT_AUTHORIZED"), show_alert=True)
         return
-    parts = callback.data.split("_")
-    if len(parts) < 4:
-        await callback.answer()
-        return
-    currency = parts[3]
     current = set(await db.get_enabled_donation_currencies())
     new_enabled = currency not in current
     await db.set_donation_currency_enabled(currency, new_enabled)
@@ -210,7 +214,7 @@ async def admin_toggle_currency_callback(callback: CallbackQuery):
 async def set_card_handler(message: Message, command: CommandObject, state: FSMContext):
     user_id = message.from_user.id
     if not _is_admin(user_id):
-        logger.warning(f"Unauthorized access attempt by {user_id}. Expected Admin: {ADMIN_ID}")
+        logger.warning(f"Unauthorized access attempt by {user_id}. Expected Admin: {hosting.current().admin_id}")
         await message.answer(t_for(user_id, "NOT_AUTHORIZED"))
         return
 
@@ -235,14 +239,13 @@ async def admin_receive_card_details(message: Message, state: FSMContext):
     await message.answer(t_for(user_id, "SELECT_CURRENCY"), reply_markup=get_admin_currency_keyboard())
     await state.set_state(AdminSetCardStates.awaiting_currency)
 
-@router.callback_query(F.data.startswith("admin_currency_"))
-async def admin_currency_callback(callback: CallbackQuery, state: FSMContext):
+@cb.route(cb.ADMIN_CURRENCY)
+async def admin_currency_callback(callback: CallbackQuery, state: FSMContext, currency: str):
     user_id = callback.from_user.id
     if not _is_admin(user_id):
         await callback.answer(t_for(user_id, "ALERT_NOT_AUTHORIZED"), show_alert=True)
         return
 
-    currency = callback.data.split("_")[2]
     await state.update_data(pending_card_currency=currency)
     data = await state.get_data()
     details = data.get("pending_card_details")
@@ -250,16 +253,13 @@ async def admin_currency_callback(callback: CallbackQuery, state: FSMContext):
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text=t_for(user_id, "BTN_CONFIRM"), callback_data="confirm_setcard"),
-                InlineKeyboardButton(text=t_for(user_id, "BTN_CANCEL_X"), callback_data="cancel_setcard"),
+                InlineKeyboardButton(text=t_for(user_id, "BTN_CONFIRM"), callback_data=cb.CONFIRM_SETCARD.pack()),
+                InlineKeyboardButton(text=t_for(user_id, "BTN_CANCEL_X"), callback_data=cb.CANCEL_SETCARD.pack()),
             ]
         ]
     )
     text = t_for(user_id, "REVIEW_CARD_DETAILS", details=f"[{currency}] {details}")
-    try:
-        await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
-    except Exception:
-        await callback.message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+    await render.show(callback.message, text, parse_mode="HTML", reply_markup=keyboard)
     await state.set_state(AdminSetCardStates.awaiting_confirm)
     await callback.answer()
 
@@ -274,8 +274,8 @@ async def admin_receive_support_message(message: Message, state: FSMContext):
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text=t_for(user_id, "BTN_CONFIRM"), callback_data="confirm_support"),
-                InlineKeyboardButton(text=t_for(user_id, "BTN_CANCEL_X"), callback_data="cancel_support"),
+                InlineKeyboardButton(text=t_for(user_id, "BTN_CONFIRM"), callback_data=cb.CONFIRM_SUPPORT.pack()),
+                InlineKeyboardButton(text=t_for(user_id, "BTN_CANCEL_X"), callback_data=cb.CANCEL_SUPPORT.pack()),
             ]
         ]
     )
@@ -287,14 +287,13 @@ async def admin_receive_support_message(message: Message, state: FSMContext):
     await state.set_state(AdminSupportMessageStates.awaiting_confirm)
 
 
-@router.callback_query(F.data.in_(("confirm_setcard", "cancel_setcard")))
-async def admin_setcard_confirm_callback(callback: CallbackQuery, state: FSMContext):
+@cb.route(cb.CONFIRM_SETCARD, cb.CANCEL_SETCARD)
+async def admin_setcard_confirm_callback(callback: CallbackQuery, state: FSMContext, action: cb.Action):
     user_id = callback.from_user.id
     if not _is_admin(user_id):
         await callback.answer(t_for(user_id, "ALERT_NOT_AUTHORIZED"), show_alert=True)
         return
-    action = callback.data
-    if action == "confirm_setcard":
+    if action is cb.CONFIRM_SETCARD:
         data = await state.get_data()
         details = data.get("pending_card_details")
         currency = data.get("pending_card_currency", "USD")
@@ -303,24 +302,20 @@ async def admin_setcard_confirm_callback(callback: CallbackQuery, state: FSMCont
         await state.clear()
         await _send_manage_cards(callback.message, user_id, replace=True)
         await callback.answer(t_for(user_id, "ALERT_UPDATED"))
-    elif action == "cancel_setcard":
+    elif action is cb.CANCEL_SETCARD:
         await state.clear()
         text = t_for(user_id, "ADMIN_PANEL_TITLE")
         keyboard = _get_admin_panel_keyboard(user_id)
-        try:
-            await callback.message.edit_text(text, reply_markup=keyboard)
-        except Exception:
-            await callback.message.answer(text, reply_markup=keyboard)
+        await render.show(callback.message, text, reply_markup=keyboard)
         await callback.answer(t_for(user_id, "ALERT_CANCELLED"))
 
-@router.callback_query(F.data.in_(("confirm_support", "cancel_support")))
-async def admin_support_confirm_callback(callback: CallbackQuery, state: FSMContext):
+@cb.route(cb.CONFIRM_SUPPORT, cb.CANCEL_SUPPORT)
+async def admin_support_confirm_callback(callback: CallbackQuery, state: FSMContext, action: cb.Action):
     user_id = callback.from_user.id
     if not _is_admin(user_id):
         await callback.answer(t_for(user_id, "ALERT_NOT_AUTHORIZED"), show_alert=True)
         return
-    action = callback.data
-    if action == "confirm_support":
+    if action is cb.CONFIRM_SUPPORT:
         data = await state.get_data()
         msg_text = data.get("pending_support_message")
         if msg_text:
@@ -328,54 +323,37 @@ async def admin_support_confirm_callback(callback: CallbackQuery, state: FSMCont
         await state.clear()
         text = t_for(user_id, "SUPPORT_UPDATED") + "\n\n" + t_for(user_id, "ADMIN_PANEL_TITLE")
         keyboard = _get_admin_panel_keyboard(user_id)
-        try:
-            await callback.message.edit_text(text, reply_markup=keyboard)
-        except Exception:
-            await callback.message.answer(text, reply_markup=keyboard)
+        await render.show(callback.message, text, reply_markup=keyboard)
         await callback.answer(t_for(user_id, "ALERT_UPDATED"))
-    elif action == "cancel_support":
+    elif action is cb.CANCEL_SUPPORT:
         await state.clear()
         text = t_for(user_id, "ADMIN_PANEL_TITLE")
         keyboard = _get_admin_panel_keyboard(user_id)
-        try:
-            await callback.message.edit_text(text, reply_markup=keyboard)
-        except Exception:
-            await callback.message.answer(text, reply_markup=keyboard)
+        await render.show(callback.message, text, reply_markup=keyboard)
         await callback.answer(t_for(user_id, "ALERT_CANCELLED"))
 
-@router.callback_query(F.data.startswith("card_toggle_"))
-async def card_toggle_callback(callback: CallbackQuery):
+@cb.route(cb.CARD_TOGGLE)
+async def card_toggle_callback(callback: CallbackQuery, card_id: int):
     user_id = callback.from_user.id
     if not _is_admin(user_id):
         await callback.answer(t_for(user_id, "ALERT_NOT_AUTHORIZED"), show_alert=True)
         return
-    try:
-        cid = int(callback.data.split("_")[2])
-    except Exception:
-        await callback.answer()
-        return
     cards = await db.list_cards()
-    found = next((c for c in cards if c[0] == cid), None)
+    found = next((c for c in cards if c.card_id == card_id), None)
     if not found:
         await callback.answer(t_for(user_id, "ALERT_CARD_NOT_FOUND"), show_alert=True)
         return
-    is_active = found[2] == 1
-    await db.set_card_active(cid, not is_active)
+    await db.set_card_active(card_id, not found.is_active)
     await callback.answer(t_for(user_id, "ALERT_UPDATED"))
     await _send_manage_cards(callback.message, user_id, replace=True)
 
-@router.callback_query(F.data.startswith("card_delete_"))
-async def card_delete_callback(callback: CallbackQuery):
+@cb.route(cb.CARD_DELETE)
+async def card_delete_callback(callback: CallbackQuery, card_id: int):
     user_id = callback.from_user.id
     if not _is_admin(user_id):
         await callback.answer(t_for(user_id, "ALERT_NOT_AUTHORIZED"), show_alert=True)
         return
-    try:
-        cid = int(callback.data.split("_")[2])
-    except Exception:
-        await callback.answer()
-        return
-    await db.delete_card(cid)
+    await db.delete_card(card_id)
     await callback.answer(t_for(user_id, "ALERT_DELETED"))
     await _send_manage_cards(callback.message, user_id, replace=True)
 
@@ -384,38 +362,275 @@ async def card_delete_callback(callback: CallbackQuery):
 async def stats_handler(message: Message):
     user_id = message.from_user.id
     if not _is_admin(user_id):
-        logger.warning(f"Unauthorized access attempt by {user_id}. Expected Admin: {ADMIN_ID}")
+        logger.warning(f"Unauthorized access attempt by {user_id}. Expected Admin: {hosting.current().admin_id}")
         await message.answer(t_for(user_id, "NOT_AUTHORIZED"))
         return
 
-    data = await db.get_stats()
-    await message.answer(
-        t_for(user_id, "STATS_TITLE") + "\n\n" +
-        t_for(user_id, "STATS_DETAILS", **data),
-        parse_mode="HTML",
-    )
+    await message.answer(await _stats_text(user_id), parse_mode="HTML")
+
+
+LEADERBOARD_PAGE_SIZE = 10
+
+
+async def _leaderboard_view(user_id: int, currency: str, page: int) -> tuple[str, InlineKeyboardMarkup]:
+    rows, has_more = await db.get_creator_leaderboard_page(currency, page, LEADERBOARD_PAGE_SIZE)
+    lines = [t_for(user_id, "LEADERBOARD_TITLE", currency=currency), ""]
+    if not rows:
+        lines.append(t_for(user_id, "LEADERBOARD_EMPTY"))
+    for rank, (referrer_id, username, first_name, total, count) in enumerate(rows, page * LEADERBOARD_PAGE_SIZE + 1):
+        name = f"@{username}" if username else (first_name or f"ID {referrer_id}")
+        lines.append(f"{rank}. {html.escape(name)} — {format_amount(total, currency)} ({count})")
+
+    currency_row = [
+        InlineKeyboardButton(text=("• " if ccy == currency else "") + ccy, callback_data=cb.ADMIN_TOP.pack(ccy, 0))
+        for ccy in db.SUPPORTED_CURRENCIES
+    ]
+    nav_row = []
+    if page > 0:
+        nav_row.append(InlineKeyboardButton(text="⬅️", callback_data=cb.ADMIN_TOP.pack(currency, page - 1)))
+    if has_more:
+        nav_row.append(InlineKeyboardButton(text="➡️", callback_data=cb.ADMIN_TOP.pack(currency, page + 1)))
+    keyboard = [currency_row] + ([nav_row] if nav_row else [])
+    keyboard.append([InlineKeyboardButton(text="⬅️ " + t_for(user_id, "BACK"), callback_data=cb.BACK_ADMIN.pack())])
+    return "\n".join(lines), InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+@router.message(Command("top"))
+async def leaderboard_handler(message: Message, command: CommandObject):
+    user_id = message.from_user.id
+    if not _is_admin(user_id):
+        logger.warning(f"Unauthorized access attempt by {user_id}. Expected Admin: {hosting.current().admin_id}")
+        await message.answer(t_for(user_id, "NOT_AUTHORIZED"))
+        return
+    currency = (command.args or REPORTING_CURRENCY).strip().upper()
+    if currency not in db.SUPPORTED_CURRENCIES:
+        currency = REPORTING_CURRENCY
+    text, keyboard = await _leaderboard_view(user_id, currency, 0)
+    await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@cb.route(cb.ADMIN_TOP)
+async def leaderboard_callback(callback: CallbackQuery, currency: str = REPORTING_CURRENCY, page: int = 0):
+    user_id = callback.from_user.id
+    if not _is_admin(user_id):
+        await callback.answer(t_for(user_id, "ALERT_NOT_AUTHORIZED"), show_alert=True)
+        return
+    if currency not in db.SUPPORTED_CURRENCIES or page < 0:
+        currency, page = REPORTING_CURRENCY, 0
+    text, keyboard = await _leaderboard_view(user_id, currency, page)
+    await render.show(callback.message, text, parse_mode="HTML", reply_markup=keyboard, fallback=False)
+    await callback.answer()
+
+
+def _rates_text(user_id: int, rates: dict[str, float]) -> str:
+    lines = [t_for(user_id, "RATES_TITLE", base=REPORTING_CURRENCY)]
+    if rates:
+        lines += [f"1 {ccy} = {rate:g} {REPORTING_CURRENCY}" for ccy, rate in sorted(rates.items())]
+    else:
+        lines.append(t_for(user_id, "RATES_EMPTY"))
+    lines.append("")
+    lines.append(t_for(user_id, "RATES_USAGE"))
+    return "\n".join(lines)
+
+
+@router.message(Command("rates"))
+async def rates_handler(message: Message):
+    user_id = message.from_user.id
+    if not _is_admin(user_id):
+        logger.warning(f"Unauthorized access attempt by {user_id}. Expected Admin: {hosting.current().admin_id}")
+        await message.answer(t_for(user_id, "NOT_AUTHORIZED"))
+        return
+    await message.answer(_rates_text(user_id, await db.get_exchange_rates()), parse_mode="HTML")
+
+
+@router.message(Command("setrate"))
+async def set_rate_handler(message: Message, command: CommandObject):
+    user_id = message.from_user.id
+    if not _is_admin(user_id):
+        logger.warning(f"Unauthorized access attempt by {user_id}. Expected Admin: {hosting.current().admin_id}")
+        await message.answer(t_for(user_id, "NOT_AUTHORIZED"))
+        return
+
+    parts = (command.args or "").split()
+    rate: float | None = None
+    try:
+        if len(parts) != 2 or not parts[0].isalpha():
+            raise ValueError
+        if parts[1] != "-":
+            rate = float(parts[1].replace(",", "."))
+            if rate <= 0:
+                raise ValueError
+    except ValueError:
+        await message.answer(t_for(user_id, "RATES_USAGE"), parse_mode="HTML")
+        return
+
+    rates = await db.set_exchange_rate(parts[0].upper(), rate)
+    await message.answer(_rates_text(user_id, rates), parse_mode="HTML")
+
+
+# Exports run as background tasks so the admin's other updates are not queued behind them
+_export_tasks: set[asyncio.Task] = set()
+
+
+async def _run_export(bot: Bot, status_message: Message, user_id: int, fmt: str, filters: TransactionFilter) -> None:
+    last_edit = time.monotonic()
+
+    async def progress(rows: int) -> None:
+        nonlocal last_edit
+        if time.monotonic() - last_edit < EXPORT_PROGRESS_INTERVAL_S:
+            return
+        last_edit = time.monotonic()
+        await render.show(status_message, t_for(user_id, "EXPORT_PROGRESS", rows=rows), fallback=False)
+
+    path = None
+    try:
+        path, rows = await export.export_transactions(filters, fmt, progress)
+        size = os.path.getsize(path)
+        if size > export.MAX_DOCUMENT_BYTES:
+            await render.show(status_message, t_for(user_id, "EXPORT_TOO_LARGE", size=size // (1024 * 1024)), fallback=False)
+            return
+        filename = f"transactions-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.{fmt}.gz"
+        await bot.send_document(
+            status_message.chat.id,
+            FSInputFile(path, filename=filename),
+            caption=t_for(user_id, "EXPORT_DONE", rows=rows),
+        )
+        await status_message.delete()
+    except asyncio.CancelledError:
+        await render.show(status_message, t_for(user_id, "EXPORT_CANCELLED"), fallback=False)
+        raise
+    except Exception as e:
+        logger.error(f"Export failed: {e}")
+        await render.show(status_message, t_for(user_id, "EXPORT_FAILED"), fallback=False)
+    finally:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+@router.message(Command("export"))
+async def export_handler(message: Message, command: CommandObject, bot: Bot):
+    user_id = message.from_user.id
+    if not _is_admin(user_id):
+        logger.warning(f"Unauthorized access attempt by {user_id}. Expected Admin: {hosting.current().admin_id}")
+        await message.answer(t_for(user_id, "NOT_AUTHORIZED"))
+        return
+    try:
+        fmt, filters = export.parse_args(command.args)
+    except ValueError:
+        await message.answer(t_for(user_id, "EXPORT_USAGE"), parse_mode="HTML")
+        return
+    if _export_tasks:
+        await message.answer(t_for(user_id, "EXPORT_BUSY"))
+        return
+
+    status_message = await message.answer(t_for(user_id, "EXPORT_STARTED"))
+    task = asyncio.create_task(_run_export(bot, status_message, user_id, fmt, filters))
+    _export_tasks.add(task)
+    task.add_done_callback(_export_tasks.discard)
+
+
+# Like exports, profiling sessions run in the background; profiler.py allows one at a time
+_profile_tasks: set[asyncio.Task] = set()
+
+
+def _parse_profile_args(args: str | None) -> tuple[int, str]:
+    seconds, fmt = PANEL_PROFILE_SECONDS, "collapsed"
+    for token in (args or "").split():
+        if token.isdigit() and 1 <= int(token) <= PROFILER_MAX_SECONDS:
+            seconds = int(token)
+        elif token.lower() in PROFILE_FORMATS:
+            fmt = token.lower()
+        else:
+            raise ValueError(token)
+    return seconds, fmt
+
+
+async def _run_profile(bot: Bot, status_message: Message, user_id: int, seconds: int, fmt: str) -> None:
+    try:
+        result = await profiler.profile(seconds)
+        stamp = f"{datetime.now(timezone.utc):%Y%m%d-%H%M%S}"
+        if fmt == "speedscope":
+            data = json.dumps(result.speedscope(f"{hosting.current().name or 'bot'} {stamp}")).encode()
+            filename = f"cpu-profile-{stamp}.speedscope.json"
+        else:
+            data = result.collapsed().encode()
+            filename = f"cpu-profile-{stamp}.collapsed.txt"
+        await bot.send_document(
+            status_message.chat.id,
+            BufferedInputFile(data, filename=filename),
+            caption=t_for(user_id, "CPU_PROFILE_DONE", samples=result.ticks, seconds=result.duration_s),
+        )
+        await status_message.delete()
+    except profiler.ProfilerBusy:
+        await render.show(status_message, t_for(user_id, "CPU_PROFILE_BUSY"), fallback=False)
+    except asyncio.CancelledError:
+        await render.show(status_message, t_for(user_id, "CPU_PROFILE_CANCELLED"), fallback=False)
+        raise
+    except Exception as e:
+        logger.error(f"CPU profiling failed: {e}")
+        await render.show(status_message, t_for(user_id, "CPU_PROFILE_FAILED"), fallback=False)
+
+
+async def _start_profile(message: Message, bot: Bot, user_id: int, seconds: int, fmt: str) -> None:
+    if profiler.is_running() or _profile_tasks:
+        await message.answer(t_for(user_id, "CPU_PROFILE_BUSY"))
+        return
+    status_message = await message.answer(t_for(user_id, "CPU_PROFILE_STARTED", seconds=seconds))
+    task = asyncio.create_task(_run_profile(bot, status_message, user_id, seconds, fmt))
+    _profile_tasks.add(task)
+    task.add_done_callback(_profile_tasks.discard)
+
+
+@router.message(Command("cpuprofile"))
+async def cpu_profile_handler(message: Message, command: CommandObject, bot: Bot):
+    user_id = message.from_user.id
+    if not _is_admin(user_id):
+        logger.warning(f"Unauthorized access attempt by {user_id}. Expected Admin: {hosting.current().admin_id}")
+        await message.answer(t_for(user_id, "NOT_AUTHORIZED"))
+        return
+    try:
+        seconds, fmt = _parse_profile_args(command.args)
+    except ValueError:
+        await message.answer(t_for(user_id, "CPU_PROFILE_USAGE", max_seconds=PROFILER_MAX_SECONDS), parse_mode="HTML")
+        return
+    await _start_profile(message, bot, user_id, seconds, fmt)
+
+
+@cb.route(cb.ADMIN_PROFILE)
+async def admin_profile_callback(callback: CallbackQuery, bot: Bot):
+    user_id = callback.from_user.id
+    if not _is_admin(user_id):
+        await callback.answer(t_for(user_id, "ALERT_NOT_AUTHORIZED"), show_alert=True)
+        return
+    await _start_profile(callback.message, bot, user_id, PANEL_PROFILE_SECONDS, "collapsed")
+    await callback.answer()
+
+
+async def stop_background_tasks() -> None:
+    """Cancel running exports and profiles; shutdown calls this before closing clients."""
+    tasks = _export_tasks | _profile_tasks
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
 
 
-@router.callback_query(F.data.startswith(("approve_", "reject_")))
-async def admin_decision_handler(callback: CallbackQuery, bot: Bot):
+@cb.route(cb.APPROVE, cb.REJECT)
+async def admin_decision_handler(callback: CallbackQuery, bot: Bot, action: cb.Action, tx_id: int):
     reviewer_id = callback.from_user.id
-    
-    action, tx_id = callback.data.split("_")
-    tx_id = int(tx_id)
 
     transaction = await db.get_transaction(tx_id)
     if not transaction:
         await callback.answer(t_for(reviewer_id, "ALERT_TRANSACTION_NOT_FOUND"))
         return
 
-    user_id = transaction[1]
-    amount = transaction[2]
-    recipient_id = transaction[7]
+    user_id = transaction.user_id
+    amount = transaction.amount
+    recipient_id = transaction.referrer_id
     if recipient_id is None or int(recipient_id) != reviewer_id:
         await callback.answer(t_for(reviewer_id, "ALERT_NOT_AUTHORIZED"), show_alert=True)
         return
 
-    if action == "approve":
+    if action is cb.APPROVE:
         await db.update_transaction_status(tx_id, "approved")
         await callback.message.edit_caption(
             caption=callback.message.caption + "\n\n" + t_for(reviewer_id, "APPROVED_LABEL"),
@@ -432,7 +647,7 @@ async def admin_decision_handler(callback: CallbackQuery, bot: Bot):
         except Exception as e:
             logger.error(f"Failed to notify user {user_id}: {e}")
 
-    elif action == "reject":
+    elif action is cb.REJECT:
         await db.update_transaction_status(tx_id, "rejected")
         await callback.message.edit_caption(
             caption=callback.message.caption + "\n\n" + t_for(reviewer_id, "REJECTED_LABEL"),
@@ -453,4 +668,4 @@ async def admin_decision_handler(callback: CallbackQuery, bot: Bot):
 
 
 def register_admin_handlers(dp: Dispatcher):
-    dp.include_router(router)
+    dp.include_router(hosting.clone_router(router))
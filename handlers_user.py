@@ -1,8 +1,9 @@
+import asyncio
 import logging
 import html
+import uuid
 
 from aiogram import Bot, Dispatcher, F, Router
-from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import CommandStart
 from aiogram.filters.command import CommandObject
 from aiogram.types import (
@@ -17,17 +18,22 @@ from aiogram.types import (
 )
 from aiogram.fsm.context import FSMContext
 
+import callbacks as cb
 import database as db
-from config import ADMIN_ID
+import hosting
+import receipts
+import render
+from config import RECEIPT_HASH_TIMEOUT_S
 from i18n import (
     LANGS,
     TRANSLATIONS,
-    fetch_user_lang,
     get_user_lang,
+    is_lang_cached,
     set_cached_user_lang,
     t_for,
 )
 from keyboards import get_cancel_keyboard, get_currency_keyboard, get_language_keyboard, get_main_menu
+from money import format_amount, format_totals
 from states import DonateStates
 
 logger = logging.getLogger(__name__)
@@ -35,25 +41,13 @@ logger = logging.getLogger(__name__)
 router = Router(name="user")
 
 
-async def safe_edit_text(message: Message, text: str, **kwargs) -> bool:
-    """Safely edit message text, handling 'message is not modified' gracefully.
-    
-    Returns True if edit was successful or message was unchanged.
-    Returns False if edit failed for other reasons (caller should send new message).
-    """
-    try:
-        await message.edit_text(text, **kwargs)
-        return True
-    except TelegramBadRequest as e:
-        if "message is not modified" in str(e):
-            return True  # Content is the same, no action needed
-        return False  # Other error, caller should handle
-    except Exception:
-        return False
+def _is_admin(user_id: int) -> bool:
+    return hosting.is_admin(user_id)
 
 
-def _is_admin(user_id: int) -> bool:
-    return ADMIN_ID is not None and user_id == ADMIN_ID
+def _new_flow_id() -> str:
+    """Identifier for one donation flow; part of the transaction idempotency key."""
+    return uuid.uuid4().hex
 
 
 def _parse_referrer_id(args: str, prefix: str, self_user_id: int) -> int | None:
@@ -115,43 +109,39 @@ async def _start_donation(
 ) -> None:
     if referrer_id is None:
         text = t_for(user_id, "REFERRAL_REQUIRED")
-        if edit:
+        await render.show(message, text, edit=edit)
+        return
+
+    # The key is stable for one donation flow, so a double-tapped currency button or
+    # a redelivered update returns the same transaction and card instead of new ones.
+    data = await state.get_data()
+    flow_id = data.get("flow_id") or _new_flow_id()
+    idempotency_key = f"{user_id}:{flow_id}:{currency}:{amount:g}"
+    # One transaction on SQLite, so no donation is left without its card
+    async with db.transaction():
+        transaction_id = await db.create_transaction(
+            user_id, amount, referrer_id, currency, idempotency_key=idempotency_key
+        )
+        card_info = await db.get_next_active_card(currency, transaction_id) if transaction_id else None
+        if transaction_id and not card_info:
             try:
-                await message.edit_text(text)
+                await db.delete_transaction(transaction_id)
             except Exception:
-                await message.answer(text)
-        else:
-            await message.answer(text)
+                pass
+    if not transaction_id:
+        text = t_for(user_id, "TRANSACTION_FAILED")
+        await render.show(message, text, edit=edit)
         return
 
-    # Check for active card BEFORE creating transaction
-    card_info = await db.get_next_active_card(currency)
     if not card_info:
         await state.clear()
         text = t_for(user_id, "NO_CARD_FOR_CURRENCY", currency=currency)
         keyboard = get_main_menu(get_user_lang(user_id), is_admin=_is_admin(user_id))
-        if edit:
-            try:
-                await message.edit_text(text, reply_markup=keyboard)
-            except Exception:
-                await message.answer(text, reply_markup=keyboard)
-        else:
-            await message.answer(text, reply_markup=keyboard)
-        return
-
-    transaction_id = await db.create_transaction(user_id, amount, referrer_id, currency)
-    if not transaction_id:
-        text = t_for(user_id, "TRANSACTION_FAILED")
-        if edit:
-            try:
-                await message.edit_text(text)
-            except Exception:
-                await message.answer(text)
-        else:
-            await message.answer(text)
+        await render.show(message, text, reply_markup=keyboard, edit=edit)
         return
 
     await state.update_data(
+        flow_id=flow_id,
         current_transaction_id=transaction_id,
         donation_amount=amount,
         currency=currency,
@@ -161,11 +151,8 @@ async def _start_donation(
 
     lang = get_user_lang(user_id)
 
-    currency_symbols = {"USD": "$", "UAH": "₴", "RUB": "₽"}
-    symbol = currency_symbols.get(currency, currency)
-    
     referrer_text = t_for(user_id, "REFERRED_BY_LABEL") if referrer_id else ""
-    formatted_amount = f"{symbol} {amount:,.2f}"
+    formatted_amount = format_amount(amount, currency)
     
     text = (
         t_for(user_id, "DONATION_INIT_HEADER", amount=formatted_amount, referrer_text=referrer_text) + "\n\n" +
@@ -176,13 +163,7 @@ async def _start_donation(
     )
     keyboard = get_cancel_keyboard(lang)
     
-    if edit:
-        try:
-            await message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
-        except Exception:
-            await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
-    else:
-        await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+    await render.show(message, text, parse_mode="HTML", reply_markup=keyboard, edit=edit)
     
     await state.set_state(DonateStates.awaiting_proof)
 
@@ -192,13 +173,7 @@ async def _send_main_menu(message: Message, user_id: int, first_name: str, *, ed
     text = t_for(user_id, "WELCOME", first_name=first_name)
     keyboard = get_main_menu(lang, is_admin=_is_admin(user_id))
     
-    if edit:
-        try:
-            await message.edit_text(text, reply_markup=keyboard)
-        except Exception:
-            await message.answer(text, reply_markup=keyboard)
-    else:
-        await message.answer(text, reply_markup=keyboard)
+    await render.show(message, text, reply_markup=keyboard, edit=edit)
 
 
 async def _send_profile(message: Message, bot: Bot, user_id: int, full_name: str, username: str | None, referrer_id: int | None, *, edit: bool = False) -> None:
@@ -207,8 +182,8 @@ async def _send_profile(message: Message, bot: Bot, user_id: int, full_name: str
 
     if referrer_id and referrer_id != user_id:
         ref = await db.get_user(referrer_id)
-        ref_username = ref[1] if ref else None
-        ref_first_name = ref[2] if ref else "Member"
+        ref_username = ref.username if ref else None
+        ref_first_name = ref.first_name if ref else "Member"
         lang = get_user_lang(user_id)
         text = (
             f"{TRANSLATIONS[lang]['MEMBER_PROFILE_TITLE']}\n\n"
@@ -221,61 +196,69 @@ async def _send_profile(message: Message, bot: Bot, user_id: int, full_name: str
                 [
                     InlineKeyboardButton(
                         text=TRANSLATIONS[lang]["DONATE_BUTTON"],
-                        callback_data=f"donate_to_{referrer_id}",
+                        callback_data=cb.DONATE_TO.pack(referrer_id),
                     )
                 ],
-                [InlineKeyboardButton(text="⬅️ " + TRANSLATIONS[lang].get("BACK", "Back"), callback_data="back_menu")]
+                [InlineKeyboardButton(text="⬅️ " + TRANSLATIONS[lang].get("BACK", "Back"), callback_data=cb.BACK_MENU.pack())]
             ]
         )
-        if edit:
-            try:
-                await message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
-            except Exception:
-                await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
-        else:
-            await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+        await render.show(message, text, parse_mode="HTML", reply_markup=keyboard, edit=edit)
         return
 
-    total_donated = await db.get_user_total_donated(user_id)
+    donated, incoming, rates = await asyncio.gather(
+        db.get_user_donated_by_currency(user_id), db.get_creator_incoming(user_id), db.get_exchange_rates()
+    )
     lang = get_user_lang(user_id)
+    received = ""
+    if incoming.approved_count or incoming.pending_count:
+        received = (
+            f"{TRANSLATIONS[lang]['PROFILE_RECEIVED']}: 💝 {format_totals(incoming.approved, rates)} "
+            f"({incoming.approved_count})\n"
+        )
+    if incoming.pending_count:
+        received += (
+            f"{TRANSLATIONS[lang]['PROFILE_PENDING']}: ⏳ {format_totals(incoming.pending, rates)} "
+            f"({incoming.pending_count})\n"
+        )
     text = (
         f"{TRANSLATIONS[lang]['PROFILE_TITLE']}\n\n"
         f"{TRANSLATIONS[lang]['PROFILE_NAME']}: {full_name}\n"
         f"{TRANSLATIONS[lang]['PROFILE_USERNAME']}: @{username or 'N/A'}\n"
-        f"{TRANSLATIONS[lang]['PROFILE_TOTAL_DONATED']}: 💰 {total_donated:,.2f}\n\n"
+        f"{TRANSLATIONS[lang]['PROFILE_TOTAL_DONATED']}: 💰 {format_totals(donated, rates)}\n"
+        f"{received}\n"
         f"{TRANSLATIONS[lang]['YOUR_PROFILE_LINK_TITLE']}\n"
         f"<code>https://t.me/{bot_username}?start={user_id}</code>\n\n"
         f"{TRANSLATIONS[lang]['SHARE_PROFILE_LINK']}"
     )
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="⬅️ " + TRANSLATIONS[lang].get("BACK", "Back"), callback_data="back_menu")]
+            [InlineKeyboardButton(text="⬅️ " + TRANSLATIONS[lang].get("BACK", "Back"), callback_data=cb.BACK_MENU.pack())]
         ]
     )
-    if edit:
-        try:
-            await message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
-        except Exception:
-            await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
-    else:
-        await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+    await render.show(message, text, parse_mode="HTML", reply_markup=keyboard, edit=edit)
 
 
 @router.message(CommandStart())
 async def start_handler(message: Message, command: CommandObject, state: FSMContext, bot: Bot):
     user = message.from_user
-    await db.add_user(user.id, user.username, user.first_name)
-    
+
+    # Known users (exist and picked a language) need no backend call here;
+    # otherwise a single users:ensure creates the row and returns its state.
+    if db.is_known_user(user.id) and is_lang_cached(user.id):
+        is_new_user = False
+    else:
+        _, language, preferred_referrer = await db.ensure_user(user.id, user.username, user.first_name)
+        set_cached_user_lang(user.id, language or "en")
+        is_new_user = language is None
+        if preferred_referrer is not None:
+            await state.update_data(preferred_referrer_id=preferred_referrer)
+
     # Clean up any legacy reply keyboards
     try:
         msg = await message.answer("...", reply_markup=ReplyKeyboardRemove())
         await msg.delete()
     except Exception:
         pass
-    
-    # Fetch user language - returns None if new user
-    user_lang = await fetch_user_lang(user.id)
-    is_new_user = user_lang == "en" and await db.get_user_language(user.id) is None
 
     args = command.args or ""
     
@@ -293,7 +276,7 @@ async def start_handler(message: Message, command: CommandObject, state: FSMCont
         if parsed:
             amount, referrer_id = parsed
             await db.set_user_preferred_referrer(user.id, referrer_id)
-            await state.update_data(donation_amount=amount, referrer_id=referrer_id)
+            await state.update_data(donation_amount=amount, referrer_id=referrer_id, flow_id=_new_flow_id())
             enabled = await db.get_enabled_donation_currencies()
             currencies_with_cards = set(await db.get_currencies_with_active_cards())
             available = [c for c in enabled if c in currencies_with_cards]
@@ -320,7 +303,7 @@ async def start_handler(message: Message, command: CommandObject, state: FSMCont
 
 # ===== MAIN MENU CALLBACKS =====
 
-@router.callback_query(F.data == "menu_history")
+@cb.route(cb.MENU_HISTORY)
 async def history_callback(callback: CallbackQuery):
     user_id = callback.from_user.id
     history = await db.get_user_history(user_id)
@@ -340,16 +323,13 @@ async def history_callback(callback: CallbackQuery):
             text += f"🆔 #{tx[0]} | 💰 {tx[1]} | {status_emoji}\n📅 {tx[3]}\n\n"
 
     keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[[InlineKeyboardButton(text="⬅️ " + TRANSLATIONS[lang].get("BACK", "Back"), callback_data="back_menu")]]
+        inline_keyboard=[[InlineKeyboardButton(text="⬅️ " + TRANSLATIONS[lang].get("BACK", "Back"), callback_data=cb.BACK_MENU.pack())]]
     )
-    try:
-        await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
-    except Exception:
-        await callback.message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+    await render.show(callback.message, text, parse_mode="HTML", reply_markup=keyboard)
     await callback.answer()
 
 
-@router.callback_query(F.data == "menu_profile")
+@cb.route(cb.MENU_PROFILE)
 async def profile_callback(callback: CallbackQuery, state: FSMContext, bot: Bot):
     user = callback.from_user
     data = await state.get_data()
@@ -358,27 +338,24 @@ async def profile_callback(callback: CallbackQuery, state: FSMContext, bot: Bot)
     await callback.answer()
 
 
-@router.callback_query(F.data == "menu_support")
+@cb.route(cb.MENU_SUPPORT)
 async def support_callback(callback: CallbackQuery):
     user_id = callback.from_user.id
     lang = get_user_lang(user_id)
     custom = await db.get_support_message()
     text = custom or t_for(user_id, "SUPPORT_MESSAGE")
     keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[[InlineKeyboardButton(text="⬅️ " + TRANSLATIONS[lang].get("BACK", "Back"), callback_data="back_menu")]]
+        inline_keyboard=[[InlineKeyboardButton(text="⬅️ " + TRANSLATIONS[lang].get("BACK", "Back"), callback_data=cb.BACK_MENU.pack())]]
     )
-    try:
-        await callback.message.edit_text(text, reply_markup=keyboard)
-    except Exception:
-        await callback.message.answer(text, reply_markup=keyboard)
+    await render.show(callback.message, text, reply_markup=keyboard)
     await callback.answer()
 
 
-@router.callback_query(F.data == "menu_donate")
+@cb.route(cb.MENU_DONATE)
 async def donate_callback(callback: CallbackQuery, state: FSMContext):
     user_id = callback.from_user.id
     data = await state.get_data()
-    referrer_id = data.get("referrer_id")
+    referrer_id = data.get("referrer_id") or data.get("preferred_referrer_id")
     if not referrer_id:
         referrer_id = await db.get_user_preferred_referrer(user_id)
     
@@ -386,39 +363,37 @@ async def donate_callback(callback: CallbackQuery, state: FSMContext):
     
     if referrer_id:
         ref = await db.get_user(referrer_id)
-        ref_first_name = ref[2] if ref else "Member"
+        ref_first_name = ref.first_name if ref else "Member"
         keyboard = InlineKeyboardMarkup(
             inline_keyboard=[
                 [
                     InlineKeyboardButton(
                         text=TRANSLATIONS[lang]["DONATE_TO_MEMBER_NAME"].format(name=ref_first_name),
-                        callback_data=f"donate_to_{referrer_id}",
+                        callback_data=cb.DONATE_TO.pack(referrer_id),
                     )
                 ],
-                [InlineKeyboardButton(text="⬅️ " + TRANSLATIONS[lang].get("BACK", "Back"), callback_data="back_menu")]
+                [InlineKeyboardButton(text="⬅️ " + TRANSLATIONS[lang].get("BACK", "Back"), callback_data=cb.BACK_MENU.pack())]
             ]
         )
         text = TRANSLATIONS[lang]["ASK_RECIPIENT"]
-        if not await safe_edit_text(callback.message, text, reply_markup=keyboard):
-            await callback.message.answer(text, reply_markup=keyboard)
+        await render.show(callback.message, text, reply_markup=keyboard)
         await callback.answer()
         return
     
     text = t_for(user_id, "REFERRAL_REQUIRED")
     keyboard = get_main_menu(lang, is_admin=_is_admin(user_id))
-    if not await safe_edit_text(callback.message, text, reply_markup=keyboard):
-        await callback.message.answer(text, reply_markup=keyboard)
+    await render.show(callback.message, text, reply_markup=keyboard)
     await callback.answer()
 
 
-@router.callback_query(F.data == "back_menu")
+@cb.route(cb.BACK_MENU)
 async def back_menu_callback(callback: CallbackQuery):
     user = callback.from_user
     await _send_main_menu(callback.message, user.id, user.first_name, edit=True)
     await callback.answer()
 
 
-@router.callback_query(F.data == "cancel")
+@cb.route(cb.CANCEL)
 async def cancel_callback(callback: CallbackQuery, state: FSMContext):
     user_id = callback.from_user.id
     data = await state.get_data()
@@ -433,34 +408,23 @@ async def cancel_callback(callback: CallbackQuery, state: FSMContext):
     lang = get_user_lang(user_id)
     text = t_for(user_id, "DONATION_CANCELLED")
     keyboard = get_main_menu(lang, is_admin=_is_admin(user_id))
-    try:
-        await callback.message.edit_text(text, reply_markup=keyboard)
-    except Exception:
-        await callback.message.answer(text, reply_markup=keyboard)
+    await render.show(callback.message, text, reply_markup=keyboard)
     await callback.answer()
 
 
 # ===== DONATION FLOW CALLBACKS =====
 
-@router.callback_query(F.data.startswith("donate_to_"))
-async def donate_to_referrer_callback(callback: CallbackQuery, state: FSMContext):
-    payload = callback.data
-    try:
-        ref_id = int(payload.split("_")[2])
-    except Exception:
-        await callback.answer()
-        return
+@cb.route(cb.DONATE_TO)
+async def donate_to_referrer_callback(callback: CallbackQuery, state: FSMContext, referrer_id: int):
+    ref_id = referrer_id
     if ref_id == callback.from_user.id:
         ref_id = None
     if ref_id is None:
         text = t_for(callback.from_user.id, "REFERRAL_REQUIRED")
-        try:
-            await callback.message.edit_text(text)
-        except Exception:
-            await callback.message.answer(text)
+        await render.show(callback.message, text)
         await callback.answer()
         return
-    await state.update_data(referrer_id=ref_id)
+    await state.update_data(referrer_id=ref_id, flow_id=_new_flow_id())
     await db.set_user_preferred_referrer(callback.from_user.id, ref_id)
     enabled = await db.get_enabled_donation_currencies()
     currencies_with_cards = set(await db.get_currencies_with_active_cards())
@@ -469,25 +433,18 @@ async def donate_to_referrer_callback(callback: CallbackQuery, state: FSMContext
         await state.clear()
         text = t_for(callback.from_user.id, "NO_CURRENCIES_ENABLED")
         keyboard = get_main_menu(get_user_lang(callback.from_user.id), is_admin=_is_admin(callback.from_user.id))
-        try:
-            await callback.message.edit_text(text, reply_markup=keyboard)
-        except Exception:
-            await callback.message.answer(text, reply_markup=keyboard)
+        await render.show(callback.message, text, reply_markup=keyboard)
         await callback.answer()
         return
     text = t_for(callback.from_user.id, "SELECT_CURRENCY")
     keyboard = await get_currency_keyboard(enabled)
-    try:
-        await callback.message.edit_text(text, reply_markup=keyboard)
-    except Exception:
-        await callback.message.answer(text, reply_markup=keyboard)
+    await render.show(callback.message, text, reply_markup=keyboard)
     await state.set_state(DonateStates.awaiting_currency)
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("currency_"))
-async def currency_selected_callback(callback: CallbackQuery, state: FSMContext):
-    currency = callback.data.split("_")[1]
+@cb.route(cb.CURRENCY)
+async def currency_selected_callback(callback: CallbackQuery, state: FSMContext, currency: str):
     enabled = await db.get_enabled_donation_currencies()
     enabled_set = set(enabled)
     if currency not in enabled_set:
@@ -495,16 +452,10 @@ async def currency_selected_callback(callback: CallbackQuery, state: FSMContext)
             await state.clear()
             text = t_for(callback.from_user.id, "NO_CURRENCIES_ENABLED")
             keyboard = get_main_menu(get_user_lang(callback.from_user.id), is_admin=_is_admin(callback.from_user.id))
-            try:
-                await callback.message.edit_text(text, reply_markup=keyboard)
-            except Exception:
-                await callback.message.answer(text, reply_markup=keyboard)
+            await render.show(callback.message, text, reply_markup=keyboard)
             await callback.answer(t_for(callback.from_user.id, "ALERT_CURRENCY_DISABLED"), show_alert=True)
             return
-        try:
-            await callback.message.edit_reply_markup(reply_markup=await get_currency_keyboard(enabled))
-        except Exception:
-            pass
+        await render.show_markup(callback.message, await get_currency_keyboard(enabled))
         await callback.answer(t_for(callback.from_user.id, "ALERT_CURRENCY_DISABLED"), show_alert=True)
         return
     await state.update_data(currency=currency)
@@ -521,19 +472,14 @@ async def currency_selected_callback(callback: CallbackQuery, state: FSMContext)
         # Need to ask for amount
         text = t_for(callback.from_user.id, "ASK_AMOUNT")
         keyboard = get_cancel_keyboard(get_user_lang(callback.from_user.id))
-        try:
-            await callback.message.edit_text(text, reply_markup=keyboard)
-        except Exception:
-            await callback.message.answer(text, reply_markup=keyboard)
+        await render.show(callback.message, text, reply_markup=keyboard)
         await state.set_state(DonateStates.awaiting_amount)
     
     await callback.answer()
 
 
-@router.callback_query(F.data.in_(("lang_en", "lang_ru", "lang_uk")))
-async def language_selected_callback(callback: CallbackQuery, state: FSMContext, bot: Bot):
-    data_str = callback.data
-    lang = data_str.split("_")[1]
+@cb.route(cb.LANG)
+async def language_selected_callback(callback: CallbackQuery, state: FSMContext, bot: Bot, lang: str):
     user_id = callback.from_user.id
     if lang not in LANGS:
         await callback.answer()
@@ -559,12 +505,9 @@ async def language_selected_callback(callback: CallbackQuery, state: FSMContext,
             await db.set_user_preferred_referrer(user_id, referrer_id)
             if referrer_id is None:
                 text = t_for(user_id, "REFERRAL_REQUIRED")
-                try:
-                    await callback.message.edit_text(text)
-                except Exception:
-                    await callback.message.answer(text)
+                await render.show(callback.message, text)
             else:
-                await state.update_data(donation_amount=amount, referrer_id=referrer_id)
+                await state.update_data(donation_amount=amount, referrer_id=referrer_id, flow_id=_new_flow_id())
                 enabled = await db.get_enabled_donation_currencies()
                 currencies_with_cards = set(await db.get_currencies_with_active_cards())
                 available = [c for c in enabled if c in currencies_with_cards]
@@ -572,18 +515,12 @@ async def language_selected_callback(callback: CallbackQuery, state: FSMContext,
                     await state.clear()
                     text = t_for(user_id, "NO_CURRENCIES_ENABLED")
                     keyboard = get_main_menu(get_user_lang(user_id), is_admin=_is_admin(user_id))
-                    try:
-                        await callback.message.edit_text(text, reply_markup=keyboard)
-                    except Exception:
-                        await callback.message.answer(text, reply_markup=keyboard)
+                    await render.show(callback.message, text, reply_markup=keyboard)
                     await callback.answer("OK")
                     return
                 text = t_for(user_id, "SELECT_CURRENCY")
                 keyboard = await get_currency_keyboard(enabled)
-                try:
-                    await callback.message.edit_text(text, reply_markup=keyboard)
-                except Exception:
-                    await callback.message.answer(text, reply_markup=keyboard)
+                await render.show(callback.message, text, reply_markup=keyboard)
                 await state.set_state(DonateStates.awaiting_currency)
         except Exception:
             await _send_main_menu(callback.message, user_id, callback.from_user.first_name, edit=True)
@@ -597,13 +534,12 @@ async def language_selected_callback(callback: CallbackQuery, state: FSMContext,
     await callback.answer("OK")
 
 
-@router.callback_query(F.data.in_(("genlink_custom", "genlink_profile")))
-async def generate_link_callback(callback: CallbackQuery, bot: Bot):
-    action = callback.data.split("_")[1]
+@cb.route(cb.GENLINK_CUSTOM, cb.GENLINK_PROFILE)
+async def generate_link_callback(callback: CallbackQuery, bot: Bot, action: cb.Action):
     bot_info = await bot.get_me()
     bot_username = bot_info.username
 
-    if action == "custom":
+    if action is cb.GENLINK_CUSTOM:
         await callback.message.answer(
             "To generate a custom link, use this format:\n"
             f"<code>https://t.me/{bot_username}?start=donate_AMOUNT_{callback.from_user.id}</code>\n\n"
@@ -612,26 +548,12 @@ async def generate_link_callback(callback: CallbackQuery, bot: Bot):
         )
         await callback.answer()
         return
-    if action == "profile":
-        link = f"https://t.me/{bot_username}?start={callback.from_user.id}"
-        await callback.message.answer(
-            "🔗 <b>Your Profile Link</b>\n\n"
-            f"<code>{link}</code>\n\n"
-            "Share this to open your profile in the bot.\n"
-            "Donations started after opening via this link will credit you as referrer.",
-            parse_mode="HTML",
-        )
-        await callback.answer()
-        return
-
-    amount = action
-    link = f"https://t.me/{bot_username}?start=donate_{amount}_{callback.from_user.id}"
-
+    link = f"https://t.me/{bot_username}?start={callback.from_user.id}"
     await callback.message.answer(
-        f"🔗 <b>Donation Link for ${amount}</b>\n\n"
+        "🔗 <b>Your Profile Link</b>\n\n"
         f"<code>{link}</code>\n\n"
-        "Share this link! When clicked, it will start a donation for this amount,\n"
-        "and you will be credited as the referrer.",
+        "Share this to open your profile in the bot.\n"
+        "Donations started after opening via this link will credit you as referrer.",
         parse_mode="HTML",
     )
     await callback.answer()
@@ -658,6 +580,16 @@ async def receive_amount_handler(message: Message, state: FSMContext):
     await _start_donation(message, state, user_id, amount, referrer_id, currency)
 
 
+async def _find_duplicate_receipts(bot: Bot, file_id: str, transaction_id: int, user_id: int) -> list[tuple[int, int, int]]:
+    try:
+        return await asyncio.wait_for(
+            receipts.check_receipt(bot, file_id, transaction_id, user_id), RECEIPT_HASH_TIMEOUT_S
+        )
+    except Exception as e:
+        logger.warning(f"Duplicate receipt check failed for transaction {transaction_id}: {e!r}")
+        return []
+
+
 @router.message(DonateStates.awaiting_proof, F.photo)
 async def receive_proof_handler(message: Message, state: FSMContext, bot: Bot):
     if not message.photo:
@@ -684,6 +616,12 @@ async def receive_proof_handler(message: Message, state: FSMContext, bot: Bot):
         return
 
     await db.update_transaction_proof(transaction_id, file_id)
+    # Download and hash in the background while the claim details are fetched
+    duplicate_check = (
+        asyncio.create_task(_find_duplicate_receipts(bot, file_id, transaction_id, user.id))
+        if receipts.enabled()
+        else None
+    )
 
     try:
             tx_details = await db.get_transaction(transaction_id)
@@ -692,9 +630,9 @@ async def receive_proof_handler(message: Message, state: FSMContext, bot: Bot):
                 await state.clear()
                 return
 
-            tx_amount = tx_details[2]
-            tx_currency = tx_details[3]
-            recipient_id = tx_details[7] if len(tx_details) > 7 else None
+            tx_amount = tx_details.amount
+            tx_currency = tx_details.currency
+            recipient_id = tx_details.referrer_id
             if recipient_id is None:
                 recipient_id = data.get("recipient_id") or data.get("referrer_id")
             if recipient_id is None:
@@ -707,18 +645,16 @@ async def receive_proof_handler(message: Message, state: FSMContext, bot: Bot):
                 inline_keyboard=[
                     [
                         InlineKeyboardButton(
-                            text=t_for(recipient_id, "BTN_APPROVE"), callback_data=f"approve_{transaction_id}"
+                            text=t_for(recipient_id, "BTN_APPROVE"), callback_data=cb.APPROVE.pack(transaction_id)
                         ),
                         InlineKeyboardButton(
-                            text=t_for(recipient_id, "BTN_REJECT"), callback_data=f"reject_{transaction_id}"
+                            text=t_for(recipient_id, "BTN_REJECT"), callback_data=cb.REJECT.pack(transaction_id)
                         ),
                     ]
                 ]
             )
 
-            currency_symbols = {"USD": "$", "UAH": "₴", "RUB": "₽"}
-            symbol = currency_symbols.get(tx_currency, tx_currency)
-            formatted_amount = f"{symbol} {float(tx_amount):,.2f}"
+            formatted_amount = format_amount(tx_amount, tx_currency)
 
             if user.username:
                 sender = f"@{user.username} (ID: {user.id})"
@@ -728,7 +664,7 @@ async def receive_proof_handler(message: Message, state: FSMContext, bot: Bot):
 
             receiver = "N/A"
             recipient = await db.get_user(recipient_id)
-            recipient_username = recipient[1] if recipient else None
+            recipient_username = recipient.username if recipient else None
             if recipient_username:
                 receiver = f"@{recipient_username} (ID: {recipient_id})"
             else:
@@ -741,24 +677,35 @@ async def receive_proof_handler(message: Message, state: FSMContext, bot: Bot):
             else:
                 card = "N/A"
 
+            caption = t_for(recipient_id, "ADMIN_NEW_CLAIM_TITLE") + "\n\n" + t_for(
+                recipient_id,
+                "ADMIN_CLAIM_DETAILS",
+                sender=sender,
+                amount=formatted_amount,
+                card=card,
+                tx_id=transaction_id,
+                receiver=receiver,
+            )
+            duplicates = await duplicate_check if duplicate_check else []
+            if duplicates:
+                matches = ", ".join(
+                    t_for(recipient_id, "CLAIM_DUPLICATE_MATCH", tx_id=tx, user_id=uid) for tx, uid, _ in duplicates[:3]
+                )
+                caption += t_for(recipient_id, "CLAIM_DUPLICATE_WARNING", matches=matches)
+
             await bot.send_photo(
                 chat_id=recipient_id,
                 photo=file_id,
-                caption=t_for(recipient_id, "ADMIN_NEW_CLAIM_TITLE") + "\n\n" +
-                t_for(
-                    recipient_id,
-                    "ADMIN_CLAIM_DETAILS",
-                    sender=sender,
-                    amount=formatted_amount,
-                    card=card,
-                    tx_id=transaction_id,
-                    receiver=receiver,
-                ),
+                caption=caption,
                 parse_mode="HTML",
                 reply_markup=keyboard,
             )
     except Exception as e:
         logger.error(f"Failed to send for confirmation: {e}")
+    finally:
+        # Not awaited on the early returns and failures above; don't leave it running
+        if duplicate_check is not None:
+            duplicate_check.cancel()
 
     await message.answer(
         t_for(message.from_user.id, "RECEIPT_RECEIVED"),
@@ -772,4 +719,4 @@ async def receive_proof_handler(message: Message, state: FSMContext, bot: Bot):
 
 
 def register_user_handlers(dp: Dispatcher):
-    dp.include_router(router)
+    dp.include_router(hosting.clone_router(router))
@@ -0,0 +1,112 @@
+"""Several bots in one process, sharing the backend client and caches.
+
+Each bot gets its own ``Dispatcher``, built from the same handler routers, plus a
+``BotConfig``. ``BotConfigMiddleware`` binds the config for the duration of an
+update, so handlers see their own bot's admin through ``is_admin`` and
+``database`` reads and writes that bot's settings namespace. Users, transactions,
+cards, exchange rates, stats and exports stay shared by all bots, so whoever is admin
+of one bot manages all of them; ``load_bot_configs`` therefore refuses bots with
+different admins.
+
+Bots come from ``BOTS_FILE``, a JSON list like
+``[{"name": "kyiv", "token": "123:abc", "admin_id": 42}]``; without it, the one bot
+configured by ``BOT_TOKEN``/``ADMIN_ID`` runs in the default namespace ("").
+"""
+import json
+import logging
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot, Dispatcher, Router
+from aiogram.types import Update
+
+import database as db
+from config import ADMIN_ID, BOT_TOKEN, BOTS_FILE
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class BotConfig:
+    name: str  # settings namespace; "" keeps the unprefixed settings
+    token: str
+    admin_id: int | None = None
+
+
+@dataclass
+class HostedBot:
+    config: BotConfig
+    bot: Bot
+    dp: Dispatcher
+
+
+DEFAULT_BOT = BotConfig(name="", token=BOT_TOKEN or "", admin_id=ADMIN_ID)
+
+_current: ContextVar[BotConfig] = ContextVar("bot_config", default=DEFAULT_BOT)
+
+
+def load_bot_configs(path: str | None = BOTS_FILE) -> list[BotConfig]:
+    if not path:
+        return [DEFAULT_BOT]
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    configs = [
+        BotConfig(
+            name=str(entry.get("name") or ""),
+            token=str(entry["token"]),
+            admin_id=int(entry["admin_id"]) if entry.get("admin_id") is not None else None,
+        )
+        for entry in entries
+    ]
+    names = [c.name for c in configs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"{path}: bot names must be unique, got {names}")
+    if any(":" in name for name in names):
+        raise ValueError(f"{path}: bot names cannot contain ':'")
+    admins = sorted({c.admin_id for c in configs if c.admin_id is not None})
+    if len(admins) > 1:
+        raise ValueError(f"{path}: cards and transactions are shared, so all bots need the same admin_id, got {admins}")
+    return configs
+
+
+def current() -> BotConfig:
+    return _current.get()
+
+
+def is_admin(user_id: int) -> bool:
+    admin_id = _current.get().admin_id
+    return admin_id is not None and user_id == admin_id
+
+
+class BotConfigMiddleware(BaseMiddleware):
+    """Outer update middleware binding one bot's config while its update is handled."""
+
+    def __init__(self, config: BotConfig):
+        self.config = config
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        config_token = _current.set(self.config)
+        namespace_token = db.settings_namespace.set(self.config.name)
+        try:
+            return await handler(event, data)
+        finally:
+            db.settings_namespace.reset(namespace_token)
+            _current.reset(config_token)
+
+
+def clone_router(template: Router) -> Router:
+    """A router with ``template``'s handlers, attachable to one more dispatcher.
+
+    aiogram lets a router join only one parent; handler objects hold no per-dispatcher
+    state, so every bot's dispatcher shares them.
+    """
+    router = Router(name=template.name)
+    for name, observer in template.observers.items():
+        router.observers[name].handlers.extend(observer.handlers)
+    return router
@@ -68,6 +68,7 @@ TRANSLATIONS = {
         "BTN_VIEW_STATS": "Stats",
         "BTN_MANAGE_CARDS": "Manage Cards",
         "BTN_MANAGE_SUPPORT": "Manage Support",
+        "BTN_CPU_PROFILE": "🔬 CPU Profile ({seconds}s)",
         "BTN_MANAGE_CURRENCIES": "Manage Currencies",
         "ADMIN_PANEL_TITLE": "🛠️ Admin Panel",
         "ALERT_NOT_AUTHORIZED": "Not authorized",
@@ -98,6 +99,31 @@ TRANSLATIONS = {
         "APPROVED_LABEL": "✅ <b>APPROVED</b>",
         "REJECTED_LABEL": "❌ <b>REJECTED</b>",
         "BACK": "Back",
+        "ALERT_TOO_FAST": "Too many taps. Please wait a moment.",
+        "CLAIM_DUPLICATE_WARNING": "\n\n⚠️ <b>Possible duplicate receipt</b> — a matching image was already sent for: {matches}",
+        "CLAIM_DUPLICATE_MATCH": "#{tx_id} (ID: {user_id})",
+        "RATES_TITLE": "💱 <b>Exchange rates</b> (in {base})",
+        "RATES_EMPTY": "No rates set yet.",
+        "RATES_USAGE": "Set a rate with <code>/setrate UAH 0.024</code>, remove it with <code>/setrate UAH -</code>",
+        "BTN_LEADERBOARD": "🏆 Top Creators",
+        "LEADERBOARD_TITLE": "🏆 <b>Top creators</b> — {currency}",
+        "LEADERBOARD_EMPTY": "No approved donations yet.",
+        "PROFILE_RECEIVED": "Support Received",
+        "PROFILE_PENDING": "Awaiting Review",
+        "EXPORT_USAGE": "Usage: <code>/export [csv|jsonl] [status=approved] [currency=UAH] [referrer=ID] [from=2026-01-01] [to=2026-01-31]</code>",
+        "EXPORT_STARTED": "⏳ Export started…",
+        "EXPORT_PROGRESS": "⏳ Exporting… {rows:,} rows written",
+        "EXPORT_DONE": "✅ Exported {rows:,} transactions",
+        "EXPORT_FAILED": "❌ Export failed. Please try again later.",
+        "EXPORT_TOO_LARGE": "❌ The export is larger than Telegram allows ({size} MB). Narrow it with filters.",
+        "EXPORT_BUSY": "An export is already running.",
+        "EXPORT_CANCELLED": "❌ Export cancelled because the bot is restarting. Please run it again.",
+        "CPU_PROFILE_CANCELLED": "❌ Profiling cancelled because the bot is restarting.",
+        "CPU_PROFILE_USAGE": "Usage: <code>/cpuprofile [seconds] [collapsed|speedscope]</code>, up to {max_seconds} seconds",
+        "CPU_PROFILE_STARTED": "⏳ Profiling for {seconds}s…",
+        "CPU_PROFILE_DONE": "✅ {samples:,} stack samples over {seconds:.0f}s. Open in speedscope.app or flamegraph.pl",
+        "CPU_PROFILE_FAILED": "❌ Profiling failed.",
+        "CPU_PROFILE_BUSY": "A profiling session is already running.",
     },
     "ru": {
         "SELECT_LANGUAGE_PROMPT": "Пожалуйста, выберите язык",
@@ -164,6 +190,7 @@ TRANSLATIONS = {
         "BTN_VIEW_STATS": "Статистика",
         "BTN_MANAGE_CARDS": "Управление картами",
         "BTN_MANAGE_SUPPORT": "Управление поддержкой",
+        "BTN_CPU_PROFILE": "🔬 Профиль CPU ({seconds} с)",
         "BTN_MANAGE_CURRENCIES": "Управление валютами",
         "ADMIN_PANEL_TITLE": "🛠️ Панель админа",
         "ALERT_NOT_AUTHORIZED": "Нет прав",
@@ -194,6 +221,31 @@ TRANSLATIONS = {
         "APPROVED_LABEL": "✅ <b>ОДОБРЕНО</b>",
         "REJECTED_LABEL": "❌ <b>ОТКЛОНЕНО</b>",
         "BACK": "Назад",
+        "ALERT_TOO_FAST": "Слишком много нажатий. Подождите немного.",
+        "CLAIM_DUPLICATE_WARNING": "\n\n⚠️ <b>Возможный повтор чека</b> — похожее изображение уже отправлялось для: {matches}",
+        "CLAIM_DUPLICATE_MATCH": "#{tx_id} (ID: {user_id})",
+        "RATES_TITLE": "💱 <b>Курсы валют</b> (в {base})",
+        "RATES_EMPTY": "Курсы еще не заданы.",
+        "RATES_USAGE": "Задать курс: <code>/setrate UAH 0.024</code>, удалить: <code>/setrate UAH -</code>",
+        "BTN_LEADERBOARD": "🏆 Топ авторов",
+        "LEADERBOARD_TITLE": "🏆 <b>Топ авторов</b> — {currency}",
+        "LEADERBOARD_EMPTY": "Подтвержденных пожертвований пока нет.",
+        "PROFILE_RECEIVED": "Получено поддержки",
+        "PROFILE_PENDING": "Ожидает проверки",
+        "EXPORT_USAGE": "Использование: <code>/export [csv|jsonl] [status=approved] [currency=UAH] [referrer=ID] [from=2026-01-01] [to=2026-01-31]</code>",
+        "EXPORT_STARTED": "⏳ Экспорт начат…",
+        "EXPORT_PROGRESS": "⏳ Экспорт… записано строк: {rows:,}",
+        "EXPORT_DONE": "✅ Выгружено транзакций: {rows:,}",
+        "EXPORT_FAILED": "❌ Не удалось выполнить экспорт. Попробуйте позже.",
+        "EXPORT_TOO_LARGE": "❌ Файл больше допустимого Telegram размера ({size} МБ). Уточните фильтры.",
+        "EXPORT_BUSY": "Экспорт уже выполняется.",
+        "EXPORT_CANCELLED": "❌ Экспорт отменён: бот перезапускается. Запустите его снова.",
+        "CPU_PROFILE_CANCELLED": "❌ Профилирование отменено: бот перезапускается.",
+        "CPU_PROFILE_USAGE": "Использование: <code>/cpuprofile [секунды] [collapsed|speedscope]</code>, не больше {max_seconds} секунд",
+        "CPU_PROFILE_STARTED": "⏳ Профилирование {seconds} с…",
+        "CPU_PROFILE_DONE": "✅ {samples:,} снимков стека за {seconds:.0f} с. Откройте в speedscope.app или flamegraph.pl",
+        "CPU_PROFILE_FAILED": "❌ Не удалось выполнить профилирование.",
+        "CPU_PROFILE_BUSY": "Профилирование уже выполняется.",
     },
     "uk": {
         "SELECT_LANGUAGE_PROMPT": "Будь ласка, оберіть мову",
@@ -262,6 +314,7 @@ TRANSLATIONS = {
         "BTN_VIEW_STATS": "Статистика",
         "BTN_MANAGE_CARDS": "Управління картками",
         "BTN_MANAGE_SUPPORT": "Управління підтримкою",
+        "BTN_CPU_PROFILE": "🔬 Профіль CPU ({seconds} с)",
         "BTN_MANAGE_CURRENCIES": "Керування валютами",
         "ADMIN_PANEL_TITLE": "🛠️ Панель адміна",
         "ALERT_NOT_AUTHORIZED": "Немає прав",
@@ -292,6 +345,31 @@ TRANSLATIONS = {
         "APPROVED_LABEL": "✅ <b>СХВАЛЕНО</b>",
         "REJECTED_LABEL": "❌ <b>ВІДХИЛЕНО</b>",
         "BACK": "Назад",
+        "ALERT_TOO_FAST": "Забагато натискань. Зачекайте трохи.",
+        "CLAIM_DUPLICATE_WARNING": "\n\n⚠️ <b>Можливий повтор квитанції</b> — схоже зображення вже надсилалося для: {matches}",
+        "CLAIM_DUPLICATE_MATCH": "#{tx_id} (ID: {user_id})",
+        "RATES_TITLE": "💱 <b>Курси валют</b> (у {base})",
+        "RATES_EMPTY": "Курси ще не задані.",
+        "RATES_USAGE": "Задати курс: <code>/setrate UAH 0.024</code>, видалити: <code>/setrate UAH -</code>",
+        "BTN_LEADERBOARD": "🏆 Топ авторів",
+        "LEADERBOARD_TITLE": "🏆 <b>Топ авторів</b> — {currency}",
+        "LEADERBOARD_EMPTY": "Підтверджених пожертв поки немає.",
+        "PROFILE_RECEIVED": "Отримано підтримки",
+        "PROFILE_PENDING": "Очікує перевірки",
+        "EXPORT_USAGE": "Використання: <code>/export [csv|jsonl] [status=approved] [currency=UAH] [referrer=ID] [from=2026-01-01] [to=2026-01-31]</code>",
+        "EXPORT_STARTED": "⏳ Експорт розпочато…",
+        "EXPORT_PROGRESS": "⏳ Експорт… записано рядків: {rows:,}",
+        "EXPORT_DONE": "✅ Вивантажено транзакцій: {rows:,}",
+        "EXPORT_FAILED": "❌ Не вдалося виконати експорт. Спробуйте пізніше.",
+        "EXPORT_TOO_LARGE": "❌ Файл більший за дозволений Telegram розмір ({size} МБ). Уточніть фільтри.",
+        "EXPORT_BUSY": "Експорт уже виконується.",
+        "EXPORT_CANCELLED": "❌ Експорт скасовано: бот перезапускається. Запустіть його знову.",
+        "CPU_PROFILE_CANCELLED": "❌ Профілювання скасовано: бот перезапускається.",
+        "CPU_PROFILE_USAGE": "Використання: <code>/cpuprofile [секунди] [collapsed|speedscope]</code>, не більше {max_seconds} секунд",
+        "CPU_PROFILE_STARTED": "⏳ Профілювання {seconds} с…",
+        "CPU_PROFILE_DONE": "✅ {samples:,} знімків стека за {seconds:.0f} с. Відкрийте в speedscope.app або flamegraph.pl",
+        "CPU_PROFILE_FAILED": "❌ Не вдалося виконати профілювання.",
+        "CPU_PROFILE_BUSY": "Профілювання вже виконується.",
     },
 }
 
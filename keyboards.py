@@ -1,43 +1,49 @@
+from functools import lru_cache
+
 from aiogram.types import (
     InlineKeyboardButton,
     InlineKeyboardMarkup,
     ReplyKeyboardRemove,
 )
 
+import callbacks as cb
 import database as db
-from i18n import LANG_BUTTON_TEXTS, TRANSLATIONS
+from i18n import LANG_BUTTON_TEXTS, LANGS, TRANSLATIONS
 
 
+@lru_cache(maxsize=None)
 def get_main_menu(lang: str, is_admin: bool = False):
     """Inline main menu keyboard."""
     rows = [
         [
-            InlineKeyboardButton(text=TRANSLATIONS[lang]["MENU_DONATE"], callback_data="menu_donate"),
-            InlineKeyboardButton(text=TRANSLATIONS[lang]["MENU_HISTORY"], callback_data="menu_history"),
+            InlineKeyboardButton(text=TRANSLATIONS[lang]["MENU_DONATE"], callback_data=cb.MENU_DONATE.pack()),
+            InlineKeyboardButton(text=TRANSLATIONS[lang]["MENU_HISTORY"], callback_data=cb.MENU_HISTORY.pack()),
         ],
         [
-            InlineKeyboardButton(text=TRANSLATIONS[lang]["MENU_PROFILE"], callback_data="menu_profile"),
-            InlineKeyboardButton(text=TRANSLATIONS[lang]["MENU_SUPPORT"], callback_data="menu_support"),
+            InlineKeyboardButton(text=TRANSLATIONS[lang]["MENU_PROFILE"], callback_data=cb.MENU_PROFILE.pack()),
+            InlineKeyboardButton(text=TRANSLATIONS[lang]["MENU_SUPPORT"], callback_data=cb.MENU_SUPPORT.pack()),
         ],
     ]
     if is_admin:
-        rows.append([InlineKeyboardButton(text=TRANSLATIONS[lang]["ADMIN_PANEL"], callback_data="menu_admin")])
+        rows.append([InlineKeyboardButton(text=TRANSLATIONS[lang]["ADMIN_PANEL"], callback_data=cb.MENU_ADMIN.pack())])
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
+@lru_cache(maxsize=None)
 def get_cancel_keyboard(lang: str):
     """Inline cancel button."""
     return InlineKeyboardMarkup(
-        inline_keyboard=[[InlineKeyboardButton(text=TRANSLATIONS[lang]["CANCEL"], callback_data="cancel")]]
+        inline_keyboard=[[InlineKeyboardButton(text=TRANSLATIONS[lang]["CANCEL"], callback_data=cb.CANCEL.pack())]]
     )
 
 
+@lru_cache(maxsize=None)
 def get_language_keyboard():
     return InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text=LANG_BUTTON_TEXTS["ru"], callback_data="lang_ru")],
-            [InlineKeyboardButton(text=LANG_BUTTON_TEXTS["uk"], callback_data="lang_uk")],
-            [InlineKeyboardButton(text=LANG_BUTTON_TEXTS["en"], callback_data="lang_en")],
+            [InlineKeyboardButton(text=LANG_BUTTON_TEXTS["ru"], callback_data=cb.LANG.pack("ru"))],
+            [InlineKeyboardButton(text=LANG_BUTTON_TEXTS["uk"], callback_data=cb.LANG.pack("uk"))],
+            [InlineKeyboardButton(text=LANG_BUTTON_TEXTS["en"], callback_data=cb.LANG.pack("en"))],
         ]
     )
 
@@ -58,19 +64,31 @@ async def get_currency_keyboard(enabled: list[str] | None = None):
             text = "🇺🇸 USD"
         else:
             continue
-        rows.append([InlineKeyboardButton(text=text, callback_data=f"currency_{code}")])
+        rows.append([InlineKeyboardButton(text=text, callback_data=cb.CURRENCY.pack(code))])
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
+@lru_cache(maxsize=None)
 def get_admin_currency_keyboard():
     return InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="🇺🇦 UAH", callback_data="admin_currency_UAH")],
-            [InlineKeyboardButton(text="🇷🇺 RUB", callback_data="admin_currency_RUB")],
-            [InlineKeyboardButton(text="🇺🇸 USD", callback_data="admin_currency_USD")],
+            [InlineKeyboardButton(text="🇺🇦 UAH", callback_data=cb.ADMIN_CURRENCY.pack("UAH"))],
+            [InlineKeyboardButton(text="🇷🇺 RUB", callback_data=cb.ADMIN_CURRENCY.pack("RUB"))],
+            [InlineKeyboardButton(text="🇺🇸 USD", callback_data=cb.ADMIN_CURRENCY.pack("USD"))],
         ]
     )
 
 
+def warm_keyboards() -> int:
+    """Build every static keyboard once; they are cached and never mutated."""
+    for lang in LANGS:
+        get_main_menu(lang, is_admin=False)
+        get_main_menu(lang, is_admin=True)
+        get_cancel_keyboard(lang)
+    get_language_keyboard()
+    get_admin_currency_keyboard()
+    return len(LANGS) * 3 + 2
+
+
 # For removing reply keyboard when switching to inline
 REMOVE_KEYBOARD = ReplyKeyboardRemove()
@@ -0,0 +1,197 @@
+"""Process lifecycle: parallel warm-up before polling, drain before shutting down.
+
+``start_polling`` stops fetching on SIGTERM/SIGINT but leaves handler tasks running
+while the process tears down. ``DrainingDispatcher`` counts updates from the moment
+they are fed (including time queued behind the same user's earlier updates), so
+``shutdown()`` can wait for them, then flush traces and close every client.
+
+Every function takes all bots hosted by the process (see hosting.py): shared clients
+are warmed and closed once, each bot is polled and drained on its own.
+"""
+import asyncio
+import logging
+import signal
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import Update
+from aiohttp import web
+
+import database as db
+import handlers_admin
+import receipts
+from hosting import HostedBot
+from keyboards import warm_keyboards
+from loopmonitor import monitor
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+class DrainingDispatcher(Dispatcher):
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.accepting = True
+        self.warm = False
+        self.inflight = 0
+        self.last_update_id: int | None = None
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def feed_update(self, bot: Bot, update: Update, **kwargs: Any) -> Any:
+        if not self.accepting:
+            logger.warning(f"Dropping update {update.update_id} received while draining")
+            return UNHANDLED
+        self.inflight += 1
+        self._idle.clear()
+        try:
+            return await super().feed_update(bot, update, **kwargs)
+        finally:
+            self.inflight -= 1
+            if self.last_update_id is None or update.update_id > self.last_update_id:
+                self.last_update_id = update.update_id
+            if self.inflight == 0:
+                self._idle.set()
+
+    def is_ready(self) -> bool:
+        """Readiness: warmed up and not draining."""
+        return self.warm and self.accepting
+
+    async def drain(self, timeout_s: float) -> bool:
+        """Stop accepting updates and wait for in-flight ones; False on timeout."""
+        self.accepting = False
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout_s)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+async def _phase(name: str, fn: Callable[[], Awaitable[Any]], durations: dict[str, float]) -> None:
+    t0 = time.perf_counter()
+    await fn()
+    durations[name] = time.perf_counter() - t0
+    logger.info(f"Warm-up {name}: {durations[name] * 1000:.0f} ms")
+
+
+async def warm_up(hosted: list[HostedBot]) -> dict[str, float]:
+    """Open connections and fill caches in parallel, then mark the dispatchers ready.
+
+    Backend reads wait for ``initDefaults`` (they depend on its defaults); failing
+    to preload them is not fatal, failing to init the backend is.
+    """
+    durations: dict[str, float] = {}
+    namespaces = [h.config.name for h in hosted]
+    monitor.start()
+
+    async def keyboards() -> None:
+        warm_keyboards()
+
+    async def preload() -> None:
+        try:
+            await db.preload_settings(namespaces)
+        except Exception as e:
+            logger.warning(f"Settings preload failed, menus will load them lazily: {e}")
+
+    async def backend() -> None:
+        # The first request also opens the HTTP/2 connection the handlers will reuse
+        await _phase("backend.init", db.init_db, durations)
+        db.start_cache_subscriptions(namespaces)
+        await _phase("backend.settings", preload, durations)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(
+        backend(),
+        *(_phase(f"telegram.get_me[{h.config.name or 'default'}]", h.bot.me, durations) for h in hosted),
+        _phase("keyboards", keyboards, durations),
+        _phase("receipts.workers", receipts.warm_up, durations),
+    )
+    durations["total"] = time.perf_counter() - t0
+    for h in hosted:
+        h.dp.warm = True
+    logger.info(f"Warm-up complete in {durations['total'] * 1000:.0f} ms; ready")
+    return durations
+
+
+async def _confirm_updates(bot: Bot, last_update_id: int) -> None:
+    # Polling only confirms a batch on the next getUpdates call, so without this
+    # everything handled since the last poll would be redelivered after restart.
+    try:
+        await bot.get_updates(offset=last_update_id + 1, limit=1, timeout=0)
+    except Exception as e:
+        logger.warning(f"Failed to confirm handled updates: {e}")
+
+
+async def _stop_polling(dp: Dispatcher) -> None:
+    try:
+        await dp.stop_polling()
+    except RuntimeError:
+        pass  # this bot's polling already ended
+
+
+async def poll(hosted: list[HostedBot]) -> None:
+    """Poll every bot until SIGTERM/SIGINT stops them all; sessions stay open for draining."""
+    loop = asyncio.get_running_loop()
+
+    def stop() -> None:
+        logger.warning("Received stop signal")
+        for h in hosted:
+            asyncio.ensure_future(_stop_polling(h.dp))
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop)
+    try:
+        await asyncio.gather(
+            *(h.dp.start_polling(h.bot, handle_signals=False, close_bot_session=False) for h in hosted)
+        )
+    finally:
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(sig)
+
+
+async def _drain(h: HostedBot, timeout_s: float, confirm_updates: bool) -> None:
+    dp: DrainingDispatcher = h.dp  # type: ignore[assignment]
+    pending = dp.inflight
+    if await dp.drain(timeout_s):
+        logger.info(f"Drained {pending} in-flight updates of bot {h.config.name or 'default'}")
+        if confirm_updates and dp.last_update_id is not None:
+            await _confirm_updates(h.bot, dp.last_update_id)
+    else:
+        logger.warning(
+            f"Drain deadline of {timeout_s:g}s hit with {dp.inflight} updates of bot "
+            f"{h.config.name or 'default'} still running; unconfirmed updates will be redelivered"
+        )
+
+
+async def shutdown(
+    hosted: list[HostedBot],
+    *,
+    timeout_s: float,
+    metrics_runner: web.AppRunner | None = None,
+    confirm_updates: bool = True,
+) -> None:
+    """Drain and close; sharded workers pass ``confirm_updates=False``, their supervisor polls."""
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_drain(h, timeout_s, confirm_updates) for h in hosted))
+    drain_s = time.perf_counter() - t0
+
+    t1 = time.perf_counter()
+    closers: list[tuple[str, Callable[[], Awaitable[Any]]]] = [
+        # Exports and profiles outlive the updates that started them and still need the clients
+        ("admin background tasks", handlers_admin.stop_background_tasks),
+        ("receipt workers", receipts.shutdown),
+        ("loop monitor", monitor.stop),
+        ("tracer", tracer.shutdown),
+        ("database", db.close_db),
+    ]
+    closers += [(f"bot session {h.config.name or 'default'}", h.bot.session.close) for h in hosted]
+    for name, close in closers:
+        try:
+            await close()
+        except Exception as e:
+            logger.error(f"Failed to close {name}: {e}")
+    if metrics_runner:
+        await metrics_runner.cleanup()
+    logger.info(f"Shutdown complete: drain {drain_s:.2f}s, close {time.perf_counter() - t1:.2f}s")
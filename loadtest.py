@@ -0,0 +1,362 @@
+"""End-to-end load test: drives simulated donors through the real dispatcher.
+
+Telegram is replaced by ``FakeSession`` (records outgoing calls, never touches the
+network); the backend is whatever ``CONVEX_URL`` points at, or the in-process
+``convex_standin`` with ``--local-backend``.
+
+With ``--workers N`` updates go through a ``sharding.Supervisor`` to N worker
+processes instead (the stand-in then runs in its own process too), to compare
+throughput against the single-process dispatcher:
+
+    python loadtest.py --users 2000 --concurrency 200 --local-backend --backend-latency-ms 20
+    python loadtest.py --users 2000 --concurrency 200 --local-backend --workers 4
+"""
+import argparse
+import asyncio
+import functools
+import itertools
+import logging
+import os
+import socket
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.methods import TelegramMethod
+from aiogram.types import CallbackQuery, Chat, Message, PhotoSize, Update, User
+
+import callbacks as cb
+
+logger = logging.getLogger(__name__)
+
+BOT_ID = 42
+BOT_TOKEN = f"{BOT_ID}:loadtest"
+_ids = itertools.count(1)
+
+
+class FakeSession(BaseSession):
+    """Bot session that records every API call and fabricates a plausible result."""
+
+    def __init__(self, *, latency_s: float = 0.0):
+        super().__init__()
+        self.latency_s = latency_s
+        self.calls: Counter[str] = Counter()
+        self.sent: list[tuple[str, dict[str, Any]]] = []
+        self.record_payloads = False
+
+    async def close(self) -> None:
+        return None
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[Any], timeout: int | None = None) -> Any:
+        name = method.__api_method__
+        self.calls[name] += 1
+        if self.record_payloads:
+            self.sent.append((name, method.model_dump(exclude_none=True)))
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+
+        if name == "getMe":
+            return User(id=bot.id, is_bot=True, first_name="Load Test", username="loadtest_bot")
+        returning = method.__returning__
+        if returning is bool:
+            return True
+        if returning is Message or returning == (Message | bool):
+            chat_id = getattr(method, "chat_id", None) or 0
+            return Message(
+                message_id=getattr(method, "message_id", None) or next(_ids),
+                date=datetime.now(timezone.utc),
+                chat=Chat(id=int(chat_id), type="private"),
+                text=getattr(method, "text", None),
+                caption=getattr(method, "caption", None),
+            )
+        return True
+
+
+def _user(uid: int) -> User:
+    return User(id=uid, is_bot=False, first_name=f"User{uid}", username=f"user{uid}", language_code="en")
+
+
+def _message(uid: int, **fields: Any) -> Message:
+    return Message(
+        message_id=next(_ids),
+        date=datetime.now(timezone.utc),
+        chat=Chat(id=uid, type="private"),
+        from_user=_user(uid),
+        **fields,
+    )
+
+
+def text_update(uid: int, text: str) -> Update:
+    return Update(update_id=next(_ids), message=_message(uid, text=text))
+
+
+def photo_update(uid: int, file_id: str) -> Update:
+    photo = PhotoSize(file_id=file_id, file_unique_id=file_id, width=1280, height=720)
+    return Update(update_id=next(_ids), message=_message(uid, photo=[photo]))
+
+
+def callback_update(uid: int, data: str, *, caption: str | None = None) -> Update:
+    msg = _message(BOT_ID, text=None if caption else "...", caption=caption)
+    msg = msg.model_copy(update={"chat": Chat(id=uid, type="private")})
+    return Update(
+        update_id=next(_ids),
+        callback_query=CallbackQuery(
+            id=str(next(_ids)), from_user=_user(uid), chat_instance=str(uid), data=data, message=msg
+        ),
+    )
+
+
+def build_fake_bots(
+    storage_factory: Callable[[], Any], *, tg_latency_s: float = 0.0, flood_control: bool = False
+) -> list[Any]:
+    """Worker-side bots for ``--workers``: the load-test bot over a ``FakeSession``."""
+    from bot import create_dispatcher
+    from hosting import BotConfig, HostedBot
+
+    config = BotConfig(name="", token=BOT_TOKEN)
+    bot = Bot(token=BOT_TOKEN, session=FakeSession(latency_s=tg_latency_s))
+    return [HostedBot(config, bot, create_dispatcher(config, storage_factory(), flood_control=flood_control))]
+
+
+class _TraceCollector:
+    """Tracer exporter that tallies backend and Telegram calls per update."""
+
+    def __init__(self):
+        self.by_update: dict[int, Counter[str]] = {}
+
+    def export(self, trace: dict[str, Any]) -> None:
+        root = trace["spans"][0]
+        counts: Counter[str] = Counter()
+        for s in trace["spans"][1:]:
+            counts[s["name"].split(".", 1)[0]] += 1
+        self.by_update[root["attributes"].get("update_id")] = counts
+
+    async def shutdown(self) -> None:
+        return None
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[k]
+
+
+class LoadTest:
+    def __init__(
+        self,
+        *,
+        users: int,
+        creators: int,
+        concurrency: int,
+        amount: float,
+        currency: str,
+        tg_latency_s: float,
+        flood_control: bool = False,
+        supervisor: Any = None,
+    ):
+        from bot import create_dispatcher
+        from tracing import TelegramRequestTracer, tracer
+
+        self.users = users
+        self.creators = creators
+        self.concurrency = concurrency
+        self.amount = amount
+        self.currency = currency
+        self.supervisor = supervisor
+        self.session = FakeSession(latency_s=tg_latency_s)
+        self.session.middleware(TelegramRequestTracer())
+        self.bot = Bot(token=BOT_TOKEN, session=self.session)
+        self.dp = create_dispatcher(flood_control=flood_control)
+        self.collector = _TraceCollector()
+        tracer.exporter = self.collector
+        tracer.slow_update_ms = float("inf")
+        self.latencies: defaultdict[str, list[float]] = defaultdict(list)
+        self.step_of_update: dict[int, str] = {}
+        self.completed = 0
+        self.failed: Counter[str] = Counter()
+
+    async def _feed(self, step: str, update: Update) -> None:
+        self.step_of_update[update.update_id] = step
+        t0 = time.perf_counter()
+        if self.supervisor is not None:
+            await self.supervisor.feed("", update.model_dump(mode="json", by_alias=True, exclude_none=True))
+        else:
+            await self.dp.feed_update(self.bot, update)
+        self.latencies[step].append((time.perf_counter() - t0) * 1000)
+
+    async def _tx_id(self, uid: int) -> int | None:
+        if self.supervisor is not None:
+            # FSM data lives in the worker process; the newest transaction is the one just created
+            import database as db
+
+            history = await db.get_user_history(uid)
+            return history[0][0] if history else None
+        key = StorageKey(bot_id=self.bot.id, chat_id=uid, user_id=uid)
+        data = await self.dp.storage.get_data(key)
+        return data.get("current_transaction_id")
+
+    async def run_flow(self, uid: int, creator_id: int) -> None:
+        await self._feed("start", text_update(uid, f"/start {creator_id}"))
+        await self._feed("language", callback_update(uid, cb.LANG.pack("en")))
+        await self._feed("donate_to", callback_update(uid, cb.DONATE_TO.pack(creator_id)))
+        await self._feed("currency", callback_update(uid, cb.CURRENCY.pack(self.currency)))
+        await self._feed("amount", text_update(uid, f"{self.amount:g}"))
+        tx_id = await self._tx_id(uid)
+        if not tx_id:
+            self.failed["no_transaction"] += 1
+            return
+        await self._feed("proof", photo_update(uid, f"proof-{uid}"))
+        await self._feed("approve", callback_update(creator_id, cb.APPROVE.pack(tx_id), caption="claim"))
+        self.completed += 1
+
+    async def run(self) -> float:
+        sem = asyncio.Semaphore(self.concurrency)
+        base_uid = 10_000_000
+        base_creator = 1_000_000
+
+        async def one(i: int) -> None:
+            async with sem:
+                try:
+                    await self.run_flow(base_uid + i, base_creator + i % self.creators)
+                except Exception as e:
+                    self.failed[type(e).__name__] += 1
+                    logger.debug(f"Flow {i} failed: {e}")
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(self.users)))
+        return time.perf_counter() - t0
+
+    def report(self, elapsed_s: float) -> str:
+        backend: Counter[str] = Counter()
+        telegram: Counter[str] = Counter()
+        for update_id, step in self.step_of_update.items():
+            counts = self.collector.by_update.get(update_id, Counter())
+            backend[step] += counts["convex"]
+            telegram[step] += counts["telegram"]
+
+        all_lat = [x for xs in self.latencies.values() for x in xs]
+        flows = max(self.completed, 1)
+        lines = [
+            f"flows: {self.completed}/{self.users} completed in {elapsed_s:.2f}s "
+            f"({self.completed / elapsed_s:.1f} donations/s, {len(all_lat) / elapsed_s:.1f} updates/s)",
+            f"failures: {dict(self.failed) or 'none'}",
+            f"{'step':<10} {'n':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'backend/upd':>12} {'tg/upd':>8}",
+        ]
+        for step, xs in list(self.latencies.items()) + [("ALL", all_lat)]:
+            n = len(xs)
+            b = sum(backend.values()) if step == "ALL" else backend[step]
+            tg = sum(telegram.values()) if step == "ALL" else telegram[step]
+            lines.append(
+                f"{step:<10} {n:>7} {percentile(xs, 50):>9.2f} {percentile(xs, 95):>9.2f} "
+                f"{percentile(xs, 99):>9.2f} {b / max(n, 1):>12.2f} {tg / max(n, 1):>8.2f}"
+            )
+        lines.append(
+            f"backend calls per flow: {sum(backend.values()) / flows:.2f}, "
+            f"telegram calls per flow: {sum(telegram.values()) / flows:.2f}"
+        )
+        if self.supervisor is not None:
+            lines.append(f"workers: {len(self.supervisor.shards)} (backend and Telegram calls are only counted in-process)")
+        else:
+            lines.append(f"telegram methods: {dict(self.session.calls)}")
+        return "\n".join(lines)
+
+
+async def _standin_process(ns: argparse.Namespace) -> asyncio.subprocess.Process:
+    """The Convex stand-in in its own process, so it does not compete with the harness."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-u", os.path.join(os.path.dirname(os.path.abspath(__file__)), "convex_standin.py"),
+        "--port", str(port),
+        "--latency-ms", str(ns.backend_latency_ms),
+        "--jitter-ms", str(ns.backend_jitter_ms),
+        stdout=asyncio.subprocess.PIPE,
+    )
+    await proc.stdout.readline()  # "Convex stand-in listening on ..."
+    os.environ["CONVEX_URL"] = f"http://127.0.0.1:{port}"
+    return proc
+
+
+async def _main(ns: argparse.Namespace) -> None:
+    standin = standin_proc = supervisor = None
+    if ns.local_backend and ns.workers:
+        standin_proc = await _standin_process(ns)
+    elif ns.local_backend:
+        from convex_standin import ConvexStandIn
+
+        standin = ConvexStandIn(latency_ms=ns.backend_latency_ms, jitter_ms=ns.backend_jitter_ms)
+        os.environ["CONVEX_URL"] = await standin.start()
+
+    import database as db
+
+    await db.init_db()
+    # Before workers start: their settings caches would not see a card added later
+    if not await db.get_next_active_card(ns.currency):
+        await db.add_card(f"4111 1111 1111 1111 ({ns.currency} loadtest)", active=True, currency=ns.currency)
+    if ns.workers:
+        from hosting import BotConfig
+        from sharding import Supervisor
+
+        build = functools.partial(
+            build_fake_bots, tg_latency_s=ns.tg_latency_ms / 1000, flood_control=ns.flood_control
+        )
+        supervisor = Supervisor([BotConfig(name="", token=BOT_TOKEN)], build, workers=ns.workers)
+        await supervisor.start()
+    test = LoadTest(
+        users=ns.users,
+        creators=ns.creators,
+        concurrency=ns.concurrency,
+        amount=ns.amount,
+        currency=ns.currency,
+        tg_latency_s=ns.tg_latency_ms / 1000,
+        flood_control=ns.flood_control,
+        supervisor=supervisor,
+    )
+    elapsed = await test.run()
+    print(test.report(elapsed))
+    if supervisor:
+        await supervisor.shutdown(timeout_s=10)
+    await db._get_db().close()
+    if standin:
+        await standin.stop()
+    if standin_proc:
+        standin_proc.terminate()
+        await standin_proc.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Drive simulated donors through the bot dispatcher.")
+    parser.add_argument("--users", type=int, default=1000, help="number of simulated donors")
+    parser.add_argument("--creators", type=int, default=20, help="number of distinct recipients")
+    parser.add_argument("--concurrency", type=int, default=100, help="flows in flight at once")
+    parser.add_argument("--amount", type=float, default=100.0)
+    parser.add_argument("--currency", default="USD")
+    parser.add_argument("--tg-latency-ms", type=float, default=0.0, help="simulated Bot API latency")
+    parser.add_argument("--flood-control", action="store_true", help="keep the flood-control middleware enabled")
+    parser.add_argument("--convex-url", default=None, help="overrides CONVEX_URL")
+    parser.add_argument("--local-backend", action="store_true", help="run against the in-process Convex stand-in")
+    parser.add_argument("--backend-latency-ms", type=float, default=0.0, help="stand-in latency per call")
+    parser.add_argument("--backend-jitter-ms", type=float, default=0.0, help="stand-in latency jitter")
+    parser.add_argument("--workers", type=int, default=0, help="route updates through N sharded worker processes")
+    ns = parser.parse_args()
+
+    if ns.convex_url:
+        os.environ["CONVEX_URL"] = ns.convex_url
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    asyncio.run(_main(ns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Event-loop health: scheduling lag, stalls with the stack that caused them, task census.
+
+A probe task sleeps ``LOOP_LAG_INTERVAL_MS`` at a time and measures how late it
+wakes up; that delay is how long any ready callback would have waited. Whenever a
+wake-up is ``LOOP_BLOCK_THRESHOLD_MS`` or more late, something held the loop. A
+watchdog thread notices the missing wake-up while the stall is still in progress
+and logs the loop thread's stack at that moment, which names the blocking call;
+the probe logs the stall's total length once the loop is back.
+
+Every ``LOOP_CENSUS_INTERVAL_S`` live tasks are counted by coroutine name, which
+shows tasks that pile up (unbounded fan-out, leaked background tasks); a warning
+lists the largest groups when the total passes ``LOOP_TASK_WARN``.
+
+Metrics: ``bot_event_loop_lag_seconds`` (latest probe), ``bot_event_loop_lag_max_seconds``
+(worst probe in the last census interval), ``bot_event_loop_stalls_total`` and
+``bot_asyncio_tasks{coro}``.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+import metrics
+from config import LOOP_BLOCK_THRESHOLD_MS, LOOP_CENSUS_INTERVAL_S, LOOP_LAG_INTERVAL_MS, LOOP_TASK_WARN
+
+logger = logging.getLogger(__name__)
+
+# Innermost frames kept in a stall report
+STACK_LIMIT = 30
+
+
+def task_census() -> Counter[str]:
+    """Live tasks of the running loop by coroutine qualified name."""
+    census: Counter[str] = Counter()
+    for task in asyncio.all_tasks():
+        coro = task.get_coro()
+        census[getattr(coro, "__qualname__", type(coro).__name__)] += 1
+    return census
+
+
+class LoopMonitor:
+    def __init__(
+        self,
+        *,
+        interval_s: float = LOOP_LAG_INTERVAL_MS / 1000,
+        block_threshold_s: float = LOOP_BLOCK_THRESHOLD_MS / 1000,
+        census_interval_s: float = LOOP_CENSUS_INTERVAL_S,
+        task_warn: int = LOOP_TASK_WARN,
+    ):
+        self.interval_s = interval_s
+        self.block_threshold_s = block_threshold_s
+        self.census_interval_s = census_interval_s
+        self.task_warn = task_warn
+        self._beat = 0.0  # monotonic time of the probe's last wake-up
+        self._window_max = 0.0
+        self._census: Counter[str] = Counter()
+        self._tasks: list[asyncio.Task] = []
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+        self.lag = metrics.gauge("bot_event_loop_lag_seconds", "How late the loop ran the latest lag probe")
+        self.lag_max = metrics.gauge(
+            "bot_event_loop_lag_max_seconds", "Worst lag probe during the last census interval"
+        )
+        self.stalls = metrics.counter(
+            "bot_event_loop_stalls_total", "Times the loop was blocked for at least LOOP_BLOCK_THRESHOLD_MS"
+        )
+        metrics.gauge("bot_asyncio_tasks", "Live asyncio tasks by coroutine", self._census_samples)
+
+    def _census_samples(self) -> dict[metrics.LabelKey, float]:
+        return {(("coro", name),): float(n) for name, n in self._census.items()}
+
+    def start(self) -> None:
+        """Start monitoring the running loop; a zero threshold disables the monitor."""
+        if self.block_threshold_s <= 0 or self._tasks:
+            return
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._tasks = [asyncio.create_task(self._probe()), asyncio.create_task(self._take_census())]
+        self._watchdog = threading.Thread(
+            target=self._watch, args=(threading.get_ident(),), name="loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+
+    async def _probe(self) -> None:
+        while True:
+            t0 = time.monotonic()
+            await asyncio.sleep(self.interval_s)
+            self._beat = now = time.monotonic()
+            lag = max(0.0, now - t0 - self.interval_s)
+            self.lag.set(lag)
+            self._window_max = max(self._window_max, lag)
+            if lag >= self.block_threshold_s:
+                self.stalls.inc()
+                logger.warning(f"Event loop was blocked for {lag * 1000:.0f} ms")
+
+    async def _take_census(self) -> None:
+        while True:
+            await asyncio.sleep(self.census_interval_s)
+            self.lag_max.set(self._window_max)
+            self._window_max = 0.0
+            self._census = task_census()
+            total = sum(self._census.values())
+            if total >= self.task_warn:
+                top = ", ".join(f"{name}={n}" for name, n in self._census.most_common(5))
+                logger.warning(f"{total} live asyncio tasks; largest groups: {top}")
+
+    def _watch(self, loop_thread: int) -> None:
+        reported = 0.0
+        poll_s = min(self.interval_s, self.block_threshold_s) / 2
+        while not self._stopped.wait(poll_s):
+            beat = self._beat
+            blocked_s = time.monotonic() - beat - self.interval_s
+            if blocked_s < self.block_threshold_s or beat == reported:
+                continue
+            # One report per stall, taken while the loop is still stuck
+            reported = beat
+            frame = sys._current_frames().get(loop_thread)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_list(traceback.extract_stack(frame)[-STACK_LIMIT:]))
+            logger.warning(f"Event loop blocked for {blocked_s * 1000:.0f} ms so far, in:\n{stack.rstrip()}")
+
+
+monitor = LoopMonitor()
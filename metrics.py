@@ -0,0 +1,119 @@
+"""Tiny in-process metrics registry with a Prometheus text endpoint.
+
+Counters and gauges are plain Python objects; ``render()`` produces the Prometheus
+exposition format and ``start_metrics_server()`` serves it on ``/metrics``.
+"""
+import logging
+from typing import Callable
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+def _label_key(labels: dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in key) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self.values: dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = _label_key(labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self.values.get(_label_key(labels), 0.0)
+
+    def samples(self) -> list[tuple[LabelKey, float]]:
+        return list(self.values.items())
+
+
+class Gauge:
+    """Gauge that is either set directly or sampled from a callback at render time."""
+
+    def __init__(self, name: str, help_text: str, callback: Callable[[], dict[LabelKey, float] | float] | None = None):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+        self.values: dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        self.values[_label_key(labels)] = value
+
+    def samples(self) -> list[tuple[LabelKey, float]]:
+        if self.callback is None:
+            return list(self.values.items())
+        value = self.callback()
+        if isinstance(value, dict):
+            return list(value.items())
+        return [((), float(value))]
+
+
+_REGISTRY: dict[str, Counter | Gauge] = {}
+
+
+def counter(name: str, help_text: str) -> Counter:
+    metric = _REGISTRY.get(name)
+    if metric is None:
+        metric = _REGISTRY[name] = Counter(name, help_text)
+    return metric  # type: ignore[return-value]
+
+
+def gauge(name: str, help_text: str, callback: Callable[[], dict[LabelKey, float] | float] | None = None) -> Gauge:
+    metric = _REGISTRY.get(name)
+    if metric is None:
+        metric = _REGISTRY[name] = Gauge(name, help_text, callback)
+    elif callback is not None:
+        metric.callback = callback  # type: ignore[union-attr]
+    return metric  # type: ignore[return-value]
+
+
+def render() -> str:
+    lines = []
+    for metric in _REGISTRY.values():
+        kind = "counter" if isinstance(metric, Counter) else "gauge"
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {kind}")
+        try:
+            samples = metric.samples()
+        except Exception as e:
+            logger.debug(f"Metric {metric.name} failed to sample: {e}")
+            continue
+        for key, value in samples:
+            lines.append(f"{metric.name}{_format_labels(key)} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+async def start_metrics_server(host: str, port: int, ready: Callable[[], bool] | None = None) -> web.AppRunner:
+    """Serve ``/metrics`` and, when ``ready`` is given, a ``/ready`` probe (200 or 503)."""
+
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=render(), content_type="text/plain")
+
+    async def handle_ready(request: web.Request) -> web.Response:
+        if ready():
+            return web.Response(text="ready\n")
+        return web.Response(status=503, text="not ready\n")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    if ready is not None:
+        gauge("bot_ready", "1 once warm-up finished and while not draining", lambda: float(ready()))
+        app.router.add_get("/ready", handle_ready)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics available on http://{host}:{port}/metrics")
+    return runner
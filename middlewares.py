@@ -1,9 +1,20 @@
-from typing import Any, Awaitable, Callable, Dict
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict
 
 from aiogram import BaseMiddleware
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
 from aiogram.types import Update
 
-from i18n import fetch_user_lang, is_lang_cached
+import callbacks
+import metrics
+from i18n import fetch_user_lang, is_lang_cached, t_for
+
+logger = logging.getLogger(__name__)
 
 
 class LanguageMiddleware(BaseMiddleware):
@@ -16,5 +27,210 @@ class LanguageMiddleware(BaseMiddleware):
         user = data.get("event_from_user")
         if user and not is_lang_cached(user.id):
             await fetch_user_lang(user.id)
-            
+
+        return await handler(event, data)
+
+
+# Approximate backend cost (Convex calls) of each inline button, keyed by callback
+# action name (see callbacks.py). Unlisted and unknown callbacks cost 1.
+DEFAULT_CALLBACK_COSTS: dict[str, float] = {
+    "menu_history": 2,
+    "menu_donate": 3,
+    "menu_profile": 2,
+    "menu_support": 2,
+    "donate_to": 4,
+    "currency": 3,
+    "lang": 3,
+    "approve": 3,
+    "reject": 3,
+    "card_toggle": 3,
+    "admin_toggle_currency": 3,
+}
+
+
+def parse_callback_costs(raw: str) -> dict[str, float]:
+    """Parse ``"menu_history=2,donate_to=4"`` into a cost table.
+
+    A trailing ``_`` (the old prefix syntax, ``donate_to_=4``) is ignored.
+    """
+    costs: dict[str, float] = {}
+    for item in raw.split(","):
+        key, sep, value = item.partition("=")
+        key = key.strip().rstrip("_")
+        if not sep or not key:
+            continue
+        try:
+            costs[key] = float(value)
+        except ValueError:
+            logger.warning(f"Ignoring invalid callback cost: {item!r}")
+    return costs
+
+
+@dataclass
+class TokenBucket:
+    rate: float
+    capacity: float
+    tokens: float
+    updated: float
+
+    def take(self, cost: float, now: float) -> bool:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+
+class FloodControlMiddleware(BaseMiddleware):
+    """Outer update middleware with per-user and global token buckets.
+
+    Throttled callbacks get a cheap ``callback.answer`` and never reach handlers
+    (so no backend calls); throttled messages are dropped silently.
+    """
+
+    def __init__(
+        self,
+        *,
+        user_rate: float = 2.0,
+        user_burst: float = 20.0,
+        global_rate: float = 300.0,
+        global_burst: float = 600.0,
+        callback_costs: dict[str, float] | None = None,
+        max_users: int = 50_000,
+    ):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_users = max_users
+        self.callback_costs = dict(DEFAULT_CALLBACK_COSTS if callback_costs is None else callback_costs)
+        self._global = TokenBucket(global_rate, global_burst, global_burst, time.monotonic())
+        self._users: OrderedDict[int, TokenBucket] = OrderedDict()
+        self.throttled = metrics.counter("bot_throttled_updates_total", "Updates rejected by flood control")
+        self.passed = metrics.counter("bot_flood_passed_updates_total", "Updates admitted by flood control")
+
+    def cost_of(self, event: Update) -> float:
+        callback = event.callback_query
+        if callback is None or not callback.data:
+            return 1.0
+        decoded = callbacks.decode(callback.data)
+        if decoded is None:
+            return 1.0
+        return self.callback_costs.get(decoded[0].name, 1.0)
+
+    def _user_bucket(self, user_id: int, now: float) -> TokenBucket:
+        bucket = self._users.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(self.user_rate, self.user_burst, self.user_burst, now)
+            self._users[user_id] = bucket
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+        return bucket
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        now = time.monotonic()
+        cost = self.cost_of(event)
+        kind = "callback" if event.callback_query else "message"
+        # Check the user bucket first so one flooding user cannot drain the global bucket.
+        if not self._user_bucket(user.id, now).take(cost, now):
+            return await self._reject(event, user.id, "user", kind)
+        if not self._global.take(cost, now):
+            return await self._reject(event, user.id, "global", kind)
+        self.passed.inc(kind=kind)
         return await handler(event, data)
+
+    async def _reject(self, event: Update, user_id: int, scope: str, kind: str) -> None:
+        self.throttled.inc(scope=scope, kind=kind)
+        if event.callback_query is not None:
+            try:
+                await event.callback_query.answer(t_for(user_id, "ALERT_TOO_FAST"))
+            except Exception as e:
+                logger.debug(f"Failed to answer throttled callback: {e}")
+        return None
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "tracked_users": len(self._users),
+            "throttled_user": sum(v for k, v in self.throttled.samples() if ("scope", "user") in k),
+            "throttled_global": sum(v for k, v in self.throttled.samples() if ("scope", "global") in k),
+            "passed": sum(v for _, v in self.passed.samples()),
+        }
+
+
+@dataclass
+class _Lane:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    depth: int = 0
+
+
+class PerUserEventIsolation(BaseEventIsolation):
+    """Runs one user's updates in arrival order and different users in parallel.
+
+    Plugged into the dispatcher as ``events_isolation``, so aiogram's FSM middleware
+    holds the lane for the whole handler, including ``FSMContext`` reads and writes.
+    ``asyncio.Lock`` wakes waiters FIFO, which keeps per-user order; a global
+    semaphore caps how many handlers run at once. Lanes are dropped when idle.
+    """
+
+    def __init__(self, max_concurrency: int = 100):
+        self.max_concurrency = max_concurrency
+        self._running = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self._lanes: dict[int, _Lane] = {}
+        self.active = 0
+        self.waited = metrics.counter("bot_update_queue_wait_seconds_total", "Time updates spent queued before running")
+        metrics.gauge("bot_update_queue_depth", "Queued or running updates per lane", self._depth_samples)
+
+    def depth(self, user_id: int) -> int:
+        lane = self._lanes.get(user_id)
+        return lane.depth if lane else 0
+
+    def stats(self) -> dict[str, int]:
+        depths = [lane.depth for lane in self._lanes.values()]
+        return {
+            "lanes": len(depths),
+            "queued": sum(depths) - self.active,
+            "running": self.active,
+            "max_depth": max(depths, default=0),
+        }
+
+    def _depth_samples(self) -> dict[metrics.LabelKey, float]:
+        stats = self.stats()
+        return {(("stat", name),): float(value) for name, value in stats.items()}
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        lane_key = key.user_id
+        lane = self._lanes.get(lane_key)
+        if lane is None:
+            lane = self._lanes[lane_key] = _Lane()
+        lane.depth += 1
+        t0 = time.monotonic()
+        try:
+            async with lane.lock:
+                if self._running is not None:
+                    await self._running.acquire()
+                self.waited.inc(time.monotonic() - t0)
+                self.active += 1
+                try:
+                    yield
+                finally:
+                    self.active -= 1
+                    if self._running is not None:
+                        self._running.release()
+        finally:
+            lane.depth -= 1
+            if lane.depth == 0 and self._lanes.get(lane_key) is lane:
+                del self._lanes[lane_key]
+
+    async def close(self) -> None:
+        self._lanes.clear()
@@ -0,0 +1,34 @@
+"""Amount formatting and conversion of per-currency totals to the reporting currency."""
+from config import REPORTING_CURRENCY
+
+CURRENCY_SYMBOLS = {"USD": "$", "UAH": "₴", "RUB": "₽"}
+
+
+def format_amount(amount: float, currency: str) -> str:
+    return f"{CURRENCY_SYMBOLS.get(currency, currency)} {float(amount):,.2f}"
+
+
+def normalize(by_currency: dict[str, float], rates: dict[str, float], base: str = REPORTING_CURRENCY) -> float | None:
+    """Sum of totals converted to ``base``; None if any non-zero total has no rate."""
+    total = 0.0
+    for currency, amount in by_currency.items():
+        if not amount:
+            continue
+        rate = 1.0 if currency == base else rates.get(currency)
+        if rate is None:
+            return None
+        total += amount * rate
+    return total
+
+
+def format_totals(by_currency: dict[str, float], rates: dict[str, float], base: str = REPORTING_CURRENCY) -> str:
+    """``₴ 1,200.00 + $ 50.00 ≈ $ 79.00``; the approximation is shown only when conversion happened."""
+    parts = {c: a for c, a in sorted(by_currency.items()) if a}
+    if not parts:
+        return format_amount(0, base)
+    text = " + ".join(format_amount(a, c) for c, a in parts.items())
+    if set(parts) != {base}:
+        total = normalize(parts, rates, base)
+        if total is not None:
+            text += f" ≈ {format_amount(total, base)}"
+    return text
@@ -0,0 +1,147 @@
+"""Sampling CPU profiler for the live process, behind the admin ``/cpuprofile`` command.
+
+A daemon thread wakes every ``PROFILER_INTERVAL_MS``, reads every other thread's
+current Python stack from ``sys._current_frames()`` and counts identical stacks.
+Nothing is installed in the profiled code, so the event loop runs at full speed;
+the cost is one stack walk per thread per tick, taken while the sampler holds the
+GIL. Samples where the loop thread sits in ``select`` are idle time.
+
+Results come out as collapsed stacks (``thread;outer;inner count`` per line, the
+input of flamegraph.pl and speedscope) or as a speedscope JSON document. One
+session runs at a time per process; ``profile()`` raises ``ProfilerBusy`` otherwise.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import CodeType, FrameType
+from typing import Any
+
+from config import PROFILER_INTERVAL_MS
+
+logger = logging.getLogger(__name__)
+
+Frame = tuple[str, str, int]  # qualified name, file, first line
+Stack = tuple[Frame, ...]  # outermost call first
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+class Profile:
+    def __init__(self, samples: Counter[tuple[str, Stack]], ticks: int, duration_s: float, interval_s: float):
+        self.samples = samples  # (thread name, stack) -> times seen
+        self.ticks = ticks
+        self.duration_s = duration_s
+        self.interval_s = interval_s
+
+    def collapsed(self) -> str:
+        lines = []
+        for (thread, stack), count in self.samples.most_common():
+            names = [thread, *(_label(frame) for frame in stack)]
+            lines.append(";".join(n.replace(";", ":") for n in names) + f" {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name: str) -> dict[str, Any]:
+        frames: list[dict[str, Any]] = []
+        index: dict[Frame, int] = {}
+        by_thread: dict[str, tuple[list[list[int]], list[float]]] = {}
+        for (thread, stack), count in self.samples.items():
+            ids = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                ids.append(index[frame])
+            stacks, weights = by_thread.setdefault(thread, ([], []))
+            stacks.append(ids)
+            weights.append(count * self.interval_s)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "donatebot profiler",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": thread,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": stacks,
+                    "weights": weights,
+                }
+                for thread, (stacks, weights) in by_thread.items()
+            ],
+        }
+
+
+def _label(frame: Frame) -> str:
+    qualname, filename, line = frame
+    return f"{qualname} ({os.path.basename(filename)}:{line})"
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, interval_s: float):
+        super().__init__(name="profiler", daemon=True)
+        self.interval_s = interval_s
+        self.samples: Counter[tuple[str, Stack]] = Counter()
+        self.ticks = 0
+        self._stop_event = threading.Event()
+        self._frames: dict[CodeType, Frame] = {}
+
+    def _stack(self, frame: FrameType | None) -> Stack:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            entry = self._frames.get(code)
+            if entry is None:
+                entry = self._frames[code] = (code.co_qualname, code.co_filename, code.co_firstlineno)
+            stack.append(entry)
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def run(self) -> None:
+        own = threading.get_ident()
+        next_tick = time.perf_counter()
+        while not self._stop_event.wait(max(0.0, next_tick - time.perf_counter())):
+            next_tick += self.interval_s
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self.samples[(names.get(ident, str(ident)), self._stack(frame))] += 1
+            self.ticks += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+_active: _Sampler | None = None
+
+
+def is_running() -> bool:
+    return _active is not None
+
+
+async def profile(duration_s: float, interval_s: float = PROFILER_INTERVAL_MS / 1000) -> Profile:
+    """Sample all threads of this process for ``duration_s`` seconds."""
+    global _active
+    if _active is not None:
+        raise ProfilerBusy("a profiling session is already running")
+    sampler = _active = _Sampler(interval_s)
+    started = time.perf_counter()
+    sampler.start()
+    logger.info(f"CPU profiling for {duration_s:g}s every {interval_s * 1000:g}ms")
+    try:
+        await asyncio.sleep(duration_s)
+    finally:
+        # Joining blocks for at most one stack walk
+        sampler.stop()
+        _active = None
+    return Profile(sampler.samples, sampler.ticks, time.perf_counter() - started, interval_s)
@@ -0,0 +1,97 @@
+"""Duplicate receipt detection: perceptual hashes of proof photos.
+
+Decoding and resizing an image takes tens of milliseconds of CPU, so hashing runs in
+a ``ProcessPoolExecutor`` and never blocks the event loop. Requires Pillow
+(``pip install Pillow``); without it the feature logs a warning and stays off.
+
+``downloader`` fetches the photo bytes; replace it to run offline:
+
+    receipts.downloader = lambda bot, file_id: fixtures[file_id]
+"""
+import asyncio
+import importlib.util
+import io
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable
+
+from aiogram import Bot
+
+import database as db
+from config import RECEIPT_HASH_WORKERS, RECEIPT_HASHING_ENABLED, RECEIPT_MAX_BAND_ROWS, RECEIPT_MAX_DISTANCE
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 8  # 8x8 difference bits -> 64-bit hash
+
+
+async def telegram_download(bot: Bot, file_id: str) -> bytes:
+    buffer = await bot.download(file_id)
+    return buffer.read() if buffer else b""
+
+
+downloader: Callable[[Bot, str], Awaitable[bytes]] = telegram_download
+
+_pool: ProcessPoolExecutor | None = None
+_enabled: bool | None = None
+
+
+def dhash(data: bytes, size: int = HASH_SIZE) -> str:
+    """Difference hash: one bit per horizontally adjacent pixel pair of a grayscale thumbnail."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as img:
+        pixels = list(img.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS).getdata())
+    bits = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{bits:0{size * size // 4}x}"
+
+
+def _noop() -> None:
+    return None
+
+
+def enabled() -> bool:
+    global _enabled
+    if _enabled is None:
+        _enabled = RECEIPT_HASHING_ENABLED and importlib.util.find_spec("PIL") is not None
+        if RECEIPT_HASHING_ENABLED and not _enabled:
+            logger.warning("RECEIPT_HASHING_ENABLED is set but Pillow is not installed; duplicate detection is off")
+    return _enabled
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=RECEIPT_HASH_WORKERS)
+    return _pool
+
+
+async def warm_up() -> None:
+    """Start the worker processes so the first receipt does not pay for the spawn."""
+    if not enabled():
+        return
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(loop.run_in_executor(_get_pool(), _noop) for _ in range(RECEIPT_HASH_WORKERS)))
+
+
+async def compute_hash(data: bytes) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), dhash, data)
+
+
+async def check_receipt(bot: Bot, file_id: str, transaction_id: int, user_id: int) -> list[tuple[int, int, int]]:
+    """Hash the proof, store it and return earlier near-duplicates as (tx_id, user_id, distance)."""
+    data = await downloader(bot, file_id)
+    phash = await compute_hash(data)
+    return await db.record_receipt_hash(transaction_id, user_id, phash, RECEIPT_MAX_DISTANCE, RECEIPT_MAX_BAND_ROWS)
+
+
+async def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        # Joining the worker processes can take a while; keep the loop free meanwhile
+        await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
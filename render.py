@@ -0,0 +1,128 @@
+"""Screen rendering that skips edits which would not change the message.
+
+``show`` remembers a hash of the text and inline keyboard it last put on each
+(bot, chat, message). An edit to the same content is skipped without calling
+Telegram. Telegram's "message is not modified" counts as success. A new message
+is sent only when Telegram refuses the edit itself, e.g. the message was deleted
+or has no text. Network and server errors are not retried as a second message,
+because the edit may already have been applied.
+
+The hashes live in this process; updates from one user are always handled by
+the same process, so the cache never sees another process's edits.
+"""
+import logging
+from collections import OrderedDict
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup, Message
+
+import metrics
+from config import RENDER_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+_Key = tuple[int, int, int]
+
+_rendered: OrderedDict[_Key, tuple[int, int]] = OrderedDict()
+_results = metrics.counter("bot_render_total", "Message renders by result")
+
+
+def _key(message: Message) -> _Key:
+    return (message.bot.id if message.bot else 0, message.chat.id, message.message_id)
+
+
+def _markup_hash(markup: InlineKeyboardMarkup | None) -> int:
+    return 0 if markup is None else hash(markup.model_dump_json(exclude_none=True))
+
+
+def _remember(key: _Key, text_hash: int, markup_hash: int) -> None:
+    _rendered[key] = (text_hash, markup_hash)
+    _rendered.move_to_end(key)
+    if len(_rendered) > RENDER_CACHE_SIZE:
+        _rendered.popitem(last=False)
+
+
+def forget(message: Message) -> None:
+    """Drop the remembered content, e.g. after editing the message some other way."""
+    _rendered.pop(_key(message), None)
+
+
+async def show(
+    message: Message,
+    text: str,
+    *,
+    reply_markup: InlineKeyboardMarkup | None = None,
+    parse_mode: str | None = None,
+    edit: bool = True,
+    fallback: bool = True,
+) -> bool:
+    """Put ``text``/``reply_markup`` on ``message`` (or a new message if ``edit`` is false).
+
+    Returns False if nothing could be shown.
+    """
+    text_hash = hash((text, parse_mode))
+    markup_hash = _markup_hash(reply_markup)
+    if edit:
+        key = _key(message)
+        if _rendered.get(key) == (text_hash, markup_hash):
+            _rendered.move_to_end(key)
+            _results.inc(result="skipped")
+            return True
+        try:
+            await message.edit_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+            _remember(key, text_hash, markup_hash)
+            _results.inc(result="edited")
+            return True
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                _remember(key, text_hash, markup_hash)
+                _results.inc(result="not_modified")
+                return True
+            _rendered.pop(key, None)
+            if not fallback:
+                _results.inc(result="failed")
+                return False
+            logger.debug(f"Cannot edit message {key}, sending a new one: {e}")
+        except Exception as e:
+            _rendered.pop(key, None)
+            _results.inc(result="failed")
+            logger.warning(f"Failed to edit message {key}: {e!r}")
+            return False
+    try:
+        sent = await message.answer(text, parse_mode=parse_mode, reply_markup=reply_markup)
+    except Exception as e:
+        _results.inc(result="failed")
+        logger.warning(f"Failed to send message to chat {message.chat.id}: {e!r}")
+        return False
+    if isinstance(sent, Message):
+        _remember(_key(sent), text_hash, markup_hash)
+    _results.inc(result="sent")
+    return True
+
+
+async def show_markup(message: Message, reply_markup: InlineKeyboardMarkup | None) -> bool:
+    """Replace only the inline keyboard of ``message``."""
+    key = _key(message)
+    markup_hash = _markup_hash(reply_markup)
+    remembered = _rendered.get(key)
+    if remembered is not None and remembered[1] == markup_hash:
+        _results.inc(result="skipped")
+        return True
+    try:
+        await message.edit_reply_markup(reply_markup=reply_markup)
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            _rendered.pop(key, None)
+            _results.inc(result="failed")
+            return False
+        _results.inc(result="not_modified")
+    except Exception as e:
+        _rendered.pop(key, None)
+        _results.inc(result="failed")
+        logger.warning(f"Failed to edit keyboard of message {key}: {e!r}")
+        return False
+    else:
+        _results.inc(result="edited")
+    if remembered is not None:
+        _remember(key, remembered[0], markup_hash)
+    return True
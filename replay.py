@@ -0,0 +1,199 @@
+"""Replay captured traffic (see capture.py) through the dispatcher, 1x to 100x speed.
+
+Reads one or more capture files (rotated and per-worker files merge by timestamp)
+and feeds the updates to ``bot.create_dispatcher()`` dispatchers at the recorded
+pace divided by ``--speed``, with Telegram faked as in ``loadtest.py``. The backend
+is the in-process Convex stand-in unless ``--convex-url`` is given. The report gives
+latency percentiles per kind of update (command, text, photo, callback action) and
+how far the replay fell behind schedule, which shows when the harness itself is
+the bottleneck.
+
+Buttons that point at transactions or cards (approve, reject, card toggles) carry
+production ids and mostly find nothing in a fresh stand-in; they still exercise
+the lookup and the reply.
+
+    python replay.py capture.jsonl.2 capture.jsonl.1 capture.jsonl --speed 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter, defaultdict
+from typing import Any
+
+from aiogram import Bot
+from aiogram.types import Update
+
+import callbacks as cb
+from loadtest import BOT_ID, FakeSession, percentile
+
+logger = logging.getLogger(__name__)
+
+
+def load_records(paths: list[str]) -> list[dict[str, Any]]:
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    logger.warning(f"{path}:{line_no}: skipping malformed line")
+    records.sort(key=lambda r: r["t"])
+    return records
+
+
+def kind_of(update: dict[str, Any]) -> str:
+    if "callback_query" in update:
+        decoded = cb.decode(update["callback_query"].get("data"))
+        return f"callback:{decoded[0].name if decoded else 'unknown'}"
+    message = update.get("message")
+    if message is None:
+        return next((k for k in update if k != "update_id"), "unknown")
+    text = message.get("text")
+    if text is not None:
+        return text.split(" ", 1)[0].split("@", 1)[0] if text.startswith("/") else "text"
+    if "photo" in message:
+        return "photo"
+    return "message"
+
+
+class Replay:
+    def __init__(self, records: list[dict[str, Any]], *, speed: float, flood_control: bool):
+        from bot import create_dispatcher
+        from hosting import BotConfig
+        from tracing import tracer
+
+        # Latencies are reported per kind below; per-update slow logs would drown them
+        tracer.slow_update_ms = float("inf")
+        self.records = records
+        self.speed = speed
+        self.bots: dict[str, tuple[Bot, Any]] = {}
+        for i, name in enumerate(sorted({r.get("bot", "") for r in records})):
+            # Admin rights go to the (pseudonymous) user who acted as admin in the capture
+            admin_id = next(
+                (_sender(r["update"]) for r in records if r.get("admin") and r.get("bot", "") == name), None
+            )
+            config = BotConfig(name=name, token=f"{BOT_ID + i}:replay", admin_id=admin_id)
+            bot = Bot(token=config.token, session=FakeSession())
+            self.bots[name] = (bot, create_dispatcher(config, flood_control=flood_control))
+        self.latencies: defaultdict[str, list[float]] = defaultdict(list)
+        self.lag_ms: list[float] = []
+        self.fed_s = 0.0
+        self.errors = 0
+
+    async def _feed(self, bot: Bot, dp: Any, update: Update, kind: str) -> None:
+        t0 = time.perf_counter()
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            self.errors += 1
+            logger.debug(f"Update {update.update_id} failed: {e}")
+        self.latencies[kind].append((time.perf_counter() - t0) * 1000)
+
+    async def run(self) -> float:
+        tasks = []
+        first_t = self.records[0]["t"]
+        t0 = time.perf_counter()
+        for record in self.records:
+            due = (record["t"] - first_t) / self.speed
+            delay = due - (time.perf_counter() - t0)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.lag_ms.append(max(0.0, -delay) * 1000)
+            bot, dp = self.bots[record.get("bot", "")]
+            update = Update.model_validate(record["update"], context={"bot": bot})
+            # Concurrent like polling; the dispatcher keeps each user's updates in order
+            tasks.append(asyncio.create_task(self._feed(bot, dp, update, kind_of(record["update"]))))
+        self.fed_s = time.perf_counter() - t0
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - t0
+
+    def report(self, elapsed_s: float) -> str:
+        span_s = self.records[-1]["t"] - self.records[0]["t"]
+        all_lat = [x for xs in self.latencies.values() for x in xs]
+        lines = [
+            f"updates: {len(self.records)} replayed in {elapsed_s:.2f}s "
+            f"(captured over {span_s:.1f}s and fed in {self.fed_s:.2f}s: "
+            f"{span_s / max(self.fed_s, 1e-9):.1f}x achieved at --speed {self.speed:g})",
+            f"errors: {self.errors}, schedule lag p50/p99/max ms: {percentile(self.lag_ms, 50):.1f}/"
+            f"{percentile(self.lag_ms, 99):.1f}/{max(self.lag_ms, default=0):.1f}",
+            f"{'kind':<28} {'n':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}",
+        ]
+        rows = sorted(self.latencies.items(), key=lambda kv: -len(kv[1])) + [("ALL", all_lat)]
+        for kind, xs in rows:
+            lines.append(
+                f"{kind:<28} {len(xs):>7} {percentile(xs, 50):>9.2f} {percentile(xs, 95):>9.2f} "
+                f"{percentile(xs, 99):>9.2f} {max(xs, default=0):>9.2f}"
+            )
+        telegram: Counter[str] = Counter()
+        for bot, _ in self.bots.values():
+            telegram.update(bot.session.calls)
+        lines.append(f"telegram methods: {dict(telegram)}")
+        return "\n".join(lines)
+
+
+def _sender(update: dict[str, Any]) -> int | None:
+    for event in update.values():
+        if isinstance(event, dict) and isinstance(event.get("from"), dict):
+            return event["from"]["id"]
+    return None
+
+
+async def _main(ns: argparse.Namespace) -> None:
+    records = load_records(ns.files)
+    if ns.limit:
+        records = records[: ns.limit]
+    if not records:
+        print("No updates to replay")
+        return
+
+    standin = None
+    if ns.convex_url:
+        os.environ["CONVEX_URL"] = ns.convex_url
+    else:
+        from convex_standin import ConvexStandIn
+
+        standin = ConvexStandIn(latency_ms=ns.backend_latency_ms, jitter_ms=ns.backend_jitter_ms)
+        os.environ["CONVEX_URL"] = await standin.start()
+
+    import database as db
+
+    await db.init_db()
+    if standin:
+        # Donation flows stop early without a card for the chosen currency
+        for currency in db.SUPPORTED_CURRENCIES:
+            await db.add_card(f"4111 1111 1111 1111 ({currency} replay)", active=True, currency=currency)
+
+    replay = Replay(records, speed=ns.speed, flood_control=ns.flood_control)
+    elapsed = await replay.run()
+    print(replay.report(elapsed))
+    await db.close_db()
+    if standin:
+        await standin.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay captured updates through the bot dispatcher.")
+    parser.add_argument("files", nargs="+", help="capture files; rotated and per-worker files are merged by time")
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression, e.g. 10 for 10x (1-100)")
+    parser.add_argument("--limit", type=int, default=0, help="replay only the first N updates")
+    parser.add_argument("--flood-control", action="store_true", help="keep the flood-control middleware enabled")
+    parser.add_argument("--convex-url", default=None, help="replay against this backend instead of the stand-in")
+    parser.add_argument("--backend-latency-ms", type=float, default=0.0, help="stand-in latency per call")
+    parser.add_argument("--backend-jitter-ms", type=float, default=0.0, help="stand-in latency jitter")
+    ns = parser.parse_args()
+    if not 1 <= ns.speed <= 100:
+        parser.error("--speed must be between 1 and 100")
+
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    asyncio.run(_main(ns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,536 @@
+"""Sharded workers: one supervisor polls Telegram, N processes handle the updates.
+
+One event loop caps update handling at one CPU core (JSON parsing, pydantic models,
+rendering). With ``SHARD_WORKERS`` set, ``bot.py`` runs a ``Supervisor`` instead of
+the dispatchers: it long-polls every hosted bot with plain ``getUpdates`` calls and
+hands each update, still a dict, to worker ``hash(user_id) % N``. All updates of a
+user reach the same worker in order, so per-process state (FSM data, per-user lanes
+and flood buckets, the render cache) stays consistent.
+
+Workers are spawned processes running the usual dispatchers. They talk to the
+supervisor over a Unix socket in length-prefixed pickle frames:
+
+* health: a worker sends a heartbeat every ``SHARD_HEARTBEAT_S``. One that exits or
+  goes quiet for ``SHARD_HEARTBEAT_TIMEOUT_S`` is killed and restarted with backoff.
+* state handoff: FSM data lives in ``CheckpointStorage``. Changed records are sent
+  every ``SHARD_CHECKPOINT_S`` and on exit, and a restarted worker starts from its
+  shard's last checkpoint.
+* delivery: the supervisor keeps each update until its worker reports it handled and
+  resends unfinished ones to the restarted worker. An update is tried at most
+  ``MAX_DELIVERIES`` times, so one that crashes workers cannot crash-loop a shard.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import shutil
+import signal
+import struct
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+import aiohttp
+from aiogram.client.telegram import PRODUCTION
+from aiogram.fsm.storage.base import StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage, MemoryStorageRecord
+from aiohttp import web
+
+import metrics
+from config import (
+    METRICS_HOST,
+    METRICS_PORT,
+    SHARD_CHECKPOINT_S,
+    SHARD_HEARTBEAT_S,
+    SHARD_HEARTBEAT_TIMEOUT_S,
+    SHARD_WORKERS,
+    SHUTDOWN_TIMEOUT_S,
+)
+from hosting import BotConfig, HostedBot
+from lifecycle import shutdown, warm_up
+from loopmonitor import monitor
+
+try:
+    import orjson  # optional: faster decoding of getUpdates batches
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+MAX_DELIVERIES = 2
+POLL_TIMEOUT_S = 10
+# Spawning a worker and importing aiogram can take a while; heartbeats are due once it has connected
+STARTUP_TIMEOUT_S = 60
+_RESTART_DELAYS_S = (1, 2, 5, 10, 30)
+_HEADER = struct.Struct("!I")
+
+# (state, data) of one FSM record; None in a checkpoint means the record was cleared
+Record = tuple[str | None, dict[str, Any]]
+Build = Callable[[Callable[[], MemoryStorage]], list[HostedBot]]
+
+_worker_count = 1
+
+
+def worker_count() -> int:
+    """Processes sharing the updates; 1 unless this is a sharded worker."""
+    return _worker_count
+
+
+def shard_of(user_id: int, shards: int) -> int:
+    # int hashes are not randomized per process, so every process agrees
+    return hash(user_id) % shards
+
+
+def update_user_id(update: dict[str, Any]) -> int:
+    """The user (or chat) a raw Bot API update belongs to; 0 if it has neither."""
+    for key, event in update.items():
+        if key == "update_id" or not isinstance(event, dict):
+            continue
+        user = event.get("from") or event.get("user")
+        if user:
+            return int(user["id"])
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat:
+            return int(chat["id"])
+    return 0
+
+
+def _send(writer: asyncio.StreamWriter, msg: tuple[Any, ...]) -> None:
+    data = pickle.dumps(msg, protocol=pickle.HIGHEST_PROTOCOL)
+    writer.write(_HEADER.pack(len(data)) + data)
+
+
+async def _recv(reader: asyncio.StreamReader) -> tuple[Any, ...]:
+    (size,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    return pickle.loads(await reader.readexactly(size))
+
+
+class CheckpointStorage(MemoryStorage):
+    """``MemoryStorage`` that tracks which records changed since the last checkpoint."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._dirty: set[StorageKey] = set()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await super().set_state(key, state)
+        self._dirty.add(key)
+
+    async def set_data(self, key: StorageKey, data: Any) -> None:
+        await super().set_data(key, data)
+        self._dirty.add(key)
+
+    def take_changes(self) -> dict[StorageKey, Record | None]:
+        changes: dict[StorageKey, Record | None] = {}
+        for key in self._dirty:
+            record = self.storage.get(key)
+            empty = record is None or (record.state is None and not record.data)
+            changes[key] = None if empty else (record.state, record.data)
+        self._dirty.clear()
+        return changes
+
+    def restore(self, records: dict[StorageKey, Record]) -> None:
+        for key, (state, data) in records.items():
+            self.storage[key] = MemoryStorageRecord(data=dict(data), state=state)
+
+
+class _Worker:
+    def __init__(self, shard: int, address: str, build: Build):
+        self.shard = shard
+        self.address = address
+        self.build = build
+        self.by_name: dict[str, HostedBot] = {}
+        self._writer: asyncio.StreamWriter | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    def _reply(self, msg: tuple[Any, ...]) -> None:
+        if self._writer is not None and not self._writer.is_closing():
+            _send(self._writer, msg)
+
+    def _checkpoint(self) -> None:
+        changes = {}
+        for name, h in self.by_name.items():
+            if isinstance(h.dp.storage, CheckpointStorage):
+                records = h.dp.storage.take_changes()
+                if records:
+                    changes[name] = records
+        if changes:
+            self._reply(("checkpoint", changes))
+
+    def _heartbeat(self) -> None:
+        self._reply(("heartbeat", sum(h.dp.inflight for h in self.by_name.values())))
+
+    async def _every(self, interval_s: float, fn: Callable[[], None]) -> None:
+        while True:
+            await asyncio.sleep(interval_s)
+            fn()
+
+    async def _handle(self, seq: int, name: str, update: dict[str, Any]) -> None:
+        h = self.by_name[name]
+        try:
+            await h.dp.feed_raw_update(h.bot, update)
+        except Exception:
+            logger.exception(f"Shard {self.shard} failed to handle update {update.get('update_id')}")
+        finally:
+            self._reply(("done", seq))
+
+    async def run(self) -> None:
+        reader, self._writer = await asyncio.open_unix_connection(self.address)
+        hosted = self.build(CheckpointStorage)
+        self.by_name = {h.config.name: h for h in hosted}
+        self._reply(("hello", self.shard, os.getpid()))
+        background = [
+            asyncio.create_task(self._every(SHARD_HEARTBEAT_S, self._heartbeat)),
+            asyncio.create_task(self._every(SHARD_CHECKPOINT_S, self._checkpoint)),
+        ]
+        metrics_runner = None
+        drain_timeout_s = SHUTDOWN_TIMEOUT_S
+        try:
+            _, checkpoint = await _recv(reader)
+            for name, records in checkpoint.items():
+                if name in self.by_name and isinstance(self.by_name[name].dp.storage, CheckpointStorage):
+                    self.by_name[name].dp.storage.restore(records)
+            if METRICS_PORT:
+                metrics_runner = await metrics.start_metrics_server(METRICS_HOST, METRICS_PORT + 1 + self.shard)
+            await warm_up(hosted)
+            self._reply(("ready", {h.config.name: h.dp.resolve_used_update_types() for h in hosted}))
+
+            while True:
+                msg = await _recv(reader)
+                if msg[0] == "update":
+                    _, seq, name, update = msg
+                    task = asyncio.create_task(self._handle(seq, name, update))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                elif msg[0] == "drain":
+                    drain_timeout_s = msg[1]
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            logger.warning(f"Shard {self.shard} lost the supervisor; draining")
+        finally:
+            await shutdown(hosted, timeout_s=drain_timeout_s, metrics_runner=metrics_runner, confirm_updates=False)
+            for task in background:
+                task.cancel()
+            self._checkpoint()
+            self._reply(("bye",))
+            try:
+                await self._writer.drain()
+                self._writer.close()
+            except ConnectionError:
+                pass
+
+
+def worker_main(shard: int, shards: int, address: str, build: Build) -> None:
+    """Entry point of a worker process; ``build`` creates its bots with the given FSM storage."""
+    global _worker_count
+    _worker_count = shards
+    # Ctrl-C reaches the whole process group; only the supervisor decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_Worker(shard, address, build).run())
+
+
+@dataclass
+class _Pending:
+    bot: str
+    update: dict[str, Any]
+    done: asyncio.Future
+    deliveries: int = 0
+
+
+@dataclass
+class _Shard:
+    index: int
+    process: multiprocessing.process.BaseProcess | None = None
+    writer: asyncio.StreamWriter | None = None
+    ready: bool = False
+    last_seen: float = 0.0
+    inflight: int = 0
+    failures: int = 0  # consecutive, for the restart backoff
+    restart_at: float = 0.0
+    checkpoint: dict[str, dict[StorageKey, Record]] = field(default_factory=dict)
+    pending: dict[int, _Pending] = field(default_factory=dict)
+
+
+class Supervisor:
+    """Spawns the workers, routes updates to them and restarts the ones that fail."""
+
+    def __init__(self, configs: list[BotConfig], build: Build, *, workers: int = SHARD_WORKERS):
+        if workers < 1:
+            raise ValueError("Supervisor needs at least one worker")
+        self.configs = configs
+        self.build = build
+        self.shards = [_Shard(i) for i in range(workers)]
+        self._ctx = multiprocessing.get_context("spawn")
+        self._dir = tempfile.mkdtemp(prefix="donatebot-shards-")
+        self.address = os.path.join(self._dir, "supervisor.sock")
+        self._seq = itertools.count(1)
+        self._server: asyncio.AbstractServer | None = None
+        self._monitor_task: asyncio.Task | None = None
+        self._http: aiohttp.ClientSession | None = None
+        self._stopping = False
+        self._offsets: dict[str, int] = {}
+        self._update_types: dict[str, list[str]] = {}
+        self._restarts = metrics.counter("bot_shard_restarts_total", "Worker processes restarted after a crash or hang")
+        self._handled = metrics.counter("bot_shard_updates_total", "Updates by worker shard and outcome")
+        metrics.gauge("bot_shard_pending", "Updates routed to a shard and not yet handled", self._pending_samples)
+        metrics.gauge("bot_shard_up", "1 while a shard's worker is connected and warm", self._up_samples)
+
+    def _pending_samples(self) -> dict[metrics.LabelKey, float]:
+        return {(("shard", str(s.index)),): float(len(s.pending)) for s in self.shards}
+
+    def _up_samples(self) -> dict[metrics.LabelKey, float]:
+        return {(("shard", str(s.index)),): float(s.ready) for s in self.shards}
+
+    def is_ready(self) -> bool:
+        return not self._stopping and all(s.ready for s in self.shards)
+
+    async def start(self, timeout_s: float = 120.0) -> None:
+        """Spawn every worker and wait until all of them have warmed up."""
+        # Routing and polling share this loop; workers start their own monitor in warm_up
+        monitor.start()
+        self._server = await asyncio.start_unix_server(self._serve, path=self.address)
+        for shard in self.shards:
+            self._spawn(shard)
+        self._monitor_task = asyncio.create_task(self._monitor())
+        deadline = time.monotonic() + timeout_s
+        while not self.is_ready():
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Workers not ready after {timeout_s:g}s")
+            await asyncio.sleep(0.05)
+        logger.info(f"All {len(self.shards)} workers ready")
+
+    def _spawn(self, shard: _Shard) -> None:
+        shard.process = self._ctx.Process(
+            target=worker_main,
+            args=(shard.index, len(self.shards), self.address, self.build),
+            name=f"shard-{shard.index}",
+        )
+        shard.process.start()
+        shard.last_seen = time.monotonic()
+        logger.info(f"Started shard {shard.index} as pid {shard.process.pid}")
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        shard: _Shard | None = None
+        try:
+            _, index, pid = await _recv(reader)
+            shard = self.shards[index]
+            if shard.process is None or shard.process.pid != pid:
+                logger.warning(f"Ignoring connection from stale worker pid {pid} of shard {index}")
+                writer.close()
+                return
+            shard.writer = writer
+            shard.last_seen = time.monotonic()
+            _send(writer, ("restore", shard.checkpoint))
+            while True:
+                msg = await _recv(reader)
+                shard.last_seen = time.monotonic()
+                kind = msg[0]
+                if kind == "done":
+                    item = shard.pending.pop(msg[1], None)
+                    if item is not None and not item.done.done():
+                        item.done.set_result(True)
+                        self._handled.inc(shard=str(shard.index), result="handled")
+                elif kind == "heartbeat":
+                    shard.inflight = msg[1]
+                elif kind == "checkpoint":
+                    self._merge_checkpoint(shard, msg[1])
+                elif kind == "ready":
+                    self._update_types.update(msg[1])
+                    shard.ready = True
+                    shard.failures = 0
+                    self._redeliver(shard)
+                elif kind == "bye":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if shard is not None and shard.writer is writer:
+                shard.writer = None
+                shard.ready = False
+            writer.close()
+
+    @staticmethod
+    def _merge_checkpoint(shard: _Shard, changes: dict[str, dict[StorageKey, Record | None]]) -> None:
+        for bot, records in changes.items():
+            stored = shard.checkpoint.setdefault(bot, {})
+            for key, record in records.items():
+                if record is None:
+                    stored.pop(key, None)
+                else:
+                    stored[key] = record
+
+    def _deliver(self, shard: _Shard, seq: int, item: _Pending) -> None:
+        item.deliveries += 1
+        _send(shard.writer, ("update", seq, item.bot, item.update))
+
+    def _redeliver(self, shard: _Shard) -> None:
+        for seq, item in list(shard.pending.items()):
+            if item.deliveries >= MAX_DELIVERIES:
+                logger.error(
+                    f"Dropping update {item.update.get('update_id')} of bot {item.bot or 'default'}: "
+                    f"shard {shard.index} failed while handling it {item.deliveries} times"
+                )
+                del shard.pending[seq]
+                item.done.set_result(False)
+                self._handled.inc(shard=str(shard.index), result="dropped")
+            else:
+                self._deliver(shard, seq, item)
+
+    def submit(self, bot: str, update: dict[str, Any]) -> asyncio.Future:
+        """Route a raw update to its user's worker; the future resolves to False if it was dropped."""
+        shard = self.shards[shard_of(update_user_id(update), len(self.shards))]
+        seq = next(self._seq)
+        item = _Pending(bot, update, asyncio.get_running_loop().create_future())
+        shard.pending[seq] = item
+        if shard.ready:
+            self._deliver(shard, seq, item)
+        return item.done
+
+    async def feed(self, bot: str, update: dict[str, Any]) -> bool:
+        """``submit`` and wait until the update has been handled."""
+        return await self.submit(bot, update)
+
+    async def _flush(self) -> None:
+        writers = [s.writer for s in self.shards if s.writer is not None]
+        try:
+            await asyncio.gather(*(w.drain() for w in writers))
+        except ConnectionError:
+            pass  # the monitor restarts the worker; its updates stay pending
+
+    async def _monitor(self) -> None:
+        while True:
+            await asyncio.sleep(SHARD_HEARTBEAT_S)
+            now = time.monotonic()
+            for shard in self.shards:
+                proc = shard.process
+                if proc is not None and proc.is_alive():
+                    limit_s = SHARD_HEARTBEAT_TIMEOUT_S if shard.writer is not None else STARTUP_TIMEOUT_S
+                    if now - shard.last_seen > limit_s and not self._stopping:
+                        logger.error(
+                            f"Shard {shard.index} (pid {proc.pid}) sent nothing for "
+                            f"{now - shard.last_seen:.0f}s; killing it"
+                        )
+                        proc.kill()
+                    continue
+                if self._stopping:
+                    continue
+                if proc is not None:
+                    delay = _RESTART_DELAYS_S[min(shard.failures, len(_RESTART_DELAYS_S) - 1)]
+                    logger.error(
+                        f"Shard {shard.index} (pid {proc.pid}) exited with code {proc.exitcode}; "
+                        f"restarting in {delay}s with {len(shard.pending)} pending updates"
+                    )
+                    shard.process = None
+                    shard.ready = False
+                    shard.failures += 1
+                    shard.restart_at = now + delay
+                    self._restarts.inc(shard=str(shard.index))
+                elif now >= shard.restart_at:
+                    self._spawn(shard)
+
+    async def _poll_bot(self, config: BotConfig) -> None:
+        url = PRODUCTION.api_url(token=config.token, method="getUpdates")
+        name = config.name or "default"
+        backoff_s = 1.0
+        while True:
+            payload: dict[str, Any] = {"timeout": POLL_TIMEOUT_S}
+            if config.name in self._update_types:
+                payload["allowed_updates"] = self._update_types[config.name]
+            if config.name in self._offsets:
+                payload["offset"] = self._offsets[config.name]
+            try:
+                async with self._http.post(
+                    url, json=payload, timeout=aiohttp.ClientTimeout(total=POLL_TIMEOUT_S + 10)
+                ) as resp:
+                    body = await resp.read()
+                result = orjson.loads(body) if orjson is not None else json.loads(body)
+                if not result.get("ok"):
+                    retry_after = (result.get("parameters") or {}).get("retry_after")
+                    if retry_after:
+                        backoff_s = float(retry_after)
+                    raise RuntimeError(result.get("description") or f"HTTP {resp.status}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"getUpdates for bot {name} failed: {e}; retrying in {backoff_s:g}s")
+                await asyncio.sleep(backoff_s)
+                backoff_s = min(backoff_s * 2, 30.0)
+                continue
+            backoff_s = 1.0
+            for update in result["result"]:
+                self._offsets[config.name] = update["update_id"] + 1
+                self.submit(config.name, update)
+            await self._flush()
+
+    async def poll(self) -> None:
+        """Poll every bot and route its updates until SIGTERM/SIGINT."""
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        self._http = self._http or aiohttp.ClientSession()
+        pollers = [asyncio.create_task(self._poll_bot(c)) for c in self.configs]
+        try:
+            await stop.wait()
+            logger.warning("Received stop signal")
+        finally:
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.remove_signal_handler(sig)
+            for task in pollers:
+                task.cancel()
+            await asyncio.gather(*pollers, return_exceptions=True)
+
+    async def _confirm(self, config: BotConfig) -> None:
+        # The last batch is only confirmed by the next getUpdates; stop short of anything unhandled
+        offset = self._offsets.get(config.name)
+        if offset is None or self._http is None:
+            return
+        unhandled = [
+            item.update["update_id"] for s in self.shards for item in s.pending.values() if item.bot == config.name
+        ]
+        if unhandled:
+            offset = min(unhandled)
+            logger.warning(f"{len(unhandled)} updates of bot {config.name or 'default'} unhandled; they will be redelivered")
+        url = PRODUCTION.api_url(token=config.token, method="getUpdates")
+        try:
+            async with self._http.post(url, json={"offset": offset, "limit": 1, "timeout": 0}) as resp:
+                await resp.read()
+        except Exception as e:
+            logger.warning(f"Failed to confirm handled updates of bot {config.name or 'default'}: {e}")
+
+    async def _join(self, shard: _Shard, timeout_s: float) -> None:
+        proc = shard.process
+        if proc is None:
+            return
+        await asyncio.to_thread(proc.join, timeout_s)
+        if proc.is_alive():
+            logger.warning(f"Shard {shard.index} (pid {proc.pid}) did not stop in time; killing it")
+            proc.kill()
+            await asyncio.to_thread(proc.join, 5)
+
+    async def shutdown(self, *, timeout_s: float, metrics_runner: web.AppRunner | None = None) -> None:
+        """Drain every worker, then confirm what was handled and stop."""
+        t0 = time.perf_counter()
+        self._stopping = True
+        for shard in self.shards:
+            if shard.writer is not None:
+                _send(shard.writer, ("drain", timeout_s))
+        await self._flush()
+        # Workers drain for up to timeout_s and then close their clients
+        await asyncio.gather(*(self._join(s, timeout_s + 10) for s in self.shards))
+        if self._monitor_task:
+            self._monitor_task.cancel()
+        if self._server:
+            self._server.close()
+        await asyncio.gather(*(self._confirm(c) for c in self.configs))
+        if self._http:
+            await self._http.close()
+        await monitor.stop()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        shutil.rmtree(self._dir, ignore_errors=True)
+        logger.info(f"Supervisor stopped in {time.perf_counter() - t0:.2f}s")
@@ -0,0 +1,69 @@
+import asyncio
+
+from database import _TTLCache
+
+
+def test_cancelled_loader_does_not_fail_waiters():
+    async def main():
+        cache = _TTLCache(60)
+        calls = []
+
+        async def loader():
+            calls.append(1)
+            if len(calls) == 1:
+                await asyncio.sleep(10)
+            return "value"
+
+        first = asyncio.create_task(cache.get("k", loader))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get("k", loader))
+        await asyncio.sleep(0)
+        first.cancel()
+        results = await asyncio.gather(first, waiter, return_exceptions=True)
+        assert isinstance(results[0], asyncio.CancelledError)
+        assert results[1] == "value"
+        assert len(calls) == 2
+        assert await cache.get("k", loader) == "value"
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_leaves_load_running():
+    async def main():
+        cache = _TTLCache(60)
+        release = asyncio.Event()
+
+        async def loader():
+            await release.wait()
+            return "value"
+
+        first = asyncio.create_task(cache.get("k", loader))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get("k", loader))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        release.set()
+        results = await asyncio.gather(first, waiter, return_exceptions=True)
+        assert results[0] == "value"
+        assert isinstance(results[1], asyncio.CancelledError)
+
+    asyncio.run(main())
+
+
+def test_load_in_flight_does_not_overwrite_newer_set():
+    async def main():
+        cache = _TTLCache(60)
+        release = asyncio.Event()
+
+        async def loader():
+            await release.wait()
+            return "old"
+
+        task = asyncio.create_task(cache.get("k", loader))
+        await asyncio.sleep(0)
+        cache.set("k", "pushed")
+        release.set()
+        assert await task == "old"
+        assert await cache.get("k", loader) == "pushed"
+
+    asyncio.run(main())
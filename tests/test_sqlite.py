@@ -0,0 +1,76 @@
+import asyncio
+
+from database_sqlite import SQLiteDatabase
+
+
+def _run(tmp_path, body):
+    async def main():
+        database = SQLiteDatabase(str(tmp_path / "bot.db"))
+        await database.init()
+        try:
+            await body(database)
+        finally:
+            await database.close()
+
+    asyncio.run(main())
+
+
+def test_transaction_commits_calls_together(tmp_path):
+    async def body(database):
+        await database.add_card("4111 1111", currency="USD")
+        async with database.transaction():
+            tx_id = await database.create_transaction(1, 10.0, 2, "USD")
+            card = await database.get_next_active_card("USD", tx_id)
+        assert card == "4111 1111"
+        tx = await database.get_transaction(tx_id)
+        assert tx is not None and tx.referrer_id == 2
+
+    _run(tmp_path, body)
+
+
+def test_transaction_rolls_back_on_error(tmp_path):
+    async def body(database):
+        tx_id = None
+        try:
+            async with database.transaction():
+                tx_id = await database.create_transaction(1, 10.0, 2, "USD")
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
+        assert tx_id is not None
+        assert await database.get_transaction(tx_id) is None
+
+    _run(tmp_path, body)
+
+
+def test_other_calls_wait_for_the_transaction(tmp_path):
+    async def body(database):
+        order = []
+
+        async def outside():
+            await database.create_transaction(3, 5.0, 2, "USD")
+            order.append("outside")
+
+        async with database.transaction():
+            await database.create_transaction(1, 10.0, 2, "USD")
+            task = asyncio.create_task(outside())
+            await asyncio.sleep(0.05)
+            order.append("inside")
+        await task
+        assert order == ["inside", "outside"]
+
+    _run(tmp_path, body)
+
+
+def test_deleting_a_pending_transaction_reverses_creator_totals(tmp_path):
+    async def body(database):
+        kept = await database.create_transaction(1, 10.0, 2, "USD")
+        dropped = await database.create_transaction(3, 5.0, 2, "USD")
+        await database.update_transaction_proof(kept, "proof-1")
+        await database.update_transaction_proof(dropped, "proof-2")
+        await database.delete_transaction(dropped)
+        incoming = await database.get_creator_incoming(2)
+        assert incoming.pending_count == 1
+        assert incoming.pending == {"USD": 10.0}
+
+    _run(tmp_path, body)
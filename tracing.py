@@ -0,0 +1,319 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterator
+
+import httpx
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start_ns: int
+    end_ns: int | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.perf_counter_ns()
+        return (end - self.start_ns) / 1_000_000
+
+
+@dataclass
+class _Trace:
+    root: Span
+    spans: list[Span] = field(default_factory=list)
+    wall_start_ns: int = field(default_factory=time.time_ns)
+    closed: bool = False  # exported; tasks that inherited it must not add spans
+
+
+_current_trace: ContextVar[_Trace | None] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+class FileSpanExporter:
+    """Appends one JSON line per finished trace to a local file.
+
+    Lines are handed to a writer thread that keeps the file open, so a slow disk
+    never blocks the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: queue.SimpleQueue[str | None] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+
+    def export(self, trace: dict[str, Any]) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._write, name="trace-writer", daemon=True)
+            self._thread.start()
+        self._queue.put(json.dumps(trace, ensure_ascii=False) + "\n")
+
+    def _write(self) -> None:
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                while (line := self._queue.get()) is not None:
+                    f.write(line)
+                    if self._queue.empty():
+                        f.flush()
+        except OSError as e:
+            logger.error(f"Trace file {self.path} failed, traces are no longer written: {e}")
+
+    async def shutdown(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+
+class OTLPSpanExporter:
+    """Posts traces to an OTLP/HTTP JSON endpoint (collector or local stand-in)."""
+
+    def __init__(self, endpoint: str, *, timeout_s: float = 5.0):
+        self.endpoint = endpoint.rstrip("/") + "/v1/traces"
+        self.timeout_s = timeout_s
+        self._client: httpx.AsyncClient | None = None
+        self._pending: set[asyncio.Task] = set()
+
+    def export(self, trace: dict[str, Any]) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self._send(_to_otlp(trace)))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _send(self, payload: dict[str, Any]) -> None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout_s)
+        try:
+            resp = await self._client.post(self.endpoint, json=payload)
+            resp.raise_for_status()
+        except Exception as e:
+            logger.debug(f"OTLP export failed: {e}")
+
+    async def shutdown(self) -> None:
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+
+def _to_otlp(trace: dict[str, Any]) -> dict[str, Any]:
+    spans = []
+    for s in trace["spans"]:
+        span = {
+            "traceId": trace["trace_id"],
+            "spanId": s["span_id"],
+            "name": s["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(s["start_unix_ns"]),
+            "endTimeUnixNano": str(s["end_unix_ns"]),
+            "attributes": [
+                {"key": k, "value": {"stringValue": str(v)}} for k, v in s["attributes"].items()
+            ],
+            "status": {"code": 2, "message": s["error"]} if s["error"] else {"code": 1},
+        }
+        if s["parent_id"]:
+            span["parentSpanId"] = s["parent_id"]
+        spans.append(span)
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "donatebot"}}]},
+                "scopeSpans": [{"scope": {"name": "donatebot"}, "spans": spans}],
+            }
+        ]
+    }
+
+
+class Tracer:
+    """Minimal in-process tracer: one trace per update, child spans via contextvars."""
+
+    def __init__(self, exporter: FileSpanExporter | OTLPSpanExporter | None = None, *, slow_update_ms: float = 1000.0):
+        self.exporter = exporter
+        self.slow_update_ms = slow_update_ms
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        trace = _current_trace.get()
+        parent = _current_span.get()
+        if trace is not None and trace.closed:
+            # A task started by an update that has finished (an export, a duplicate
+            # check): its spans form a trace of their own, linked to the update's
+            attributes = {**attributes, "follows_trace_id": trace.root.trace_id}
+            trace = parent = None
+        is_root = trace is None
+        span = Span(
+            name=name,
+            trace_id=trace.root.trace_id if trace else os.urandom(16).hex(),
+            span_id=os.urandom(8).hex(),
+            parent_id=parent.span_id if parent else None,
+            start_ns=time.perf_counter_ns(),
+            attributes=attributes,
+        )
+        if is_root:
+            trace = _Trace(root=span)
+            trace_token = _current_trace.set(trace)
+        trace.spans.append(span)
+        span_token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end_ns = time.perf_counter_ns()
+            _current_span.reset(span_token)
+            if is_root:
+                _current_trace.reset(trace_token)
+                trace.closed = True
+                self._finish(trace)
+
+    def _finish(self, trace: _Trace) -> None:
+        root = trace.root
+        if root.duration_ms >= self.slow_update_ms:
+            logger.warning(
+                f"Slow update: {root.name} took {root.duration_ms:.1f} ms\n{format_breakdown(trace.spans)}"
+            )
+        if self.exporter is None:
+            return
+        try:
+            self.exporter.export(_serialize(trace))
+        except Exception as e:
+            logger.debug(f"Trace export failed: {e}")
+
+    async def shutdown(self) -> None:
+        if self.exporter is not None:
+            await self.exporter.shutdown()
+
+
+def _serialize(trace: _Trace) -> dict[str, Any]:
+    base_ns = trace.root.start_ns
+    out = []
+    for s in trace.spans:
+        end_ns = s.end_ns if s.end_ns is not None else s.start_ns
+        out.append(
+            {
+                "name": s.name,
+                "span_id": s.span_id,
+                "parent_id": s.parent_id,
+                "start_unix_ns": trace.wall_start_ns + (s.start_ns - base_ns),
+                "end_unix_ns": trace.wall_start_ns + (end_ns - base_ns),
+                "duration_ms": round(s.duration_ms, 3),
+                "attributes": s.attributes,
+                "error": s.error,
+            }
+        )
+    return {"trace_id": trace.root.trace_id, "spans": out}
+
+
+def format_breakdown(spans: list[Span]) -> str:
+    depth: dict[str, int] = {}
+    base_ns = spans[0].start_ns if spans else 0
+    lines = []
+    for s in spans:
+        d = depth.get(s.parent_id, -1) + 1 if s.parent_id else 0
+        depth[s.span_id] = d
+        attrs = " ".join(f"{k}={v}" for k, v in s.attributes.items())
+        offset = (s.start_ns - base_ns) / 1_000_000
+        err = f" ERROR {s.error}" if s.error else ""
+        lines.append(f"{'  ' * d}+{offset:.1f}ms {s.name} {s.duration_ms:.1f}ms {attrs}{err}".rstrip())
+    return "\n".join(lines)
+
+
+def _build_exporter() -> FileSpanExporter | OTLPSpanExporter | None:
+    from config import TRACE_EXPORTER, TRACE_FILE, TRACE_OTLP_ENDPOINT
+
+    if TRACE_EXPORTER == "file":
+        return FileSpanExporter(TRACE_FILE)
+    if TRACE_EXPORTER == "otlp":
+        return OTLPSpanExporter(TRACE_OTLP_ENDPOINT)
+    return None
+
+
+def _build_tracer() -> Tracer:
+    from config import SLOW_UPDATE_MS
+
+    return Tracer(_build_exporter(), slow_update_ms=SLOW_UPDATE_MS)
+
+
+# Module-level tracer shared by middlewares and database client
+tracer = _build_tracer()
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Outer update middleware: opens the root span for each incoming update."""
+
+    def __init__(self, tracer: Tracer = tracer):
+        self.tracer = tracer
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        attrs: dict[str, Any] = {"update_id": event.update_id, "type": event.event_type}
+        if user:
+            attrs["user_id"] = user.id
+        if event.callback_query and event.callback_query.data:
+            attrs["callback_data"] = event.callback_query.data
+        with self.tracer.span("update", **attrs):
+            return await handler(event, data)
+
+
+class TelegramRequestTracer(BaseRequestMiddleware):
+    """Bot session middleware: one child span per Bot API request."""
+
+    def __init__(self, tracer: Tracer = tracer):
+        self.tracer = tracer
+
+    async def __call__(self, make_request, bot, method):
+        with self.tracer.span(f"telegram.{method.__api_method__}"):
+            return await make_request(bot, method)
+
+
+def _run_collector(host: str, port: int, path: str) -> None:
+    """Tiny OTLP/HTTP JSON collector stand-in: appends each request body to a JSONL file."""
+    from aiohttp import web
+
+    async def handle(request: web.Request) -> web.Response:
+        body = await request.json()
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(body, ensure_ascii=False) + "\n")
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_post("/v1/traces", handle)
+    web.run_app(app, host=host, port=port)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a local OTLP/HTTP trace collector stand-in.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4318)
+    parser.add_argument("--out", default="collected_traces.jsonl")
+    ns = parser.parse_args()
+    _run_collector(ns.host, ns.port, ns.out)